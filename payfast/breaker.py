@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Circuit breaker for the calls to Payfast.
+
+When Payfast is slow or down, every call waits for its timeout and workers
+pile up behind them. A :class:`CircuitBreaker` counts the consecutive failures
+of every endpoint and, past a threshold, *opens* the circuit of that endpoint:
+calls fail straight away with :class:`~payfast.exceptions.CircuitOpenException`.
+
+Once ``reset_timeout`` seconds went by, the circuit is *half open*: a single
+probe call is let through. The circuit closes again if it succeeds and stays
+open for another ``reset_timeout`` if it fails.
+
+The state lives in a Django cache so that every worker shares it: one worker
+finding out about an outage opens the circuit for all of them. The cache
+operations are not transactional, at worst a few extra calls get through
+around a state change.
+"""
+import time
+
+from .exceptions import CircuitOpenException
+
+
+class CircuitBreaker(object):
+    """Per-endpoint circuit breaker with its state in a Django cache.
+
+    :param int threshold: Consecutive failures opening the circuit.
+    :param reset_timeout: Seconds before an open circuit lets a probe through.
+    :param str cache_alias: Django cache holding the state.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30, cache_alias='default'):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def _keys(endpoint):
+        prefix = 'payfast:breaker:%s:' % endpoint
+        return prefix + 'failures', prefix + 'opened', prefix + 'probe'
+
+    def is_open(self, endpoint):
+        """Return whether calls to ``endpoint`` are currently cut off."""
+        return self.cache.get(self._keys(endpoint)[1]) is not None
+
+    def allow(self, endpoint, now=None):
+        """Return whether a call to ``endpoint`` may be attempted."""
+        now = time.time() if now is None else now
+        __, opened_key, probe_key = self._keys(endpoint)
+
+        opened = self.cache.get(opened_key)
+        if opened is None:
+            return True
+        if now - opened < self.reset_timeout:
+            return False
+        # Half open: ``add`` only succeeds for the first caller, the probe.
+        return self.cache.add(probe_key, now, self.reset_timeout)
+
+    def record_success(self, endpoint):
+        """Close the circuit of ``endpoint``.
+
+        A healthy circuit has no state, so the usual success costs one cache
+        read and no write.
+        """
+        keys = self._keys(endpoint)
+        if self.cache.get_many(keys):
+            self.cache.delete_many(keys)
+
+    def record_failure(self, endpoint, now=None):
+        """Count a failed call to ``endpoint``, opening its circuit past the threshold."""
+        now = time.time() if now is None else now
+        failures_key, opened_key, probe_key = self._keys(endpoint)
+        # Open circuits are kept for a day at most, a probe closes them anyway.
+        opened_timeout = max(self.reset_timeout * 10, 24 * 60 * 60)
+
+        if self.cache.get(opened_key) is not None:
+            # The half open probe failed.
+            self.cache.set(opened_key, now, opened_timeout)
+            self.cache.delete(probe_key)
+            return
+
+        self.cache.add(failures_key, 0, opened_timeout)
+        try:
+            failures = self.cache.incr(failures_key)
+        except ValueError:
+            # The counter expired in between.
+            failures = 1
+            self.cache.set(failures_key, failures, opened_timeout)
+        if failures >= self.threshold:
+            self.cache.set(opened_key, now, opened_timeout)
+
+    def call(self, endpoint, func, *args, **kwargs):
+        """Call ``func`` through the circuit of ``endpoint``.
+
+        Any exception raised by ``func`` counts as a failure and is re-raised,
+        so ``func`` should only raise for outages (network errors, timeouts and
+        server errors), not for refused requests.
+
+        :raises: CircuitOpenException when the circuit is open.
+        """
+        if not self.allow(endpoint):
+            raise CircuitOpenException("The circuit of Payfast endpoint %s is open" % endpoint)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure(endpoint)
+            raise
+        self.record_success(endpoint)
+        return result
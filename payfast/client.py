@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Client for the Payfast REST API.
+
+All calls go through a single ``requests`` session per client whose connection
+pool is sized for the number of threads using it, so concurrent charge runs or
+queries reuse connections instead of paying a TLS handshake per call.
+
+.. note::
+
+    **About the signature:**
+
+    Unlike the payment form, API calls are signed over the request headers
+    (``merchant-id``, ``version`` and ``timestamp``), the body fields and the
+    passphrase, all sorted alphabetically by key and url encoded.
+
+"""
+import hashlib
+from datetime import datetime
+from functools import partial
+
+try:
+    # Python > 3
+    import urllib.parse as parse
+except ImportError:
+    # Python < 3
+    import urllib as parse
+
+from .constants import Constants
+from .exceptions import PayfastAPIException, PayfastNotFoundException, PayfastUnavailableException
+
+
+class PayfastAPIClient(object):
+    """Pooled client for the Payfast REST API.
+
+    :param merchant_id: Payfast merchant identifier.
+    :param passphrase: Payfast passphrase, required by the API.
+    :param api_url: Base URL of the API.
+    :param timeout: Timeout of every call in seconds.
+    :param int pool_size: Maximum number of pooled connections.
+    :param bool testing: Send calls to the Payfast sandbox.
+    :param breaker: Optional :class:`~payfast.breaker.CircuitBreaker`, calls are
+        then cut off per resource (``subscriptions``, ``process``...) while the
+        API is failing.
+
+    The client is thread safe and meant to be shared by all workers.
+    """
+
+    def __init__(self, merchant_id, passphrase=None, api_url=Constants.API_URL, timeout=10, pool_size=10,
+                 testing=False, breaker=None):
+        import requests
+
+        self.merchant_id = str(merchant_id)
+        self.passphrase = passphrase
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.testing = testing
+        self.breaker = breaker
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def sign(self, fields):
+        """Return the API signature of ``fields`` (headers and body together)."""
+        if self.passphrase:
+            fields = dict(fields, passphrase=self.passphrase)
+        signature_string = parse.urlencode(sorted((key, str(value)) for key, value in fields.items()))
+
+        return hashlib.md5(signature_string.encode()).hexdigest()
+
+    def request(self, method, path, data=None):
+        """Perform a signed call to the API and return the decoded JSON response.
+
+        :raises: PayfastAPIException when the call fails or is refused,
+            PayfastNotFoundException when the resource does not exist.
+        """
+        import requests
+
+        data = dict(data or {})
+        headers = {
+            'merchant-id': self.merchant_id,
+            'version': Constants.API_VERSION,
+            'timestamp': datetime.now().replace(microsecond=0).isoformat(),
+        }
+        headers['signature'] = self.sign(dict(headers, **data))
+        params = {'testing': 'true'} if self.testing else None
+
+        send = partial(self._send, method, self.api_url + path, data=data or None, params=params, headers=headers)
+        try:
+            if self.breaker is None:
+                response = send()
+            else:
+                response = self.breaker.call('api:%s' % path.strip('/').split('/')[0], send)
+            if response.status_code == 404:
+                raise PayfastNotFoundException("Payfast API call %s %s: not found" % (method, path))
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise PayfastAPIException("Payfast API call %s %s failed: %s" % (method, path, e))
+
+    def _send(self, method, url, **kwargs):
+        """Send a call, raising only when the API is unreachable or failing."""
+        import requests
+
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise PayfastUnavailableException("Payfast API call %s %s failed: %s" % (method, url, e))
+        if response.status_code >= 500:
+            raise PayfastUnavailableException(
+                "Payfast API call %s %s failed with status %s" % (method, url, response.status_code))
+        return response
+
+    def charge_token(self, token, amount, item_name, m_payment_id=None):
+        """Charge ``amount`` against a tokenized card (ad hoc subscription).
+
+        :return: The ``data`` part of the API response.
+        :raises: PayfastAPIException when the charge is refused.
+        """
+        data = {
+            # The API expects amounts in cents.
+            Constants.AMOUNT: int(round(amount * 100)),
+            Constants.ITEM_NAME: item_name,
+        }
+        if m_payment_id:
+            data[Constants.M_PAYMENT_ID] = m_payment_id
+
+        result = self.request('POST', Constants.ADHOC_CHARGE_PATH.format(token=token), data)
+        if result.get('status') != 'success':
+            raise PayfastAPIException("Payfast refused the charge: %s" % result.get('data', result))
+
+        return result.get('data', {})
+
+    def refund_payment(self, payment_id, amount, reason, notify_buyer=True):
+        """Refund ``amount`` of a payment to the buyer.
+
+        :param payment_id: Payfast payment id (``pf_payment_id``) of the payment.
+        :param amount: Amount to refund, at most the amount of the payment.
+        :param str reason: Reason of the refund, shown to the buyer.
+        :param bool notify_buyer: Have Payfast email the buyer about the refund.
+        :return: The ``data`` part of the API response.
+        :raises: PayfastAPIException when the refund is refused.
+        """
+        data = {
+            # The API expects amounts in cents.
+            Constants.AMOUNT: int(round(amount * 100)),
+            'reason': reason,
+            'notify_buyer': 1 if notify_buyer else 0,
+        }
+        result = self.request('POST', Constants.REFUND_PATH.format(payment_id=parse.quote(str(payment_id), safe='')), data)
+        if result.get('status') != 'success':
+            raise PayfastAPIException("Payfast refused the refund: %s" % result.get('data', result))
+
+        return result.get('data', {})
+
+    def query_payment(self, payment_id):
+        """Return the details Payfast holds about a payment.
+
+        :param payment_id: Payfast payment id or merchant payment id (order number).
+        :return: The payment fields, named like notification fields, or None
+            when the answer carries no payment.
+        :raises: PayfastNotFoundException when Payfast has no such payment.
+        """
+        result = self.request('GET', Constants.QUERY_PATH.format(payment_id=parse.quote(str(payment_id), safe='')))
+        if result.get('status') != 'success':
+            raise PayfastAPIException("Payfast refused the query: %s" % result.get('data', result))
+
+        payment = (result.get('data') or {}).get('response')
+        return payment if isinstance(payment, dict) else None
@@ -0,0 +1,43 @@
+"""Helpers to run blocking work (HTTP calls, database chunks) on a few threads.
+
+Only the standard library thread pool is used so the helpers behave the same
+on Python 2 and Python 3.
+"""
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+
+def imap_bounded(func, iterable, workers=1, backlog=None):
+    """Yield ``func(item)`` for every item of ``iterable``, in order.
+
+    :param func: Callable applied to every item.
+    :param iterable: Items to process. It is consumed lazily.
+    :param int workers: Number of threads calling ``func`` concurrently.
+    :param int backlog: Maximum number of submitted but not yet yielded items.
+        Defaults to twice the number of ``workers``.
+
+    Unlike :meth:`multiprocessing.pool.Pool.imap`, which reads its whole input
+    up front, at most ``backlog`` items are held in memory at any time, which
+    keeps memory flat when ``iterable`` is a generator over a large file or
+    queryset. Exceptions raised by ``func`` are re-raised when their result is
+    reached. With a single worker items are processed in the calling thread,
+    which keeps database work inside the caller's connection and transaction.
+    """
+    if workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    backlog = max(backlog or workers * 2, 1)
+    pool = ThreadPool(workers)
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= backlog:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -65,3 +65,224 @@ class AbstractPayfastConfig:
         :return: appropriate request HTTP header.
         """
         raise NotImplementedError
+
+    def get_valid_hosts(self):
+        """Get the hosts Payfast notifications are allowed to originate from.
+
+        :return: iterable of host names or IP addresses.
+        """
+        raise NotImplementedError
+
+    def get_pending_order_status(self):
+        """Get the status of an order awaiting a Payfast notification.
+
+        :return: Oscar order status as string.
+        """
+        raise NotImplementedError
+
+    def get_paid_order_status(self):
+        """Get the status an order is moved to once Payfast confirms payment.
+
+        :return: Oscar order status as string.
+        """
+        raise NotImplementedError
+
+    def get_cancelled_order_status(self):
+        """Get the status an order is moved to once Payfast cancels payment.
+
+        :return: Oscar order status as string.
+        """
+        raise NotImplementedError
+
+    def get_api_url(self):
+        """Get the base URL of the Payfast API.
+
+        :return: Payfast API URL.
+        """
+        raise NotImplementedError
+
+    def get_api_timeout(self):
+        """Get the timeout in seconds of calls to the Payfast API.
+
+        :return: timeout as a number.
+        """
+        raise NotImplementedError
+
+    def get_notify_max_size(self):
+        """Get the maximum size in bytes of a notification request body.
+
+        :return: size as integer.
+        """
+        raise NotImplementedError
+
+    def get_notify_max_fields(self):
+        """Get the maximum number of fields of a notification request.
+
+        :return: number of fields as integer.
+        """
+        raise NotImplementedError
+
+    def get_notify_rate_limit(self):
+        """Get the rate limit applied per source IP to notifications, ahead of
+        every other check. Notifications from Payfast are never throttled.
+
+        :return: ``(rate, burst)`` tuple in requests per second, or None.
+        """
+        raise NotImplementedError
+
+    def get_notify_rate_limit_cache(self):
+        """Get the cache alias the notify rate limiter shares its state through.
+
+        :return: cache alias, or None to keep state in process memory.
+        """
+        raise NotImplementedError
+
+    def use_merchant_directory(self):
+        """Whether payments are routed to the merchants stored in the database.
+
+        :return: boolean.
+        """
+        raise NotImplementedError
+
+    def get_merchant_directory_ttl(self):
+        """Get how long in seconds the in-memory merchant index is trusted before
+        the database is checked for changes.
+
+        :return: seconds as a number.
+        """
+        raise NotImplementedError
+
+    def get_webhook_urls(self):
+        """Get the downstream endpoints payment events are delivered to.
+
+        :return: iterable of URLs.
+        """
+        raise NotImplementedError
+
+    def get_webhook_secret(self):
+        """Get the secret webhook deliveries are signed with.
+
+        :return: secret as string, or None to send unsigned deliveries.
+        """
+        raise NotImplementedError
+
+    def get_webhook_max_attempts(self):
+        """Get the number of delivery attempts before a webhook event is given up.
+
+        :return: number of attempts as integer.
+        """
+        raise NotImplementedError
+
+    def validate_notifications(self):
+        """Whether notifications are confirmed with the Payfast validate endpoint.
+
+        :return: boolean.
+        """
+        raise NotImplementedError
+
+    def get_validate_url(self):
+        """Get the Payfast endpoint notifications are confirmed with.
+
+        :return: Payfast validate URL.
+        """
+        raise NotImplementedError
+
+    def get_validation_fallback(self):
+        """Get what happens to a notification Payfast cannot confirm right now.
+
+        :return: :attr:`Constants.VALIDATION_FALLBACK_QUEUE` to process it later
+            or :attr:`Constants.VALIDATION_FALLBACK_SIGNATURE` to accept it on
+            its signature.
+        """
+        raise NotImplementedError
+
+    def get_breaker_threshold(self):
+        """Get the number of consecutive failures opening the circuit of a Payfast endpoint.
+
+        :return: number of failures as integer.
+        """
+        raise NotImplementedError
+
+    def get_breaker_reset_timeout(self):
+        """Get how long in seconds an open circuit waits before probing Payfast again.
+
+        :return: seconds as a number.
+        """
+        raise NotImplementedError
+
+    def get_breaker_cache(self):
+        """Get the cache alias the circuit breaker state is shared through.
+
+        :return: cache alias.
+        """
+        raise NotImplementedError
+
+    def get_retention_days(self):
+        """Get how many days Payfast transactions stay in the hot table.
+
+        :return: number of days as integer.
+        """
+        raise NotImplementedError
+
+    def get_abandoned_order_hours(self):
+        """Get how many hours an order may stay pending before it is swept.
+
+        :return: number of hours as a number.
+        """
+        raise NotImplementedError
+
+    def get_sweep_rate(self):
+        """Get the maximum number of Payfast queries per second of an order sweep.
+
+        :return: queries per second as a number, or None for no limit.
+        """
+        raise NotImplementedError
+
+    def get_status_cache(self):
+        """Get the cache alias payment statuses are published to.
+
+        :return: cache alias.
+        """
+        raise NotImplementedError
+
+    def get_status_timeout(self):
+        """Get how long in seconds a published payment status is kept.
+
+        :return: seconds as integer.
+        """
+        raise NotImplementedError
+
+    def get_status_max_wait(self):
+        """Get how long in seconds a status request may wait for a change.
+
+        :return: seconds as a number.
+        """
+        raise NotImplementedError
+
+    def get_onsite_url(self):
+        """Get the Payfast endpoint issuing the UUIDs of onsite payments.
+
+        :return: Payfast onsite process URL.
+        """
+        raise NotImplementedError
+
+    def get_onsite_engine_url(self):
+        """Get the URL of the Payfast script opening the onsite payment modal.
+
+        :return: Payfast onsite engine URL.
+        """
+        raise NotImplementedError
+
+    def get_onsite_cache(self):
+        """Get the cache alias onsite payment UUIDs are kept in.
+
+        :return: cache alias.
+        """
+        raise NotImplementedError
+
+    def get_onsite_uuid_timeout(self):
+        """Get how long in seconds the UUID of an onsite payment is reused.
+
+        :return: seconds as integer.
+        """
+        raise NotImplementedError
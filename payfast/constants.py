@@ -8,6 +8,12 @@ class Constants:
     # Setup
     ACTION_URL = 'action_url'
     HOST_IP = 'host_ip'
+    VALID_HOSTS = 'valid_hosts'
+    VALIDATE_URL = 'validate_url'
+    TIMEOUT = 'timeout'
+    BREAKER = 'breaker'
+    VALIDATION_FALLBACK = 'validation_fallback'
+    ONSITE_URL = 'onsite_url'
 
     # https://developers.payfast.co.za/documentation/#notify-page-itn (Security step two)
     VALID_PAYFAST_HOSTS = (
@@ -65,6 +71,21 @@ class Constants:
     # Recurring / Subscription constants
 
     TOKEN = 'token'
+    BILLING_DATE = 'billing_date'
+    SUBSCRIPTION_TYPE = 'subscription_type'
+    SUBSCRIPTION_TYPE_TOKENIZATION = 2
+
+    # Onsite payments
+
+    UUID = 'uuid'
+
+    # API
+
+    API_URL = 'https://api.payfast.co.za'
+    API_VERSION = 'v1'
+    ADHOC_CHARGE_PATH = '/subscriptions/{token}/adhoc'
+    QUERY_PATH = '/process/query/{payment_id}'
+    REFUND_PATH = '/refunds/{payment_id}'
 
     # Dev Defaults
 
@@ -75,13 +96,51 @@ class Constants:
     ACTION_URL_DEV = 'https://sandbox.payfast.co.za/eng/process'
     VALIDATE_URL_DEV = 'https://sandbox.payfast.co.za/eng/query/validate'
     QUERY_URL_DEV = 'https://api.payfast.co.za/process/query/'
+    ONSITE_URL_DEV = 'https://sandbox.payfast.co.za/onsite/process'
+    ONSITE_ENGINE_URL_DEV = 'https://sandbox.payfast.co.za/onsite/engine.js'
 
     # Live Defaults
     ACTION_URL_LIVE = 'https://payfast.co.za/eng/process'
     VALIDATE_URL_LIVE = 'https://payfast.co.za/eng/query/validate'
     QUERY_URL_LIVE = 'https://api.payfast.co.za/process/query/'
+    ONSITE_URL_LIVE = 'https://www.payfast.co.za/onsite/process'
+    ONSITE_ENGINE_URL_LIVE = 'https://www.payfast.co.za/onsite/engine.js'
 
     # Payment results
 
     PAYMENT_RESULT_COMPLETE = 'COMPLETE'
     PAYMENT_RESULT_CANCELLED = 'CANCELLED'
+    PAYMENT_RESULT_FAILED = 'FAILED'
+
+    # Oscar payment records
+
+    SOURCE_TYPE_NAME = 'PayFast'
+    PAYMENT_EVENT_PAID = 'Paid'
+
+    # Charge results
+
+    CHARGE_PENDING = 'PENDING'
+    CHARGE_SUCCESS = 'SUCCESS'
+    CHARGE_FAILED = 'FAILED'
+
+    # m_payment_id of an ad hoc charge, followed by the PayfastCharge id.
+    CHARGE_PAYMENT_ID_PREFIX = 'charge-'
+
+    # Refund results
+
+    REFUND_PENDING = 'PENDING'
+    REFUND_SUCCESS = 'SUCCESS'
+    REFUND_FAILED = 'FAILED'
+
+    # Webhook delivery states
+
+    WEBHOOK_PENDING = 'PENDING'
+    WEBHOOK_DELIVERED = 'DELIVERED'
+    WEBHOOK_FAILED = 'FAILED'
+    WEBHOOK_SIGNATURE_HEADER = 'X-Payfast-Webhook-Signature'
+
+    # What to do with a notification when Payfast cannot validate it
+
+    VALIDATION_FALLBACK_QUEUE = 'queue'
+    VALIDATION_FALLBACK_SIGNATURE = 'signature'
+    VALIDATION_VALID = 'VALID'
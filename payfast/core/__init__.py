@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Django free core of the Payfast integration.
+
+Signing, the field schemas and notification parsing and verification only
+need the standard library. Configuration such as the merchant id or the
+passphrase is passed in explicitly, so workers and serverless functions can
+verify a notification without booting Django::
+
+    from payfast.core import parse_notification, verify_notification
+
+    params = parse_notification(body)
+    accepted, status = verify_notification(params, merchant_id='10000100', passphrase='secret')
+
+:mod:`payfast.signer` and :mod:`payfast.gateway` wrap this core with the
+Django configuration, and importing :mod:`payfast.core` must never import
+Django; ``tests/unit/core_tests.py`` guards that as well as its import time
+and memory footprint.
+"""
+from .fields import FIELD_LIMITS, NOTIFICATION, PAYMENT_FORM, FieldSchema, normalize_amount, normalize_form_fields  # noqa
+from .notifications import parse_notification, verify_notification  # noqa
+from .signing import passphrase_salt, sign_notification, sign_request  # noqa
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Field schemas of the payment form and of notifications."""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from ..constants import Constants
+from ..exceptions import InvalidTransactionException, MissingFieldException, UnexpectedFieldException
+
+CENTS = Decimal('0.01')
+
+PAYMENT_FORM_REQUIRED_FIELDS = (
+    Constants.MERCHANT_KEY,
+    Constants.MERCHANT_ID,
+    Constants.AMOUNT,
+    Constants.ITEM_NAME
+)
+PAYMENT_FORM_OPTIONAL_FIELDS = (
+    Constants.RETURN_URL,
+    Constants.NOTIFY_URL,
+    Constants.CANCEL_URL,
+    Constants.NAME_FIRST,
+    Constants.NAME_LAST,
+    Constants.EMAIL_ADDRESS,
+    Constants.CELL_NUMBER,
+    Constants.M_PAYMENT_ID,
+    Constants.ITEM_DESCRIPTION,
+    Constants.EMAIL_CONFIRMATION,
+    Constants.EMAIL_ADDRESS,
+    Constants.SUBSCRIPTION_TYPE
+)
+
+FIELD_LIMITS = {
+    Constants.MERCHANT_KEY: 13,
+    Constants.RETURN_URL: 255,
+    Constants.NOTIFY_URL: 255,
+    Constants.CANCEL_URL: 255,
+    Constants.NAME_FIRST: 100,
+    Constants.NAME_LAST: 100,
+    Constants.EMAIL_ADDRESS: 100,
+    Constants.CELL_NUMBER: 100,
+    Constants.M_PAYMENT_ID: 100,
+    Constants.ITEM_NAME: 100,
+    Constants.ITEM_DESCRIPTION: 255,
+    Constants.CONFIRMATION_ADDRESS: 100,
+}
+"""Maximum length of the text fields accepted by Payfast."""
+
+NOTIFICATION_REQUIRED_FIELDS = (
+    Constants.PF_PAYMENT_ID,
+    Constants.PAYMENT_STATUS,
+    Constants.ITEM_NAME,
+    Constants.AMOUNT_GROSS,
+    Constants.AMOUNT_FEE,
+    Constants.AMOUNT_NET,
+    Constants.MERCHANT_ID
+)
+NOTIFICATION_OPTIONAL_FIELDS = (
+    Constants.M_PAYMENT_ID,
+    Constants.ITEM_DESCRIPTION,
+    Constants.NAME_FIRST,
+    Constants.NAME_LAST,
+    Constants.EMAIL_ADDRESS,
+    Constants.SIGNATURE,
+    Constants.TOKEN,
+    Constants.BILLING_DATE
+)
+
+
+class FieldSchema(object):
+    """Required and optional fields of a Payfast interaction.
+
+    The fields are also kept as frozensets so that checking a valid set of
+    fields takes two set comparisons.
+    """
+
+    def __init__(self, required, optional=()):
+        self.required_fields = tuple(required)
+        self.optional_fields = tuple(optional)
+        self.required = frozenset(self.required_fields)
+        self.expected = frozenset(self.required_fields + self.optional_fields)
+
+    def check(self, params):
+        """Check that ``params`` has every required field and no unexpected one.
+
+        :raises: MissingFieldException, UnexpectedFieldException
+        """
+        fields = frozenset(params)
+        # Two set comparisons settle the common, valid case.
+        if self.required <= fields <= self.expected:
+            return
+
+        for field_name in self.required_fields:
+            if field_name not in fields:
+                raise MissingFieldException("The required field %s is missing" % field_name)
+
+        for field_name in params.keys():
+            if field_name not in self.expected:
+                raise UnexpectedFieldException("Unexpected field %s" % field_name)
+
+
+PAYMENT_FORM = FieldSchema(PAYMENT_FORM_REQUIRED_FIELDS, PAYMENT_FORM_OPTIONAL_FIELDS)
+NOTIFICATION = FieldSchema(NOTIFICATION_REQUIRED_FIELDS, NOTIFICATION_OPTIONAL_FIELDS)
+
+
+def normalize_amount(value):
+    """Return ``value`` as the amount string Payfast signs, such as ``100.00``.
+
+    :raises: InvalidTransactionException if ``value`` is not a number.
+    """
+    try:
+        if not isinstance(value, Decimal):
+            # str() first so floats are not converted with binary noise.
+            value = Decimal(str(value).strip())
+        return str(value.quantize(CENTS, rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        raise InvalidTransactionException("Invalid amount %r" % (value,))
+
+
+def normalize_form_fields(params, limits=FIELD_LIMITS):
+    """
+    Turn every payment form field into the exact string Payfast will sign on its side.
+
+    Amounts are quantized to cents (``100`` becomes ``100.00``) and text is
+    stripped and truncated to the Payfast field ``limits``. ``params`` is
+    updated in place.
+    """
+    for name, value in params.items():
+        if name == Constants.AMOUNT:
+            params[name] = normalize_amount(value)
+        elif value is not None:
+            value = value.strip() if hasattr(value, 'strip') else '%s' % value
+            limit = limits.get(name)
+            params[name] = value[:limit] if limit else value
+    return params
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Parsing and local verification of Payfast notifications (ITNs).
+
+The checks run cheapest first and each raises
+:class:`~payfast.exceptions.InvalidTransactionException` (or one of its
+subclasses) on failure. Confirming a notification with Payfast itself needs
+HTTP and stays in :mod:`payfast.gateway`.
+"""
+try:
+    # Python > 3
+    import urllib.parse as parse
+except ImportError:
+    # Python < 3
+    import urlparse as parse
+
+from ..constants import Constants
+from ..exceptions import InvalidTransactionException
+from .fields import NOTIFICATION
+from .signing import verify_notification as verify_signature
+
+
+def parse_notification(body):
+    """Return the fields of an url encoded notification ``body`` as a dict.
+
+    :param body: The request body, bytes or text. When a field is repeated, the
+        last value wins, as with Django's ``QueryDict.dict()``.
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    return dict(parse.parse_qsl(body, keep_blank_values=True))
+
+
+def check_source(host_ip, valid_ips):
+    """Check that the notification was sent from one of the ``valid_ips``."""
+    if host_ip not in valid_ips:
+        raise InvalidTransactionException("The transaction request originates from a server other than payfast")
+
+
+def check_fields(params):
+    """Check that the notification has every required field and no unexpected one."""
+    NOTIFICATION.check(params)
+
+
+def check_merchant(params, merchant_id):
+    """Check that the notification is for ``merchant_id``."""
+    if params[Constants.MERCHANT_ID] != str(merchant_id):
+        raise InvalidTransactionException("The transaction is for another merchant")
+
+
+def check_signature(params, passphrase=None):
+    """Check that the notification was signed with ``passphrase``."""
+    if not verify_signature(params, passphrase):
+        raise InvalidTransactionException("The transaction may have been tampered with. This could indicate fraud.")
+
+
+def get_result(params):
+    """Return ``(accepted, status)``, whether the payment is complete and its status."""
+    status = params.get(Constants.PAYMENT_STATUS, None)
+    return status == Constants.PAYMENT_RESULT_COMPLETE, status
+
+
+def verify_notification(params, merchant_id, passphrase=None, host_ip=None, valid_ips=None):
+    """Run every local check on the notification ``params``.
+
+    :param merchant_id: The merchant the notification must be for.
+    :param passphrase: The passphrase of that merchant.
+    :param host_ip: The address the notification came from, only checked
+        against ``valid_ips`` when those are given.
+    :return: ``(accepted, status)``, see :func:`get_result`.
+    :raises: InvalidTransactionException
+    """
+    if valid_ips is not None:
+        check_source(host_ip, valid_ips)
+    check_fields(params)
+    check_merchant(params, merchant_id)
+    check_signature(params, passphrase)
+    return get_result(params)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Payfast MD5 signatures.
+
+The fields are url encoded in the order Payfast documents, the passphrase is
+appended as a salt and the result is hashed with MD5. The passphrase is always
+passed in, nothing is read from settings.
+"""
+import hashlib
+
+try:
+    # Python > 3
+    import urllib.parse as parse
+except ImportError:
+    # Python < 3
+    import urllib as parse
+
+from ..constants import Constants
+
+REQUEST_HASH_KEYS = (
+    Constants.MERCHANT_ID,
+    Constants.MERCHANT_KEY,
+    Constants.RETURN_URL,
+    Constants.CANCEL_URL,
+    Constants.NOTIFY_URL,
+    Constants.NAME_FIRST,
+    Constants.NAME_LAST,
+    Constants.EMAIL_ADDRESS,
+    Constants.CELL_NUMBER,
+    Constants.M_PAYMENT_ID,
+    Constants.AMOUNT,
+    Constants.ITEM_NAME,
+    Constants.ITEM_DESCRIPTION,
+    Constants.EMAIL_CONFIRMATION,
+    Constants.CONFIRMATION_ADDRESS,
+    Constants.SUBSCRIPTION_TYPE
+)
+"""Payment form fields in signing order."""
+
+RESPONSE_HASH_KEYS = (
+    Constants.M_PAYMENT_ID,
+    Constants.PF_PAYMENT_ID,
+    Constants.PAYMENT_STATUS,
+    Constants.ITEM_NAME,
+    Constants.ITEM_DESCRIPTION,
+    Constants.AMOUNT_GROSS,
+    Constants.AMOUNT_FEE,
+    Constants.AMOUNT_NET,
+    Constants.NAME_FIRST,
+    Constants.NAME_LAST,
+    Constants.EMAIL_ADDRESS,
+    Constants.MERCHANT_ID,
+    Constants.TOKEN,
+    Constants.BILLING_DATE
+)
+"""Notification (ITN) fields in signing order."""
+
+_salts = {}
+
+
+def passphrase_salt(passphrase):
+    """Return the encoded ``&passphrase=...`` suffix salting signatures.
+
+    :param str passphrase: The passphrase, may be empty or None.
+    :return: The salt as bytes, empty when there is no passphrase.
+
+    The salt only depends on the passphrase, so it is quoted and encoded once
+    per passphrase and kept for the lifetime of the process.
+    """
+    try:
+        return _salts[passphrase]
+    except KeyError:
+        pass
+    salt = ('&passphrase=' + parse.quote(passphrase)).encode() if passphrase else b''
+    if len(_salts) >= 1000:
+        # Only a handful of passphrases exist, this guards against misuse.
+        _salts.clear()
+    _salts[passphrase] = salt
+    return salt
+
+
+def generate_hash(signature_string, passphrase=None):
+    """Return the salted MD5 hex digest of ``signature_string``."""
+    digest = hashlib.md5(signature_string.encode())
+    salt = passphrase_salt(passphrase)
+    if salt:
+        # Feed the salt as a second chunk instead of concatenating strings.
+        digest.update(salt)
+
+    return digest.hexdigest()
+
+
+def request_signature_string(fields):
+    """Return the string the signature of the payment form ``fields`` is computed over."""
+    return parse.urlencode([(key, fields[key]) for key in REQUEST_HASH_KEYS if fields.get(key, None)])
+
+
+def notification_signature_string(fields):
+    """Return the string the signature of the notification ``fields`` is computed over."""
+    return parse.urlencode([(key, fields[key]) for key in RESPONSE_HASH_KEYS if fields.get(key, None)])
+
+
+def sign_request(fields, passphrase=None):
+    """Return the signature of the payment form ``fields``."""
+    return generate_hash(request_signature_string(fields), passphrase)
+
+
+def sign_notification(fields, passphrase=None):
+    """Return the signature Payfast sends with the notification ``fields``."""
+    return generate_hash(notification_signature_string(fields), passphrase)
+
+
+def verify_notification(fields, passphrase=None):
+    """Return whether the ``signature`` of the notification ``fields`` is valid.
+
+    ``fields`` is left untouched.
+    """
+    return sign_notification(fields, passphrase) == fields.get(Constants.SIGNATURE)
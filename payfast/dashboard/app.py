@@ -0,0 +1,34 @@
+from django.conf.urls import url
+from oscar.core.application import DashboardApplication
+
+from . import views
+
+
+class PayfastDashboardApplication(DashboardApplication):
+    """Dashboard section to browse Payfast transactions.
+
+    Include it in the project urls and add it to the dashboard navigation::
+
+        url(r'^dashboard/payfast/', payfast_dashboard.urls),
+
+        OSCAR_DASHBOARD_NAVIGATION.append({
+            'label': 'Payfast',
+            'icon': 'icon-money',
+            'children': [
+                {'label': 'Transactions', 'url_name': 'payfast-transaction-list'},
+            ]
+        })
+    """
+    name = None
+    default_permissions = ['is_staff']
+
+    list_view = views.TransactionListView
+
+    def get_urls(self):
+        urlpatterns = [
+            url(r'^transactions/$', self.list_view.as_view(), name='payfast-transaction-list'),
+        ]
+        return self.post_process_urls(urlpatterns)
+
+
+application = PayfastDashboardApplication()
@@ -0,0 +1,114 @@
+import csv
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.views.generic import TemplateView
+
+from ..models import PayfastTransaction
+from .forms import TransactionSearchForm
+
+CSV_FIELDS = (
+    'date_created', 'order_number', 'payfast_reference', 'method', 'status',
+    'amount', 'amount_fee', 'amount_net', 'currency', 'ip_address',
+)
+
+
+def encode_cursor(transaction):
+    """Return the cursor pointing right after ``transaction``."""
+    return '%s_%d' % (transaction.date_created.isoformat(), transaction.pk)
+
+
+def decode_cursor(cursor):
+    """Return the ``(date_created, id)`` of a cursor, or None if it is malformed."""
+    try:
+        date_created, pk = cursor.rsplit('_', 1)
+        date_created, pk = parse_datetime(date_created), int(pk)
+    except (AttributeError, ValueError):
+        return None
+    return (date_created, pk) if date_created else None
+
+
+def keyset_page(queryset, cursor=None, size=50):
+    """Return a page of ``queryset``, newest first, and the cursor of the next page.
+
+    :param queryset: Queryset of :class:`~payfast.models.PayfastTransaction`.
+    :param str cursor: Cursor returned with the previous page, if any.
+    :param int size: Number of transactions per page.
+    :return: ``(transactions, next_cursor)``, ``next_cursor`` is None on the last page.
+
+    Pages are cut on ``(date_created, id)`` instead of an ``OFFSET``, so every
+    page is a single index range scan however deep it is.
+    """
+    queryset = queryset.order_by('-date_created', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        date_created, pk = position
+        queryset = queryset.filter(Q(date_created__lt=date_created) | Q(date_created=date_created, id__lt=pk))
+
+    # One extra row tells whether there is a next page without a COUNT.
+    transactions = list(queryset[:size + 1])
+    if len(transactions) > size:
+        transactions = transactions[:size]
+        return transactions, encode_cursor(transactions[-1])
+    return transactions, None
+
+
+class Echo(object):
+    """File-like object handing back what is written, to stream a CSV writer."""
+
+    def write(self, value):
+        return value
+
+
+class TransactionListView(TemplateView):
+    """Searchable list of Payfast transactions, exportable as CSV."""
+
+    template_name = 'payfast/dashboard/transaction_list.html'
+    paginate_by = 50
+
+    def get_queryset(self):
+        queryset = PayfastTransaction.objects.all()
+        if self.form.is_valid():
+            queryset = self.form.filter(queryset)
+        return queryset
+
+    def get(self, request, *args, **kwargs):
+        self.form = TransactionSearchForm(request.GET or None)
+        if request.GET.get('format') == 'csv':
+            return self.export(self.get_queryset())
+        return super(TransactionListView, self).get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        ctx = super(TransactionListView, self).get_context_data(**kwargs)
+        transactions, next_cursor = keyset_page(self.get_queryset(), self.request.GET.get('after'), self.paginate_by)
+
+        params = self.request.GET.copy()
+        params.pop('after', None)
+        ctx.update({
+            'form': self.form,
+            'transactions': transactions,
+            'first_page_query': params.urlencode(),
+            'next_page_query': None,
+        })
+        if next_cursor:
+            params['after'] = next_cursor
+            ctx['next_page_query'] = params.urlencode()
+        params['format'] = 'csv'
+        params.pop('after', None)
+        ctx['export_query'] = params.urlencode()
+        return ctx
+
+    def export(self, queryset):
+        """Stream ``queryset`` as CSV, reading it through a database iterator."""
+        writer = csv.writer(Echo())
+        rows = queryset.order_by('-date_created', '-id').values_list(*CSV_FIELDS).iterator()
+
+        def lines():
+            yield writer.writerow(CSV_FIELDS)
+            for row in rows:
+                yield writer.writerow(row)
+
+        response = StreamingHttpResponse(lines(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="payfast-transactions.csv"'
+        return response
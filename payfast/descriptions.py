@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Item descriptions listing what the customer is paying for.
+
+Payfast shows ``item_description`` on its payment page. The builders here
+summarise the lines of an order (or of the basket being ordered) as
+``2 x Hat, 1 x Scarf`` within the Payfast field limit, with one query for all
+the lines. Order descriptions are cached per order number so that a customer
+going back and forth to Payfast does not get the lines queried again. Basket
+descriptions are not: the basket can still change under the same order number.
+"""
+from django.core.cache import cache
+
+from .constants import Constants
+from .core.fields import FIELD_LIMITS
+
+#: Seconds an item description stays cached.
+CACHE_TIMEOUT = 60 * 60
+
+ELLIPSIS = '...'
+
+
+def _cache_key(order_number):
+    return 'payfast:item_description:%s' % order_number
+
+
+def _get_max_length():
+    return FIELD_LIMITS[Constants.ITEM_DESCRIPTION]
+
+
+def describe_lines(lines, max_length=None):
+    """Return a summary of ``lines`` that fits in ``max_length`` characters.
+
+    :param lines: Iterable of ``(title, quantity)`` pairs.
+    :param int max_length: Defaults to the Payfast limit of ``item_description``.
+
+    Lines are kept whole for as long as they fit, the rest is summarised as
+    ``and 3 more``. A first line too long to fit on its own is cut short.
+    """
+    max_length = max_length or _get_max_length()
+    parts = ['%d x %s' % (quantity, ' '.join(title.split())) for title, quantity in lines]
+
+    description = ', '.join(parts)
+    if len(description) <= max_length:
+        return description
+
+    # Find how many whole lines fit next to the summary of the others.
+    kept, length = 0, 0
+    for part in parts:
+        extended = length + (2 if kept else 0) + len(part)
+        rest = len(parts) - kept - 1
+        if extended + (len(' and %d more' % rest) if rest else 0) > max_length:
+            break
+        kept, length = kept + 1, extended
+
+    more = ' and %d more' % (len(parts) - max(kept, 1)) if len(parts) > max(kept, 1) else ''
+    if not kept:
+        return parts[0][:max_length - len(more) - len(ELLIPSIS)] + ELLIPSIS + more
+    return ', '.join(parts[:kept]) + more
+
+
+def get_item_description(order):
+    """Return the cached item description of ``order``.
+
+    The lines are read through ``order.lines.all()``, so a queryset built with
+    ``prefetch_related('lines')`` describes many orders without extra queries.
+    """
+    key = _cache_key(order.number)
+    description = cache.get(key)
+    if description is None:
+        description = describe_lines((line.title, line.quantity) for line in order.lines.all())
+        cache.set(key, description, CACHE_TIMEOUT)
+    return description
+
+
+def get_basket_item_description(basket):
+    """Return the item description of the order being placed from ``basket``.
+
+    It is built from the current lines every time, with a single query.
+    """
+    # Variant products take their title from their parent.
+    lines = basket.lines.select_related('product', 'product__parent')
+    return describe_lines((line.product.get_title(), line.quantity) for line in lines)
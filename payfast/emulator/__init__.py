@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""A local stand-in for the Payfast gateway.
+
+The emulator is a small Django app answering the three Payfast endpoints the
+plugin talks to, so the whole checkout, redirect and ITN loop can run offline,
+for instance under load:
+
+* ``eng/process`` takes the payment form posted by ``redirect.html``, checks
+  its signature, redirects the customer to ``return_url`` and fires a signed
+  ITN at ``notify_url`` in the background,
+* ``eng/query/validate`` confirms the ITNs it sent,
+* ``process/query/<id>`` answers transaction queries.
+
+Mount it in a development project and point the plugin at it::
+
+    urlpatterns += [url(r'^payfast-emulator/', include('payfast.emulator.urls'))]
+
+    PAYFAST_ACTION_URL = 'http://localhost:8000/payfast-emulator/eng/process'
+    PAYFAST_VALIDATE_URL = 'http://localhost:8000/payfast-emulator/eng/query/validate'
+    PAYFAST_API_URL = 'http://localhost:8000/payfast-emulator'
+    PAYFAST_VALID_HOSTS = ('127.0.0.1',)
+
+The ITN patterns are set with :data:`PAYFAST_EMULATOR`, see
+:data:`payfast.emulator.gateway.DEFAULTS`. The emulator keeps its payments in
+process memory, run the development server with a single process.
+
+Never install it in production.
+"""
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Payments and ITN delivery of the :mod:`payfast.emulator`.
+
+ITNs, first deliveries and retries alike, wait in a heap ordered by due time.
+A scheduler thread hands them to the delivery workers once due, so a notify
+URL waiting for a retry never holds up the ITNs queued behind it.
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+try:
+    # Python > 3
+    import queue
+except ImportError:
+    # Python < 3
+    import Queue as queue
+
+from django.conf import settings
+
+from ..constants import Constants
+from ..signer import MD5Signer
+
+logger = logging.getLogger('payfast')
+
+DEFAULTS = {
+    # Seconds between the payment and its ITN.
+    'latency': 0.5,
+    # Share of payments whose ITN reports a FAILED or a CANCELLED payment.
+    'failure_rate': 0.0,
+    'cancel_rate': 0.0,
+    # Share of payments whose ITN is sent twice, or never.
+    'duplicate_rate': 0.0,
+    'drop_rate': 0.0,
+    # Deliveries answered with anything but a 200 are retried with a doubling delay.
+    'retries': 3,
+    'retry_delay': 1.0,
+    # Fee charged by the emulated Payfast, as a share of the amount.
+    'fee_rate': Decimal('0.035'),
+    'workers': 4,
+    'timeout': 10,
+    # Seed of the random patterns, for reproducible runs.
+    'seed': None,
+    # Number of payments remembered for validate and query calls.
+    'max_payments': 100000,
+}
+
+ITN_FIELDS = (
+    Constants.M_PAYMENT_ID,
+    Constants.ITEM_NAME,
+    Constants.ITEM_DESCRIPTION,
+    Constants.NAME_FIRST,
+    Constants.NAME_LAST,
+    Constants.EMAIL_ADDRESS,
+    Constants.MERCHANT_ID,
+)
+
+
+def get_settings():
+    """Return the emulator settings, :data:`PAYFAST_EMULATOR` over :data:`DEFAULTS`."""
+    return dict(DEFAULTS, **getattr(settings, 'PAYFAST_EMULATOR', {}))
+
+
+class Emulator(object):
+    """Emulated Payfast: takes payments and delivers their ITNs.
+
+    :param dict options: Settings, see :data:`DEFAULTS`.
+    """
+
+    def __init__(self, options=None):
+        import requests
+
+        self.options = dict(DEFAULTS, **(options or {}))
+        self.random = random.Random(self.options['seed'])
+        self.payment_ids = itertools.count(1)
+        self.payments = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.options['workers'])
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Deliveries not due yet, and the number not finished yet, guarded by ``scheduled``.
+        self.schedule = []
+        self.sequence = itertools.count()
+        self.pending = 0
+        self.scheduled = threading.Condition()
+        self.deliveries = queue.Queue()
+        threads = [self._schedule_forever] + [self._deliver_forever] * self.options['workers']
+        for target in threads:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def _pick_status(self):
+        draw = self.random.random()
+        if draw < self.options['failure_rate']:
+            return Constants.PAYMENT_RESULT_FAILED
+        if draw < self.options['failure_rate'] + self.options['cancel_rate']:
+            return Constants.PAYMENT_RESULT_CANCELLED
+        return Constants.PAYMENT_RESULT_COMPLETE
+
+    def build_notification(self, fields, signer):
+        """Return the signed ITN of the payment form ``fields``."""
+        amount = Decimal(fields[Constants.AMOUNT])
+        fee = (amount * self.options['fee_rate']).quantize(Decimal('0.01'))
+        with self.lock:
+            pf_payment_id = str(next(self.payment_ids))
+
+        params = dict((key, fields[key]) for key in ITN_FIELDS if fields.get(key))
+        params.update({
+            Constants.PF_PAYMENT_ID: pf_payment_id,
+            Constants.PAYMENT_STATUS: self._pick_status(),
+            Constants.AMOUNT_GROSS: str(amount),
+            Constants.AMOUNT_FEE: str(-fee),
+            Constants.AMOUNT_NET: str(amount - fee),
+        })
+        params[Constants.SIGNATURE] = signer.sign_notification(params)
+        return params
+
+    def pay(self, fields, signer=None):
+        """Take the payment of the form ``fields`` and schedule its ITN.
+
+        :return: The ITN fields, or None if the signature of ``fields`` is wrong.
+        """
+        signer = signer or MD5Signer()
+        fields = dict(fields)
+        if fields.pop(Constants.SIGNATURE, None) != signer.sign(fields):
+            return None
+
+        params = self.build_notification(fields, signer)
+        with self.lock:
+            self.payments[params[Constants.PF_PAYMENT_ID]] = params
+            while len(self.payments) > self.options['max_payments']:
+                self.payments.popitem(last=False)
+
+        notify_url = fields.get(Constants.NOTIFY_URL)
+        draw = self.random.random()
+        if notify_url and draw >= self.options['drop_rate']:
+            due = time.time() + self.options['latency']
+            copies = 2 if draw < self.options['drop_rate'] + self.options['duplicate_rate'] else 1
+            for __ in range(copies):
+                self._schedule(due, notify_url, params, 0)
+        return params
+
+    def _schedule(self, due, notify_url, params, attempt):
+        """Deliver ``params`` to ``notify_url`` once ``due``."""
+        with self.scheduled:
+            self.pending += 1
+            # The sequence keeps the heap from ever comparing the params.
+            heapq.heappush(self.schedule, (due, next(self.sequence), notify_url, params, attempt))
+            self.scheduled.notify_all()
+
+    def _schedule_forever(self):
+        with self.scheduled:
+            while True:
+                delay = self.schedule[0][0] - time.time() if self.schedule else None
+                if delay is None or delay > 0:
+                    self.scheduled.wait(delay)
+                    continue
+                __, __, notify_url, params, attempt = heapq.heappop(self.schedule)
+                self.deliveries.put((notify_url, params, attempt))
+
+    def _deliver_forever(self):
+        while True:
+            notify_url, params, attempt = self.deliveries.get()
+            try:
+                self._deliver(notify_url, params, attempt)
+            finally:
+                with self.scheduled:
+                    self.pending -= 1
+                    self.scheduled.notify_all()
+
+    def _deliver(self, notify_url, params, attempt):
+        import requests
+
+        try:
+            status = self.session.post(notify_url, data=params, timeout=self.options['timeout']).status_code
+        except requests.RequestException as e:
+            status = e
+        if status == 200:
+            return
+
+        logger.warning("Emulated ITN %s to %s failed: %s", params[Constants.PF_PAYMENT_ID], notify_url, status)
+        if attempt < self.options['retries']:
+            self._schedule(time.time() + self.options['retry_delay'] * 2 ** attempt, notify_url, params, attempt + 1)
+
+    def wait(self):
+        """Block until every scheduled ITN has been delivered or given up."""
+        with self.scheduled:
+            while self.pending:
+                self.scheduled.wait()
+
+    def find(self, payment_id):
+        """Return the ITN fields of a payment by Payfast or merchant payment id."""
+        with self.lock:
+            if payment_id in self.payments:
+                return self.payments[payment_id]
+            for params in reversed(self.payments.values()):
+                if params.get(Constants.M_PAYMENT_ID) == payment_id:
+                    return params
+
+    def is_genuine(self, params):
+        """Return whether ``params`` (without signature) are an ITN this emulator sent."""
+        sent = self.find(params.get(Constants.PF_PAYMENT_ID))
+        if sent is None:
+            return False
+        sent = dict(sent)
+        sent.pop(Constants.SIGNATURE, None)
+        return sent == dict((key, value) for key, value in params.items() if key != Constants.SIGNATURE)
+
+
+_emulator = None
+_emulator_lock = threading.Lock()
+
+
+def get_emulator():
+    """Return the emulator of this process, created from :data:`PAYFAST_EMULATOR`."""
+    global _emulator
+    with _emulator_lock:
+        if _emulator is None:
+            _emulator = Emulator(get_settings())
+        return _emulator
+
+
+def reset_emulator():
+    """Forget the emulator of this process, the next call creates a new one."""
+    global _emulator
+    with _emulator_lock:
+        _emulator = None
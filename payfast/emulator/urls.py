@@ -0,0 +1,9 @@
+from django.conf.urls import url
+
+from . import views
+
+urlpatterns = [
+    url(r'^eng/process$', views.process_view, name='payfast-emulator-process'),
+    url(r'^eng/query/validate$', views.validate_view, name='payfast-emulator-validate'),
+    url(r'^process/query/(?P<payment_id>[^/]+)$', views.query_view, name='payfast-emulator-query'),
+]
@@ -0,0 +1,39 @@
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from ..constants import Constants
+from .gateway import get_emulator
+
+
+@csrf_exempt
+@require_POST
+def process_view(request):
+    """Take the payment form, then send the customer back to the shop."""
+    fields = request.POST.dict()
+    params = get_emulator().pay(fields)
+    if params is None:
+        return HttpResponseBadRequest("Signature mismatch")
+
+    if fields.get(Constants.RETURN_URL):
+        return HttpResponseRedirect(fields[Constants.RETURN_URL])
+    return HttpResponse("Payment %s: %s" % (params[Constants.PF_PAYMENT_ID], params[Constants.PAYMENT_STATUS]))
+
+
+@csrf_exempt
+@require_POST
+def validate_view(request):
+    """Confirm an ITN, like the Payfast validate endpoint."""
+    valid = get_emulator().is_genuine(request.POST.dict())
+    return HttpResponse(Constants.VALIDATION_VALID if valid else 'INVALID', content_type='text/plain')
+
+
+@require_GET
+def query_view(request, payment_id):
+    """Answer a transaction query by Payfast or merchant payment id."""
+    params = get_emulator().find(payment_id)
+    if params is None:
+        return JsonResponse({'code': 404, 'status': 'failed', 'data': {'response': 'Not found'}}, status=404)
+
+    response = dict((key, value) for key, value in params.items() if key != Constants.SIGNATURE)
+    return JsonResponse({'code': 200, 'status': 'success', 'data': {'response': response}})
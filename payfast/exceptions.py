@@ -17,6 +17,51 @@ class InvalidTransactionException(ValueError):
     pass
 
 
+class InvalidRefundException(ValueError):
+    """
+    For when an order cannot be refunded: it has no completed Payfast payment
+    or the amount is more than what is left to refund.
+    """
+
+
+class NotificationRejectedException(InvalidTransactionException):
+    """
+    For when a notification request is turned away before it is validated
+    (rate limited, not from Payfast, too large or too many fields).
+    """
+
+
+class NotificationDeferredException(InvalidTransactionException):
+    """
+    For when a notification cannot be validated with Payfast right now and has
+    been queued to be processed later.
+    """
+
+
+class PayfastAPIException(Exception):
+    """
+    For when a call to the Payfast API fails or is refused.
+    """
+
+
+class PayfastUnavailableException(PayfastAPIException):
+    """
+    For when Payfast cannot be reached, times out or answers with a server error.
+    """
+
+
+class PayfastNotFoundException(PayfastAPIException):
+    """
+    For when the Payfast API does not know the requested resource.
+    """
+
+
+class CircuitOpenException(PayfastUnavailableException):
+    """
+    For when a call is not even attempted because its circuit breaker is open.
+    """
+
+
 class EmptyBasketException(Exception):
     pass
 
@@ -1,23 +1,50 @@
 # -*- coding: utf-8 -*-
+import json
 import logging
-import iptools
-from oscar.core.loading import get_class
-from .signer import MD5Signer
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from . import stats
+from .breaker import CircuitBreaker
+from .client import PayfastAPIClient
 from .config import get_config
-from .models import PayfastTransaction
+from .constants import Constants
+from .exceptions import NotificationDeferredException, NotificationRejectedException
+from .loading import lazy_class, lazy_model
+from .merchants import GatewayPool
+from .models import PayfastDeferredNotification, PayfastPaymentForm, PayfastToken, PayfastTransaction
+from .onsite import get_onsite_uuid
+from .rollups import add_transaction
+from .signals import payment_notification_accepted
+from .signer import MD5Signer
+from .status import publish_payment_status
+from .subscriptions import settle_charge
+from .throttling import CacheTokenBucket, TokenBucket
+from .webhooks import queue_payment_event
+
+Gateway = lazy_class('payfast.gateway', 'Gateway')
+order_status_changed = lazy_class('order.signals', 'order_status_changed')
 
-Constants = get_class('payfast.gateway', 'Constants')
-Gateway = get_class('payfast.gateway', 'Gateway')
+Order = lazy_model('order', 'Order')
+PaymentEventType = lazy_model('order', 'PaymentEventType')
+Source = lazy_model('payment', 'Source')
+SourceType = lazy_model('payment', 'SourceType')
+Transaction = lazy_model('payment', 'Transaction')
 
 
 logger = logging.getLogger('payfast')
 
 
-def get_gateway(config):
+def get_gateway(config, merchant_id=None):
     """Instantiate a :class:`payfast.gateway.Gateway` from ``config``.
 
     :param config: Payfast Config object.
     :type config: :class:`~payfast.config.AbstractPayfastConfig`
+    :param merchant_id: Merchant the gateway is for, defaults to the configured one.
     :return: An instance of ``Gateway`` configured properly.
 
     The ``Gateway`` is built using the given ``config`` and ``request`` to get
@@ -27,13 +54,121 @@ def get_gateway(config):
     user to define a per-request configuration, such as a different secret key
     based on the country or the language (or even the type of customer, its
     IP address, or other request specific parameter).
+
+    When :meth:`~payfast.config.AbstractPayfastConfig.use_merchant_directory`
+    is enabled and ``merchant_id`` is a known merchant, the prebuilt gateway of
+    that merchant is returned from the :class:`~payfast.merchants.GatewayPool`.
     """
-    return Gateway({
+    if merchant_id is not None and config.use_merchant_directory():
+        gateway = get_gateway_pool(config).get(merchant_id)
+        if gateway is not None:
+            return gateway
+
+    return Gateway(dict(_gateway_settings(config), **{
         Constants.MERCHANT_ID: config.get_merchant_id(),
         Constants.MERCHANT_KEY: config.get_merchant_key(),
-        Constants.ACTION_URL: config.get_action_url(),
         Constants.SIGNER: MD5Signer(),
-    })
+    }))
+
+
+def _gateway_settings(config):
+    """Return the gateway settings shared by every merchant."""
+    return {
+        Constants.ACTION_URL: config.get_action_url(),
+        Constants.VALID_HOSTS: config.get_valid_hosts(),
+        Constants.VALIDATE_URL: config.get_validate_url() if config.validate_notifications() else None,
+        Constants.TIMEOUT: config.get_api_timeout(),
+        Constants.BREAKER: get_breaker(config),
+        Constants.VALIDATION_FALLBACK: config.get_validation_fallback(),
+        Constants.ONSITE_URL: config.get_onsite_url(),
+    }
+
+
+def build_merchant_gateway(config, merchant):
+    """Instantiate the :class:`payfast.gateway.Gateway` of a stored ``merchant``.
+
+    :param config: Payfast Config object, used for everything but the merchant
+        credentials.
+    :param merchant: A :class:`~payfast.models.PayfastMerchant`.
+    """
+    return Gateway(dict(_gateway_settings(config), **{
+        Constants.MERCHANT_ID: merchant.merchant_id,
+        Constants.MERCHANT_KEY: merchant.merchant_key,
+        Constants.SIGNER: MD5Signer(passphrase=merchant.passphrase or ''),
+    }))
+
+
+_gateway_pools = {}
+
+
+def get_gateway_pool(config):
+    """Return the shared :class:`~payfast.merchants.GatewayPool` for ``config``."""
+    ttl = config.get_merchant_directory_ttl()
+    if ttl not in _gateway_pools:
+        _gateway_pools[ttl] = GatewayPool(partial(build_merchant_gateway, config), ttl)
+    return _gateway_pools[ttl]
+
+
+_breakers = {}
+
+
+def get_breaker(config):
+    """Return the shared :class:`~payfast.breaker.CircuitBreaker` for ``config``."""
+    key = (config.get_breaker_threshold(), config.get_breaker_reset_timeout(), config.get_breaker_cache())
+    if key not in _breakers:
+        _breakers[key] = CircuitBreaker(*key)
+    return _breakers[key]
+
+
+_api_clients = {}
+
+
+def get_api_client(config, pool_size=10):
+    """Return the shared :class:`payfast.client.PayfastAPIClient` for ``config``.
+
+    :param config: Payfast Config object.
+    :type config: :class:`~payfast.config.AbstractPayfastConfig`
+    :param int pool_size: Maximum number of pooled connections.
+
+    Clients are cached per API URL, merchant and pool size so that every caller
+    in the process shares the same connection pool.
+    """
+    key = (config.get_api_url(), config.get_merchant_id(), config.get_passphrase(), pool_size)
+    if key not in _api_clients:
+        _api_clients[key] = PayfastAPIClient(
+            merchant_id=config.get_merchant_id(),
+            passphrase=config.get_passphrase(),
+            api_url=config.get_api_url(),
+            timeout=config.get_api_timeout(),
+            pool_size=pool_size,
+            testing=config.get_action_url() == Constants.ACTION_URL_DEV,
+            breaker=get_breaker(config),
+        )
+    return _api_clients[key]
+
+
+_notification_limiters = {}
+
+
+def get_notification_limiter(config):
+    """Return the shared rate limiter for notifications, or None if disabled.
+
+    :param config: Payfast Config object.
+    :type config: :class:`~payfast.config.AbstractPayfastConfig`
+    """
+    rate_limit = config.get_notify_rate_limit()
+    if not rate_limit:
+        return None
+
+    cache_alias = config.get_notify_rate_limit_cache()
+    key = (tuple(rate_limit), cache_alias)
+    if key not in _notification_limiters:
+        rate, burst = rate_limit
+        if cache_alias:
+            _notification_limiters[key] = CacheTokenBucket(rate, burst, cache_alias)
+        else:
+            _notification_limiters[key] = TokenBucket(rate, burst)
+    return _notification_limiters[key]
 
 
 class Facade:
@@ -69,6 +204,8 @@ class Facade:
         Relies on the iptools package, even though Python 3.4 gave us the new
         shiny `ipaddress` module in the stdlib.
         """
+        import iptools
+
         return iptools.ipv4.validate_ip(s) or iptools.ipv6.validate_ip(s)
 
     def _get_origin_ip_address(self, request):
@@ -98,31 +235,102 @@ class Facade:
 
         return ip_address
 
-    def build_payment_form_fields(self, params):
+    def build_payment_form_fields(self, params, merchant_id=None):
         """
         Return a dict containing the name and value of all the hidden fields
         necessary to build the form that will be POSTed to Payfast.
+
+        ``merchant_id`` routes the payment to another merchant, see
+        :func:`get_gateway`.
         """
-        return get_gateway(self.config).build_payment_form_fields(params)
+        return get_gateway(self.config, merchant_id).build_payment_form_fields(params)
+
+    def presign_payment_form(self, params, merchant_id=None):
+        """
+        Build the payment form fields of an order and store them for
+        :meth:`get_presigned_form_fields`, replacing any previous version.
+
+        :return: The form fields, as :meth:`build_payment_form_fields`.
+        """
+        form_fields = self.build_payment_form_fields(params, merchant_id)
+        pairs = [[field['name'], field['value']] for field in form_fields]
+        PayfastPaymentForm.objects.update_or_create(order_number=params[Constants.M_PAYMENT_ID], defaults={
+            # The normalized amount that was signed.
+            'amount': dict(pairs)[Constants.AMOUNT],
+            'fields': json.dumps(pairs, separators=(',', ':')),
+        })
+        return form_fields
+
+    def get_onsite_uuid(self, params, merchant_id=None):
+        """
+        Return the UUID opening the Payfast onsite payment modal for ``params``.
+
+        The UUID of an order is cached and reused as long as its signed fields
+        do not change, and concurrent requests for one order share a single
+        call to Payfast, see :mod:`payfast.onsite`.
+
+        :raises: PayfastAPIException when Payfast cannot issue the UUID.
+        """
+        gateway = get_gateway(self.config, merchant_id)
+        fields = dict((field['name'], field['value']) for field in gateway.build_payment_form_fields(params))
+        return get_onsite_uuid(
+            fields, partial(gateway.request_onsite_uuid, fields),
+            cache=caches[self.config.get_onsite_cache()],
+            timeout=self.config.get_onsite_uuid_timeout(),
+            # Covers the connect and the read timeouts of the call.
+            wait=gateway.timeout * 2,
+        )
+
+    @staticmethod
+    def get_presigned_form_fields(order_number):
+        """
+        Return the stored payment form fields of ``order_number`` or None.
+
+        None means the form was never presigned or the order total changed
+        since, the form has to be built with :meth:`build_payment_form_fields`.
+        """
+        if not order_number:
+            return None
+        payment_form = PayfastPaymentForm.objects.filter(order_number=order_number).first()
+        return payment_form.get_form_fields() if payment_form is not None else None
+
+    def refund_order(self, order_number, amount=None, reason='', notify_buyer=True):
+        """
+        Refund the Payfast payment of ``order_number`` through the shared API client.
+
+        :return: The :class:`~payfast.models.PayfastRefund`, see
+            :func:`payfast.refunds.refund_order`.
+        :raises: InvalidRefundException when the order cannot be refunded.
+        """
+        from .refunds import refund_order
+
+        return refund_order(get_api_client(self.config), order_number, amount, reason, notify_buyer)
 
     @staticmethod
     def _record_transaction(status, txn_details):
         """
         Record an PayfastTransaction to keep track of the current payment attempt.
+
+        The transaction is added to its daily totals (see :mod:`payfast.rollups`)
+        in the same savepoint, so both are recorded or neither is.
         """
         order_number = txn_details['order_number']
         # Record payfast transactions.
         try:
-            txn_log = PayfastTransaction.objects.create(
-                amount=txn_details['amount'],
-                method=txn_details.get('payment_method', None),
-                reference=txn_details.get('payfast_reference', None),
-                order_number=txn_details['order_number'],
-                amount_net=txn_details.get('amount_net', None),
-                amount_fee=txn_details.get('amount_fee', None),
-                currency=txn_details.get('currency', None),
-                status=status,
-            )
+            # A savepoint keeps a failed insert from breaking the surrounding
+            # notification transaction.
+            with transaction.atomic():
+                txn_log = PayfastTransaction.objects.create(
+                    amount=txn_details['amount'],
+                    method=txn_details.get('payment_method', None),
+                    payfast_reference=txn_details.get('payfast_reference', None),
+                    order_number=txn_details['order_number'],
+                    amount_net=txn_details.get('amount_net', None),
+                    amount_fee=txn_details.get('amount_fee', None),
+                    ip_address=txn_details.get('ip_address', None),
+                    status=status,
+                )
+                add_transaction(txn_log)
         except Exception:  # noqa
             # Yes, this is generic, because basically, whatever happens, be it
             # a `KeyError` in `txn_details` or an exception when creating our
@@ -134,7 +342,262 @@ class Facade:
 
         return txn_log
 
+    @staticmethod
+    def _capture_token(status, params):
+        """
+        Store the Payfast token carried by a notification, or deactivate it once
+        Payfast reports the subscription as cancelled.
+        """
+        token = params.get(Constants.TOKEN)
+        if not token:
+            return
+
+        if status == Constants.PAYMENT_RESULT_COMPLETE:
+            PayfastToken.objects.get_or_create(token=token, defaults={
+                'order_number': params.get(Constants.M_PAYMENT_ID),
+                'amount': params.get(Constants.AMOUNT_GROSS),
+                'item_name': params.get(Constants.ITEM_NAME, ''),
+            })
+        elif status == Constants.PAYMENT_RESULT_CANCELLED:
+            PayfastToken.objects.filter(token=token).update(is_active=False)
+
+    def _claim_order(self, order_number):
+        """
+        Return the pending order ``order_number`` locked for update, or None.
+
+        A row locked by another transaction, such as a concurrent notification or
+        the sweeper, is waited on: skipping it would drop a genuine payment that
+        Payfast never retries. Once the lock is released the order is only
+        returned if it is still pending.
+        """
+        orders = Order.objects.filter(number=order_number, status=self.config.get_pending_order_status())
+        return orders.select_for_update().first()
+
+    @staticmethod
+    def _transition_order(order, new_status):
+        """
+        Move ``order`` to ``new_status`` with a conditional ``UPDATE``.
+
+        The update only applies while the order still has the status it was read
+        with, which makes it safe on databases without row locking. Returns
+        whether this call moved the order.
+        """
+        old_status = order.status
+        updated = Order.objects.filter(pk=order.pk, status=old_status).update(status=new_status)
+        if not updated:
+            return False
+
+        order.status = new_status
+        if new_status in order.cascade:
+            order.lines.update(status=order.cascade[new_status])
+
+        # Mirror Order.set_status so status listeners keep working.
+        order_status_changed.send(sender=order, order=order, old_status=old_status, new_status=new_status)
+        return True
+
+    @staticmethod
+    def _record_payment(order, amount, reference, status):
+        """
+        Create the Oscar payment ``Source`` and ``PaymentEvent`` for a settled order.
+        """
+        source_type, __ = SourceType.objects.get_or_create(name=Constants.SOURCE_TYPE_NAME)
+        source = Source.objects.create(
+            order=order,
+            source_type=source_type,
+            currency=order.currency,
+            amount_allocated=amount,
+            amount_debited=amount,
+            reference=reference,
+        )
+        source.transactions.create(txn_type=Transaction.DEBIT, amount=amount, reference=reference, status=status)
+
+        event_type, __ = PaymentEventType.objects.get_or_create(name=Constants.PAYMENT_EVENT_PAID)
+        order.payment_events.create(event_type=event_type, amount=amount, reference=reference)
+
+    def process_notification(self, accepted, status, params, ip_address=None):
+        """
+        Record a validated Payfast notification and apply it to its Oscar order.
+
+        The ``PayfastTransaction``, the payment ``Source`` and ``PaymentEvent`` and
+        the order status change are written in a single transaction. A complete
+        payment moves a pending order to the paid status, a cancelled payment moves
+        it to the cancelled status. Any other status, or an order that has already
+        been moved, only records the transaction. Card tokens carried by the
+        notification are stored for ad hoc charges, and the notification of an
+        ad hoc charge settles that charge instead of an order. Every notification, whatever
+        its status, is published to :data:`~payfast.signals.payment_notification_accepted`
+        and queued for the webhook endpoints. Once committed, every notification
+        is published to the payment status channel of :mod:`payfast.status`.
+
+        :return: The recorded :class:`PayfastTransaction` or None.
+        """
+        reference = params.get(Constants.PF_PAYMENT_ID)
+        txn_details = {
+            'order_number': params.get(Constants.M_PAYMENT_ID),
+            'payfast_reference': reference,
+            'amount': params.get(Constants.AMOUNT_GROSS),
+            'amount_fee': params.get(Constants.AMOUNT_FEE),
+            'amount_net': params.get(Constants.AMOUNT_NET),
+            'ip_address': ip_address,
+        }
+
+        if status == Constants.PAYMENT_RESULT_COMPLETE:
+            new_status = self.config.get_paid_order_status()
+        elif status == Constants.PAYMENT_RESULT_CANCELLED:
+            new_status = self.config.get_cancelled_order_status()
+        else:
+            new_status = None
+
+        with transaction.atomic():
+            txn_log = self._record_transaction(status, txn_details)
+            self._capture_token(status, params)
+            if settle_charge(txn_details['order_number'], status) or not new_status:
+                order_status = None
+            else:
+                order_status = self._settle_order(accepted, status, new_status, txn_details)
+            self._publish_payment_event(txn_log, status, params, order_status)
+
+        # Wakes up the thank-you page of the customer, see payfast.status. Only
+        # once committed: callers such as the sweeper may hold an outer transaction.
+        transaction.on_commit(partial(
+            publish_payment_status, txn_details['order_number'], status, order_status, self.config))
+        return txn_log
+
+    def _settle_order(self, accepted, status, new_status, txn_details):
+        """
+        Move the pending order of a notification to ``new_status``.
+
+        :return: ``new_status`` if this call moved the order, otherwise None.
+        """
+        order = self._claim_order(txn_details['order_number'])
+        if order is None:
+            return None
+
+        try:
+            amount = Decimal(txn_details['amount'])
+        except (TypeError, InvalidOperation):
+            amount = None
+        if accepted and amount != order.total_incl_tax:
+            logger.warning("Payfast amount %s does not match the total of order %s",
+                           txn_details['amount'], order.number)
+            return None
+
+        if not self._transition_order(order, new_status):
+            return None
+        if accepted:
+            self._record_payment(order, amount, txn_details['payfast_reference'], status)
+        return new_status
+
+    def _publish_payment_event(self, txn_log, status, params, order_status):
+        """
+        Queue the webhook events of a genuine notification and notify in-process
+        listeners. Both happen inside the notification transaction, delivery to
+        downstream services is left to ``payfast_deliver_webhooks``.
+        """
+        queue_payment_event(self.config.get_webhook_urls(), status, params, order_status)
+        payment_notification_accepted.send(
+            sender=self.__class__, transaction=txn_log, status=status, params=params, order_status=order_status)
+
+    def _screen_notification_request(self, request, host_ip, gateway):
+        """
+        Turn away junk notification requests before any field is parsed or hashed.
+
+        These are the request level stages of the notification checks, cheapest
+        first: requests are rate limited per source IP, then requests from
+        anywhere but the Payfast servers are rejected, then requests whose body
+        is too large or has too many fields. The remaining stages run in
+        :meth:`payfast.gateway.PaymentNotification.validate`.
+
+        The limiter runs first so that a flood, including one spoofing a Payfast
+        address through :data:`PAYFAST_IP_ADDRESS_HTTP_HEADER`, is turned away
+        before anything else. Only once its bucket is empty is a source checked
+        against the Payfast servers, whose notifications are never throttled.
+
+        :raises: NotificationRejectedException
+        """
+        limiter = get_notification_limiter(self.config)
+        if limiter is not None and not limiter.allow(host_ip or 'unknown') and host_ip not in gateway.valid_host_ips:
+            stats.record_rejection(stats.STAGE_RATE)
+            raise NotificationRejectedException("Too many notifications from %s" % host_ip)
+
+        if host_ip not in gateway.valid_host_ips:
+            stats.record_rejection(stats.STAGE_IP)
+            raise NotificationRejectedException("Notification from %s which is not a Payfast server" % host_ip)
+
+        try:
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            size = None
+        if size is None or size > self.config.get_notify_max_size():
+            stats.record_rejection(stats.STAGE_SIZE)
+            raise NotificationRejectedException("Notification body is too large")
+
+        if request.body.count(b'&') >= self.config.get_notify_max_fields():
+            stats.record_rejection(stats.STAGE_SIZE)
+            raise NotificationRejectedException("Notification has too many fields")
+
+    def _get_notification_gateway(self, params, gateway):
+        """Return the gateway of the merchant a notification is for."""
+        # Notifications for other merchants are verified with their own gateway.
+        if params.get(Constants.MERCHANT_ID) != str(gateway.merchant_id):
+            return get_gateway(self.config, params.get(Constants.MERCHANT_ID))
+        return gateway
+
     def handle_notification_request(self, request):
+        """
+        Validate a Payfast ITN request and apply it to the matching order.
+
+        A notification Payfast cannot confirm right now is stored as a
+        :class:`PayfastDeferredNotification`, see :meth:`process_deferred_notifications`.
+
+        :return: The recorded :class:`PayfastTransaction` or None.
+        :raises: InvalidTransactionException if the notification is not genuine.
+        """
         host_ip = self._get_origin_ip_address(request)
-        params = request.POST
-        return get_gateway(self.config).handle_notification(ip_address=host_ip, host_ip=params)
+        gateway = get_gateway(self.config)
+        self._screen_notification_request(request, host_ip, gateway)
+
+        params = request.POST.dict()
+        gateway = self._get_notification_gateway(params, gateway)
+        # Validation consumes the signature, keep it in case the notification is deferred.
+        signed_params = dict(params)
+        try:
+            accepted, status, params = gateway.handle_notification(ip_address=host_ip, params=params)
+        except NotificationDeferredException as e:
+            logger.warning("Deferring Payfast notification %s: %s", signed_params.get(Constants.PF_PAYMENT_ID), e)
+            PayfastDeferredNotification.objects.create(params=json.dumps(signed_params), ip_address=host_ip)
+            return None
+        return self.process_notification(accepted, status, params, ip_address=host_ip)
+
+    def process_deferred_notifications(self, limit=100):
+        """
+        Validate and apply deferred notifications, oldest first.
+
+        Processing stops at the first notification that has to be deferred again,
+        since Payfast is then still unavailable.
+
+        :param int limit: Maximum number of notifications processed.
+        :return: The number of notifications processed.
+        """
+        gateway = get_gateway(self.config)
+        deferred_notifications = PayfastDeferredNotification.objects.filter(date_processed__isnull=True)
+
+        processed = 0
+        for deferred in deferred_notifications.order_by('pk')[:limit]:
+            params = json.loads(deferred.params)
+            try:
+                accepted, status, params = self._get_notification_gateway(params, gateway).handle_notification(
+                    ip_address=deferred.ip_address, params=params)
+            except NotificationDeferredException:
+                break
+            except ValueError as e:
+                logger.warning("Deferred Payfast notification %s is invalid: %s", deferred.pk, e)
+                deferred.error = str(e)[:255]
+            else:
+                self.process_notification(accepted, status, params, ip_address=deferred.ip_address)
+
+            deferred.date_processed = timezone.now()
+            deferred.save(update_fields=['error', 'date_processed'])
+            processed += 1
+
+        return processed
@@ -1,14 +1,77 @@
 import logging
+import socket
+import time
+from . import stats
 from .constants import Constants
+from .core import fields, notifications
 from .exceptions import (
     InvalidTransactionException,
-    MissingFieldException,
     MissingParameterException,
-    UnexpectedFieldException,
+    NotificationDeferredException,
+    PayfastAPIException,
+    PayfastUnavailableException,
 )
+# Kept importable from here for backwards compatibility.
+from .core.fields import CENTS, normalize_amount  # noqa
+from .exceptions import MissingFieldException, UnexpectedFieldException  # noqa
 
 logger = logging.getLogger('payfast')
 
+#: Seconds the IP addresses of the Payfast hosts are cached.
+RESOLVE_TTL = 5 * 60
+
+#: Seconds a lookup that failed is cached, so junk requests do not resolve again.
+RESOLVE_FAILURE_TTL = 30
+
+_resolved_hosts = {}
+
+
+def resolve_hosts(hosts, now=None):
+    """Return the set of IP addresses the given ``hosts`` resolve to.
+
+    Payfast publishes the host names of its ITN servers rather than their IP
+    addresses. Lookups are cached per process for :data:`RESOLVE_TTL` seconds,
+    so that new Payfast servers are picked up without a restart. When a host
+    fails to resolve, the lookup is retried after :data:`RESOLVE_FAILURE_TTL`
+    seconds and the addresses of the last lookup are kept meanwhile.
+    """
+    hosts = tuple(hosts)
+    now = time.time() if now is None else now
+    cached = _resolved_hosts.get(hosts)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    addresses, resolved = set(), True
+    for host in hosts:
+        try:
+            addresses.update(socket.gethostbyname_ex(host)[2])
+        except (socket.error, UnicodeError):
+            logger.warning("Unable to resolve Payfast host %s", host)
+            resolved = False
+
+    if not resolved and cached is not None:
+        addresses.update(cached[0])
+    addresses = frozenset(addresses)
+    _resolved_hosts[hosts] = (addresses, now + (RESOLVE_TTL if resolved else RESOLVE_FAILURE_TTL))
+    return addresses
+
+
+_session = None
+
+
+def get_session():
+    """Return the pooled ``requests`` session shared by all gateways."""
+    global _session
+    if _session is None:
+        import requests
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=10)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
 
 class Gateway:
 
@@ -38,6 +101,17 @@ class Gateway:
         self.signer = settings.get(Constants.SIGNER)
         self.action_url = settings.get(Constants.ACTION_URL)
         self.host_ip = settings.get(Constants.HOST_IP)
+        self.valid_hosts = settings.get(Constants.VALID_HOSTS, Constants.VALID_PAYFAST_HOSTS)
+        self.validate_url = settings.get(Constants.VALIDATE_URL)
+        self.timeout = settings.get(Constants.TIMEOUT, 10)
+        self.breaker = settings.get(Constants.BREAKER)
+        self.validation_fallback = settings.get(Constants.VALIDATION_FALLBACK, Constants.VALIDATION_FALLBACK_QUEUE)
+        self.onsite_url = settings.get(Constants.ONSITE_URL)
+
+    @property
+    def valid_host_ips(self):
+        """IP addresses Payfast notifications are accepted from."""
+        return resolve_hosts(self.valid_hosts)
 
     @staticmethod
     def _build_form_fields(payfast_request):
@@ -58,6 +132,64 @@ class Gateway:
 
         return payfast_request.process()
 
+    def _post_validation(self, params):
+        """Post ``params`` to the Payfast validate endpoint and return its answer."""
+        import requests
+
+        try:
+            response = get_session().post(self.validate_url, data=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise PayfastUnavailableException("Payfast validation failed: %s" % e)
+        if response.status_code >= 500:
+            raise PayfastUnavailableException("Payfast validation failed with status %s" % response.status_code)
+        return response.text.strip()
+
+    def validate_notification(self, params):
+        """Ask Payfast whether it sent the notification ``params``.
+
+        :return: ``True`` when Payfast confirms the notification.
+        :raises: PayfastUnavailableException when Payfast cannot answer, including
+            when the circuit breaker of the validate endpoint is open.
+        """
+        if self.breaker is None:
+            return self._post_validation(params) == Constants.VALIDATION_VALID
+        return self.breaker.call('validate', self._post_validation, params) == Constants.VALIDATION_VALID
+
+    def _post_onsite(self, fields):
+        """Post the signed payment ``fields`` to the Payfast onsite endpoint."""
+        import requests
+
+        try:
+            response = get_session().post(self.onsite_url, data=fields, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise PayfastUnavailableException("Payfast onsite payment failed: %s" % e)
+        if response.status_code >= 500:
+            raise PayfastUnavailableException("Payfast onsite payment failed with status %s" % response.status_code)
+        return response
+
+    def request_onsite_uuid(self, fields):
+        """Ask Payfast for the UUID of an onsite payment.
+
+        :param dict fields: Signed payment form fields, see :meth:`build_payment_form_fields`.
+        :return: The UUID opening the onsite payment modal.
+        :raises: PayfastUnavailableException when Payfast cannot answer,
+            PayfastAPIException when it refuses the payment.
+        """
+        if not self.onsite_url:
+            raise MissingParameterException("The Payfast onsite URL is not configured.")
+
+        if self.breaker is None:
+            response = self._post_onsite(fields)
+        else:
+            response = self.breaker.call('onsite', self._post_onsite, fields)
+        try:
+            uuid = response.json().get(Constants.UUID) if response.status_code == 200 else None
+        except (AttributeError, ValueError):
+            uuid = None
+        if not uuid:
+            raise PayfastAPIException("Payfast refused the onsite payment: %s" % response.text[:255])
+        return uuid
+
     def handle_notification(self, ip_address, params):
 
         return self._handle_notification(PaymentNotification(self, ip_address, params))
@@ -70,58 +202,50 @@ class BaseInteraction:
     def validate(self):
         self.check_fields()
 
+    @classmethod
+    def schema(cls):
+        """Return the :class:`~payfast.core.fields.FieldSchema` of the class, built once per class."""
+        schema = cls.__dict__.get('_schema')
+        if schema is None:
+            schema = fields.FieldSchema(cls.REQUIRED_FIELDS, cls.OPTIONAL_FIELDS)
+            cls._schema = schema
+        return schema
+
     def check_fields(self):
         """
         Validate required and optional fields for both
         requests and responses.
         """
-        params = self.params
-
-        # Check that all mandatory fields are present.
-        for field_name in self.REQUIRED_FIELDS:
-            if field_name not in params:
-                raise MissingFieldException(
-                    "The required field %s is missing" % field_name
-                )
-
-        # Check that no unexpected field is present.
-        expected_fields = self.REQUIRED_FIELDS + self.OPTIONAL_FIELDS
-        for field_name in params.keys():
-            if field_name not in expected_fields:
-                raise UnexpectedFieldException(
-                    "Unexpected field %s" % field_name
-                )
+        self.schema().check(self.params)
 
 
 class PaymentFormRequest(BaseInteraction):
-    REQUIRED_FIELDS = (
-        Constants.MERCHANT_KEY,
-        Constants.MERCHANT_ID,
-        Constants.AMOUNT,
-        Constants.ITEM_NAME
-    )
-    OPTIONAL_FIELDS = (
-        Constants.RETURN_URL,
-        Constants.NOTIFY_URL,
-        Constants.CANCEL_URL,
-        Constants.NAME_FIRST,
-        Constants.NAME_LAST,
-        Constants.EMAIL_ADDRESS,
-        Constants.CELL_NUMBER,
-        Constants.M_PAYMENT_ID,
-        Constants.ITEM_DESCRIPTION,
-        Constants.EMAIL_CONFIRMATION,
-        Constants.EMAIL_ADDRESS
-    )
+    REQUIRED_FIELDS = fields.PAYMENT_FORM_REQUIRED_FIELDS
+    OPTIONAL_FIELDS = fields.PAYMENT_FORM_OPTIONAL_FIELDS
+
+    FIELD_LIMITS = fields.FIELD_LIMITS
+    """Maximum length of the text fields accepted by Payfast."""
 
     def __init__(self, client, params=None):
         self.client = client
         self.params = params or {}
         self.validate()
+        self.normalize()
 
         # Generate MD5 signature.
         self.params.update({Constants.SIGNATURE: self.client.signer.sign(self.params)})
 
+    def normalize(self):
+        """
+        Turn every field into the exact string Payfast will sign on its side.
+
+        Amounts are quantized to cents (``100`` becomes ``100.00``) and text is
+        stripped and truncated to the Payfast field limits. The signature and the
+        rendered form are both built from the normalized fields, so they always
+        agree with each other and with Payfast.
+        """
+        fields.normalize_form_fields(self.params, self.FIELD_LIMITS)
+
     def build_form_fields(self):
         return [{'type': 'hidden', 'name': name, 'value': value}
                 for name, value in self.params.items()]
@@ -137,24 +261,8 @@ class PaymentNotification(BaseInteraction):
     - optional: May be included.
     """
 
-    REQUIRED_FIELDS = (
-        Constants.PF_PAYMENT_ID,
-        Constants.PAYMENT_STATUS,
-        Constants.ITEM_NAME,
-        Constants.AMOUNT_GROSS,
-        Constants.AMOUNT_FEE,
-        Constants.AMOUNT_NET,
-        Constants.MERCHANT_ID
-    )
-
-    OPTIONAL_FIELDS = (
-        Constants.M_PAYMENT_ID,
-        Constants.ITEM_DESCRIPTION,
-        Constants.NAME_FIRST,
-        Constants.NAME_LAST,
-        Constants.EMAIL_ADDRESS,
-        Constants.SIGNATURE
-    )
+    REQUIRED_FIELDS = fields.NOTIFICATION_REQUIRED_FIELDS
+    OPTIONAL_FIELDS = fields.NOTIFICATION_OPTIONAL_FIELDS
 
     def __init__(self, client, host_ip=None, params=None):
         self.client = client
@@ -164,24 +272,70 @@ class PaymentNotification(BaseInteraction):
 
     def validate(self):
         """
-        Validates the ITN response from payfast see:
+        Validates the ITN response from payfast, cheapest checks first:
+
+        1. the source IP address,
+        2. the presence of the fields,
+        3. the merchant the notification is for,
+        4. the signature,
+        5. the confirmation by Payfast itself, when enabled.
+
+        Every rejection is counted against its stage, see :mod:`payfast.stats`.
+
         :raises: InvalidTransactionException
         :return: None
         """
-        super(PaymentNotification, self).validate()
+        # Check that request originates from payfast servers (Check 2)
+        try:
+            notifications.check_source(self.host_ip, self.client.valid_host_ips)
+        except ValueError:
+            stats.record_rejection(stats.STAGE_IP)
+            raise
+
+        try:
+            super(PaymentNotification, self).validate()
+        except ValueError:
+            stats.record_rejection(stats.STAGE_FIELDS)
+            raise
+
+        try:
+            notifications.check_merchant(self.params, self.client.merchant_id)
+        except ValueError:
+            stats.record_rejection(stats.STAGE_MERCHANT)
+            raise
 
         # Check that the transaction has not been tampered with. (Check 1)
         if not self.client.signer.verify(self.params):
+            stats.record_rejection(stats.STAGE_SIGNATURE)
             raise InvalidTransactionException("The transaction may have been tampered with. This could indicate fraud.")
 
-        # Check that request originates from payfast servers (Check 2)
-        host = self.host_ip
-        if host not in Constants.VALID_PAYFAST_HOSTS:
-            raise InvalidTransactionException("The transaction request originates from a server other than payfast")
+        # Confirm the notification with Payfast (Check 4), the only remote check.
+        if self.client.validate_url:
+            self.validate_remotely()
+
+    def validate_remotely(self):
+        """
+        Confirm the notification with the Payfast validate endpoint.
+
+        When Payfast cannot be asked, the gateway ``validation_fallback`` decides:
+        the notification is either deferred or accepted on its signature alone.
+
+        :raises: InvalidTransactionException, NotificationDeferredException
+        """
+        try:
+            valid = self.client.validate_notification(self.params)
+        except PayfastUnavailableException as e:
+            if self.client.validation_fallback == Constants.VALIDATION_FALLBACK_SIGNATURE:
+                logger.warning("Accepting notification %s on its signature only: %s",
+                               self.params.get(Constants.PF_PAYMENT_ID), e)
+                return
+            raise NotificationDeferredException(str(e))
+
+        if not valid:
+            stats.record_rejection(stats.STAGE_REMOTE)
+            raise InvalidTransactionException("Payfast did not confirm the transaction.")
 
     def process(self):
-        payment_result = self.params.get(Constants.PAYMENT_STATUS, None)
-        accepted = payment_result == Constants.PAYMENT_RESULT_COMPLETE
-        status = payment_result
+        accepted, status = notifications.get_result(self.params)
 
         return accepted, status, self.params
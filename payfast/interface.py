@@ -1,11 +1,9 @@
-from oscar.core.loading import get_class
-
-
 from .config import get_config
+from .constants import Constants  # noqa
+from .exceptions import MissingFieldException  # noqa
+from .loading import lazy_class
 
-Constants = get_class('payfast.gateway', 'Constants')
-Facade = get_class('payfast.facade', 'Facade')
-MissingFieldException = get_class('payfast.gateway', 'MissingFieldException')
+Facade = lazy_class('payfast.facade', 'Facade')
 
 
 class Interface:
@@ -34,18 +32,57 @@ class Interface:
         return self.config.get_action_url()
 
     @staticmethod
-    def get_form_fields(order_data):
+    def get_form_fields(order_data, merchant_id=None):
         """
         Return the payment form fields as a list of dicts.
         Expects a large-ish order_data dictionary with details of the order.
+        Pass ``merchant_id`` to route the payment to another merchant.
+        """
+        return Facade().build_payment_form_fields(order_data, merchant_id)
+
+    @staticmethod
+    def presign_form_fields(order_data, merchant_id=None):
+        """
+        Build the payment form fields once, when the order is placed, and store
+        them so that :meth:`get_presigned_form_fields` only has to look them up.
+        Takes the same arguments as :meth:`get_form_fields`.
+        """
+        return Facade().presign_payment_form(order_data, merchant_id)
+
+    def get_onsite_engine_url(self):
+        """ Return the URL of the Payfast script opening the onsite payment modal. """
+        return self.config.get_onsite_engine_url()
+
+    @staticmethod
+    def get_onsite_uuid(order_data, merchant_id=None):
+        """
+        Return the UUID of the onsite payment of an order, asking Payfast only
+        once per order. Takes the same arguments as :meth:`get_form_fields`.
+        """
+        return Facade().get_onsite_uuid(order_data, merchant_id)
+
+    @staticmethod
+    def get_presigned_form_fields(order_number):
+        """
+        Return the form fields stored by :meth:`presign_form_fields`, or None
+        if there are none or the order total changed since.
+        """
+        return Facade().get_presigned_form_fields(order_number)
+
+    @staticmethod
+    def refund_order(order_number, amount=None, reason='', notify_buyer=True):
+        """
+        Refund the Payfast payment of an order, in full unless ``amount`` is given.
+        :param notify_buyer: Have Payfast email the buyer about the refund
+        :return: object: Returns the PayfastRefund, check its status
         """
-        return Facade().build_payment_form_fields(order_data)
+        return Facade().refund_order(order_number, amount, reason, notify_buyer)
 
     @staticmethod
     def handle_notification_request(request):
         """
         Django oscar interface object for handling the payfast notification request
         :param request: The request object from payfast
-        :return: object: Returns Facade.handle_notification object
+        :return: object: Returns the recorded PayfastTransaction or None
         """
         return Facade().handle_notification_request(request)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Deferred class loading.
+
+Oscar lets projects override classes by forking apps, which is why the plugin
+resolves most classes with :func:`oscar.core.loading.get_class`. Doing that at
+import time means importing ``payfast.urls`` imports the whole gateway, the
+facade and their dependencies before the first request is served.
+
+:func:`lazy_class` and :func:`lazy_model` return a :class:`LazyClass` instead:
+a stand-in that resolves the real class on first use and caches it.
+"""
+
+
+def _load_class(module_label, classname):
+    from oscar.core.loading import get_class
+
+    return get_class(module_label, classname)
+
+
+def _load_model(app_label, model_name):
+    from oscar.core.loading import get_model
+
+    return get_model(app_label, model_name)
+
+
+class LazyClass(object):
+    """Stand-in for a class that is only resolved on first use.
+
+    Calls, attribute access and ``isinstance``/``issubclass`` checks are
+    forwarded to the resolved class, so the stand-in can be used wherever the
+    class itself would be.
+    """
+
+    def __init__(self, loader, *args):
+        self._loader = loader
+        self._args = args
+        self._resolved = None
+
+    def resolve(self):
+        """Return the real class, loading it on the first call."""
+        if self._resolved is None:
+            self._resolved = self._loader(*self._args)
+        return self._resolved
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('_loader', '_args', '_resolved'):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __instancecheck__(self, instance):
+        return isinstance(instance, self.resolve())
+
+    def __subclasscheck__(self, subclass):
+        return issubclass(subclass, self.resolve())
+
+    def __repr__(self):
+        return '<LazyClass %s>' % '.'.join(self._args)
+
+
+def lazy_class(module_label, classname):
+    """Lazy version of :func:`oscar.core.loading.get_class`."""
+    return LazyClass(_load_class, module_label, classname)
+
+
+def lazy_model(app_label, model_name):
+    """Lazy version of :func:`oscar.core.loading.get_model`."""
+    return LazyClass(_load_model, app_label, model_name)
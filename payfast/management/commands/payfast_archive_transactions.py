@@ -0,0 +1,61 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payfast.config import get_config
+from payfast.retention import (
+    JSONLinesArchive, TableArchive, archive_transactions, purge_deferred_notifications, purge_webhook_events)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move Payfast transactions older than the retention policy to an archive table or to "
+        "gzipped JSON lines files, and delete the processed deferred notifications and the "
+        "delivered or failed webhook events as old, written to JSON lines files too with --to. "
+        "Interrupted runs resume when the command is run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help="Keep this many days of transactions, defaults to PAYFAST_RETENTION_DAYS.")
+        parser.add_argument('--to', metavar='DIRECTORY',
+                            help="Write gzipped JSON lines files to this directory instead of the archive table.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of rows moved per batch.")
+        parser.add_argument('--sleep', type=float, default=0.5, help="Seconds to pause between batches.")
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be archived.")
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_config().get_retention_days()
+        before = timezone.now() - timedelta(days=days)
+
+        if options['to']:
+            if not options['dry_run'] and not os.path.isdir(options['to']):
+                raise CommandError("%s is not a directory" % options['to'])
+            archive = JSONLinesArchive(options['to'])
+        else:
+            archive = TableArchive()
+
+        batching = dict((key, options[key]) for key in ('batch_size', 'sleep', 'dry_run', 'max_batches'))
+        self.report("transactions", archive_transactions(before, archive, **batching), before, archive,
+                    options['dry_run'])
+
+        for name, purge in (('deferred notifications', purge_deferred_notifications),
+                            ('webhook events', purge_webhook_events)):
+            queue_archive = JSONLinesArchive(options['to'], 'payfast-' + name.replace(' ', '-')) if options['to'] else None
+            self.report(name, purge(before, queue_archive, **batching), before, queue_archive, options['dry_run'])
+
+    def report(self, name, batches, before, archive, dry_run):
+        verb = "Archived" if archive is not None else "Deleted"
+        if dry_run:
+            verb = "Would %s" % verb[:-1].lower()
+
+        total = 0
+        for count in batches:
+            total += count
+            self.stdout.write("%s %d %s (%d so far)" % (verb, count, name, total))
+
+        self.stdout.write("%s %d %s older than %s%s." % (
+            verb, total, name, before.isoformat(), ' to %s' % archive if archive is not None else ''))
@@ -0,0 +1,34 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payfast.config import get_config
+from payfast.constants import Constants
+from payfast.facade import get_api_client
+from payfast.subscriptions import run_charges
+
+
+class Command(BaseCommand):
+    help = (
+        "Charge every active Payfast token once. Runs are checkpointed: running the "
+        "same --run again resumes it after a crash."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', help="Name of the run, defaults to nightly-<today>.")
+        parser.add_argument('--amount', type=Decimal, required=True, help="Amount to charge every token.")
+        parser.add_argument('--workers', type=int, default=4, help="Maximum number of charges in flight.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of tokens per checkpoint.")
+
+    def handle(self, *args, **options):
+        name = options['run'] or 'nightly-%s' % timezone.now().date().isoformat()
+        client = get_api_client(get_config(), pool_size=options['workers'])
+
+        run = run_charges(name, client, amount=options['amount'], workers=options['workers'],
+                          batch_size=options['batch_size'])
+
+        self.stdout.write(str(run))
+        pending = run.charges.filter(status=Constants.CHARGE_PENDING).count()
+        if pending:
+            self.stderr.write("%d charges have an unknown outcome and must be checked by hand." % pending)
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payfast.config import get_config
+from payfast.webhooks import WebhookDeliverer
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued Payfast payment events to the PAYFAST_WEBHOOK_URLS endpoints. "
+        "Delivers everything that is due and exits, unless --loop is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of events claimed at once.")
+        parser.add_argument('--workers', type=int, default=4, help="Maximum number of endpoints posted to at once.")
+        parser.add_argument('--timeout', type=float, default=10, help="Timeout of every delivery in seconds.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new events.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        config = get_config()
+        deliverer = WebhookDeliverer(
+            secret=config.get_webhook_secret(),
+            max_attempts=config.get_webhook_max_attempts(),
+            timeout=options['timeout'],
+            pool_size=options['workers'],
+        )
+
+        total_delivered = total_failed = 0
+        while True:
+            delivered, failed = deliverer.deliver(batch_size=options['batch_size'], workers=options['workers'])
+            total_delivered += delivered
+            total_failed += failed
+            if delivered or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write("Delivered %d webhook events, %d failed attempts." % (total_delivered, total_failed))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from payfast.partitioning import DEFAULT_MONTHS_AHEAD, ensure_partitions, is_supported, partition_transactions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly partitions of the Payfast transaction table ahead of time. "
+        "Use --convert once to turn the table into a partitioned table (PostgreSQL 11+ only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database to work on.")
+        parser.add_argument('--months-ahead', type=int, default=DEFAULT_MONTHS_AHEAD,
+                            help="Number of months after the current one to create partitions for.")
+        parser.add_argument('--convert', action='store_true',
+                            help="Turn the transaction table into a partitioned table first.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        if not is_supported(connection):
+            self.stdout.write("Partitioning is not supported on %s, nothing to do." % connection.vendor)
+            return
+
+        if options['convert']:
+            with transaction.atomic(using=using):
+                converted = partition_transactions(using=using)
+            self.stdout.write("Converted the transaction table." if converted else "Already partitioned.")
+
+        for name in ensure_partitions(using=using, months_ahead=options['months_ahead']):
+            self.stdout.write("Ensured partition %s" % name)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from payfast.facade import Facade
+
+
+class Command(BaseCommand):
+    help = (
+        "Validate and apply the Payfast notifications that were deferred because "
+        "Payfast could not confirm them when they arrived."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000, help="Maximum number of notifications processed.")
+
+    def handle(self, *args, **options):
+        processed = Facade().process_deferred_notifications(limit=options['limit'])
+        self.stdout.write("Processed %d deferred notifications." % processed)
@@ -0,0 +1,60 @@
+import csv
+import io
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from payfast.constants import Constants
+from payfast.reconciliation import Mismatch, read_settlement, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile a Payfast settlement export (CSV) against recorded Payfast transactions "
+        "and Oscar orders. Mismatches are written as CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Settlement export to reconcile, '-' for stdin.")
+        parser.add_argument('--output', help="Write mismatches to this file instead of stdout.")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Number of rows matched per database query.")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Number of chunks matched concurrently.")
+        parser.add_argument('--reference-column', help="Column holding the Payfast payment id.")
+        parser.add_argument('--order-column', help="Column holding the merchant payment id (order number).")
+        parser.add_argument('--gross-column', help="Column holding the gross amount.")
+        parser.add_argument('--fee-column', help="Column holding the fee.")
+
+    def handle(self, *args, **options):
+        columns = dict((key, options[option]) for key, option in (
+            (Constants.PF_PAYMENT_ID, 'reference_column'),
+            (Constants.M_PAYMENT_ID, 'order_column'),
+            (Constants.AMOUNT_GROSS, 'gross_column'),
+            (Constants.AMOUNT_FEE, 'fee_column'),
+        ) if options[option])
+
+        if options['path'] == '-':
+            source = sys.stdin
+        else:
+            source = io.open(options['path'], newline='', encoding='utf-8-sig')
+        output = io.open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else self.stdout
+
+        summary = Counter()
+        try:
+            writer = csv.writer(output)
+            writer.writerow(Mismatch._fields)
+            mismatches = reconcile(read_settlement(source, columns), options['chunk_size'], options['workers'])
+            for mismatch in mismatches:
+                summary[mismatch.kind] += 1
+                writer.writerow(mismatch)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not self.stdout:
+                output.close()
+
+        for kind, count in sorted(summary.items()):
+            self.stderr.write('%s: %d' % (kind, count))
+        self.stderr.write('Mismatches: %d' % sum(summary.values()))
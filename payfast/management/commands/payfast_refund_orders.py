@@ -0,0 +1,58 @@
+import sys
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payfast.config import get_config
+from payfast.constants import Constants
+from payfast.facade import get_api_client
+from payfast.refunds import run_refunds
+
+
+def read_orders(lines):
+    """Yield ``(order_number, amount)`` for every ``order_number[,amount]`` line, blank lines are ignored."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        order_number, __, amount = line.partition(',')
+        try:
+            yield order_number.strip(), Decimal(amount.strip()) if amount.strip() else None
+        except InvalidOperation:
+            raise CommandError("Invalid amount in line %r" % line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Refund the Payfast payments of the orders listed in a file, one order_number[,amount] per line "
+        "(the whole amount left when it is omitted). Runs are checkpointed: running the same --run on the "
+        "same file again resumes it after a crash."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="File listing the orders to refund, - for standard input.")
+        parser.add_argument('--run', help="Name of the run, defaults to refunds-<now>.")
+        parser.add_argument('--reason', default='', help="Reason of the refunds, shown to the buyers.")
+        parser.add_argument('--no-notify-buyer', action='store_false', dest='notify_buyer',
+                            help="Do not have Payfast email the buyers about their refunds.")
+        parser.add_argument('--workers', type=int, default=4, help="Maximum number of refunds in flight.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of orders per checkpoint.")
+
+    def handle(self, *args, **options):
+        name = options['run'] or 'refunds-%s' % timezone.now().strftime('%Y-%m-%dT%H%M')
+        client = get_api_client(get_config(), pool_size=options['workers'])
+
+        lines = sys.stdin if options['file'] == '-' else open(options['file'])
+        try:
+            run = run_refunds(name, client, read_orders(lines), reason=options['reason'],
+                              notify_buyer=options['notify_buyer'], workers=options['workers'],
+                              batch_size=options['batch_size'])
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+        self.stdout.write(str(run))
+        pending = run.refunds.filter(status=Constants.REFUND_PENDING).count()
+        if pending:
+            self.stderr.write("%d refunds have an unknown outcome and must be checked by hand." % pending)
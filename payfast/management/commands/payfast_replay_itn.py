@@ -0,0 +1,67 @@
+import io
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from payfast.replay import ClientTarget, HTTPTarget, WSGITarget, generate_notifications, load_notifications, replay
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay signed Payfast notifications against the notify endpoint and report "
+        "throughput, latency percentiles and error mix."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100,
+                            help="Number of notifications to generate (ignored with --file).")
+        parser.add_argument('--file', dest='path',
+                            help="Replay notifications recorded as JSON lines, '-' for stdin.")
+        parser.add_argument('--resign', action='store_true',
+                            help="Re-sign recorded notifications with the current configuration.")
+        parser.add_argument('--order-number', dest='order_numbers', action='append',
+                            help="Order number to generate notifications for, can be repeated.")
+        parser.add_argument('--amount', default='100.00',
+                            help="Gross amount of generated notifications.")
+        parser.add_argument('--url',
+                            help="Post to a running server at this URL instead of using the test client.")
+        parser.add_argument('--handler', choices=('client', 'project', 'lean'), default='client',
+                            help="In process target: the test client, the project WSGI application "
+                                 "with all its middleware, or the lean payfast.wsgi.NotifyHandler.")
+        parser.add_argument('--remote-addr', default='127.0.0.1',
+                            help="Source address used by the test client.")
+        parser.add_argument('--host', default='localhost',
+                            help="Host header used by the test client.")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Number of notifications in flight at once.")
+        parser.add_argument('--json', action='store_true',
+                            help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], 1)
+
+        if options['url']:
+            target = HTTPTarget(options['url'], workers=concurrency)
+        elif options['handler'] == 'client':
+            target = ClientTarget(remote_addr=options['remote_addr'], host=options['host'])
+        else:
+            from payfast.wsgi import NotifyHandler
+
+            application = NotifyHandler() if options['handler'] == 'lean' else None
+            target = WSGITarget(application, remote_addr=options['remote_addr'], host=options['host'])
+
+        if options['path'] == '-':
+            report = replay(load_notifications(sys.stdin, resign=options['resign']), target, concurrency)
+        elif options['path']:
+            with io.open(options['path'], encoding='utf-8') as lines:
+                report = replay(load_notifications(lines, resign=options['resign']), target, concurrency)
+        else:
+            notifications = generate_notifications(
+                options['count'], order_numbers=options['order_numbers'], amount=options['amount'])
+            report = replay(notifications, target, concurrency)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report.as_dict(), sort_keys=True))
+        else:
+            self.stdout.write(str(report))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from payfast.rollups import rebuild_rollups
+
+
+def _date(value):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError("%s is not a date (YYYY-MM-DD)" % value)
+    return day
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily Payfast revenue and fee totals from the transaction and archive tables, "
+        "a chunk of days at a time. Run it once to backfill the totals, notifications keep them up to date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=_date, help="First day (YYYY-MM-DD), defaults to the oldest transaction.")
+        parser.add_argument('--until', type=_date, help="Last day (YYYY-MM-DD), defaults to yesterday.")
+        parser.add_argument('--chunk-days', type=int, default=7, help="Number of days rebuilt per transaction.")
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        days = rows = 0
+        for first, last, count in rebuild_rollups(options['since'], options['until'],
+                                                  chunk_days=options['chunk_days'], sleep=options['sleep']):
+            days += (last - first).days + 1
+            rows += count
+            self.stdout.write("Rebuilt %s to %s (%d rows)" % (first, last, count))
+
+        self.stdout.write("Rebuilt %d days of totals (%d rows)." % (days, rows))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payfast.config import get_config
+from payfast.facade import get_api_client
+from payfast.sweeper import sweep_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Ask Payfast about orders left pending by abandoned payments, then settle the paid "
+        "ones and cancel the others. Runs are checkpointed: running the same --run again "
+        "resumes it after a crash."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', help="Name of the run, defaults to sweep-<now>.")
+        parser.add_argument('--hours', type=float,
+                            help="Sweep orders pending for longer than this, defaults to PAYFAST_ABANDONED_ORDER_HOURS.")
+        parser.add_argument('--workers', type=int, default=4, help="Maximum number of queries in flight.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of orders per checkpoint.")
+        parser.add_argument('--rate', type=float,
+                            help="Maximum number of Payfast queries per second, defaults to PAYFAST_SWEEP_RATE.")
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        name = options['run'] or 'sweep-%s' % timezone.now().strftime('%Y-%m-%dT%H%M')
+        client = get_api_client(get_config(), pool_size=options['workers'])
+
+        run = sweep_orders(name, client, hours=options['hours'], workers=options['workers'],
+                           batch_size=options['batch_size'], rate=options['rate'], sleep=options['sleep'])
+
+        self.stdout.write(str(run))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Routing of payments to many Payfast merchants.
+
+Marketplace deployments route payments to sub-merchants stored as
+:class:`~payfast.models.PayfastMerchant` rows. The :class:`GatewayPool` keeps a
+prebuilt gateway (and its signer) per active merchant in an in-memory index, so
+finding the gateway of a merchant, for instance from the ``merchant_id`` of a
+notification, is a single dict lookup.
+"""
+import threading
+import time
+import weakref
+
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import PayfastMerchant
+
+
+class GatewayPool(object):
+    """Prebuilt gateways for every active merchant, keyed by merchant id.
+
+    :param build_gateway: Callable building the gateway of a
+        :class:`~payfast.models.PayfastMerchant`.
+    :param ttl: Seconds the index is trusted before checking for changes.
+
+    The index is refreshed lazily: once the ``ttl`` expired, the next lookup runs
+    a single aggregate query to see whether the merchant table changed and only
+    reloads the merchants when it did. Saving or deleting a merchant invalidates
+    the pools of the current process straight away.
+    """
+
+    _instances = weakref.WeakSet()
+
+    def __init__(self, build_gateway, ttl=60):
+        self.build_gateway = build_gateway
+        self.ttl = ttl
+        self.gateways = {}
+        self.version = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+        self._instances.add(self)
+
+    def invalidate(self):
+        """Force a reload on the next lookup."""
+        self.version = self.checked_at = None
+
+    @staticmethod
+    def _table_version():
+        stats = PayfastMerchant.objects.aggregate(count=Count('id'), updated=Max('date_updated'))
+        return stats['count'], stats['updated']
+
+    def _is_stale(self, now):
+        return self.checked_at is None or now - self.checked_at >= self.ttl
+
+    def refresh(self, now=None):
+        """Reload the index if the merchant table changed since the last load."""
+        now = time.time() if now is None else now
+        with self.lock:
+            # Another thread may have refreshed the index while we waited.
+            if not self._is_stale(now):
+                return
+
+            version = self._table_version()
+            if version != self.version:
+                merchants = PayfastMerchant.objects.filter(is_active=True).iterator()
+                self.gateways = dict((merchant.merchant_id, self.build_gateway(merchant)) for merchant in merchants)
+                self.version = version
+            self.checked_at = now
+
+    def get(self, merchant_id):
+        """Return the gateway of ``merchant_id`` or None if it is unknown."""
+        if self._is_stale(time.time()):
+            self.refresh()
+        return self.gateways.get(str(merchant_id))
+
+
+@receiver(post_save, sender=PayfastMerchant)
+@receiver(post_delete, sender=PayfastMerchant)
+def invalidate_gateway_pools(**kwargs):
+    for pool in list(GatewayPool._instances):
+        pool.invalidate()
@@ -1,20 +1,42 @@
 # -*- coding: utf-8 -*-
+import json
+from datetime import timedelta
 
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_save
 from django.utils import timezone
-from oscar.core.loading import get_class
 
-Constants = get_class('payfast.gateway', 'Constants')
-# Order = get_class('oscar.apps.order.models', 'Order')
+from .constants import Constants
+
+
+class PayfastTransactionQuerySet(models.QuerySet):
+    """Date bounded lookups of transactions.
+
+    When the table is partitioned (see :mod:`payfast.partitioning`) bounds on
+    ``date_created`` let PostgreSQL skip every partition outside of them.
+    """
+
+    def created_between(self, start=None, end=None):
+        """Transactions created from ``start`` (inclusive) to ``end`` (exclusive)."""
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(date_created__gte=start)
+        if end is not None:
+            queryset = queryset.filter(date_created__lt=end)
+        return queryset
+
+    def recent(self, days=30):
+        """Transactions created during the last ``days`` days."""
+        return self.created_between(start=timezone.now() - timedelta(days=days))
 
 
 class PayfastTransaction(models.Model):
 
     # we create an order before redirecting to payfast. The transaction updated
-    order_number = models.CharField(max_length=20)
+    order_number = models.CharField(max_length=20, db_index=True)
 
-    payfast_reference = models.CharField(max_length=255, blank=True, null=True)
+    payfast_reference = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     method = models.CharField(max_length=255, blank=True, null=True)
     status = models.CharField(max_length=255, blank=True, null=True)
 
@@ -26,17 +48,337 @@ class PayfastTransaction(models.Model):
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     date_created = models.DateTimeField(default=timezone.now)
 
+    objects = PayfastTransactionQuerySet.as_manager()
+
     class Meta:
         ordering = ('-date_created',)
+        # Keyset pagination of the dashboard walks (date_created, id).
+        index_together = (('date_created', 'id'), ('status', 'date_created'))
 
     def __str__(self):
 
         # Payfast transaction description
         return u'Payfast %s txn %s | amount: %s | status: %s' % (
-            self.method.upper(),
-            self.reference,
+            (self.method or 'unknown').upper(),
+            self.payfast_reference,
             self.amount,
             self.status)
 
     def __unicode__(self):
         return str(self)
+
+
+class PayfastRollupQuerySet(models.QuerySet):
+    """Lookups of the daily transaction totals."""
+
+    def between(self, start=None, end=None):
+        """Totals of the days from ``start`` to ``end``, both inclusive."""
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(day__gte=start)
+        if end is not None:
+            queryset = queryset.filter(day__lte=end)
+        return queryset
+
+
+class PayfastRollup(models.Model):
+    """Totals of the transactions of a day, per status and currency.
+
+    Rows are kept up to date by :mod:`payfast.rollups` as transactions are
+    recorded, so reports read a handful of rows instead of aggregating the
+    transaction table. Archived transactions stay counted.
+    """
+
+    day = models.DateField()
+    # Empty for transactions recorded without a status.
+    status = models.CharField(max_length=255, blank=True)
+    currency = models.CharField(max_length=3)
+
+    count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(decimal_places=2, max_digits=16, default=0)
+    amount_fee = models.DecimalField(decimal_places=2, max_digits=16, default=0)
+    amount_net = models.DecimalField(decimal_places=2, max_digits=16, default=0)
+
+    date_updated = models.DateTimeField(auto_now=True)
+
+    objects = PayfastRollupQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-day', 'status', 'currency')
+        unique_together = ('day', 'status', 'currency')
+
+    def __str__(self):
+        return u'Payfast rollup %s | status: %s | count: %s | amount: %s %s' % (
+            self.day, self.status, self.count, self.amount, self.currency)
+
+
+class PayfastToken(models.Model):
+    """A card tokenized by Payfast, used for ad hoc (subscription) charges."""
+
+    token = models.CharField(max_length=36, unique=True)
+    # the order that tokenized the card
+    order_number = models.CharField(max_length=20, db_index=True)
+
+    # the amount of that order, for reference: charges are given their own amount
+    amount = models.DecimalField(decimal_places=2, max_digits=12, blank=True, null=True)
+    item_name = models.CharField(max_length=100, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    date_created = models.DateTimeField(default=timezone.now)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-date_created',)
+
+    def __str__(self):
+        return u'Payfast token %s | order: %s | active: %s' % (self.token, self.order_number, self.is_active)
+
+
+class PayfastChargeRun(models.Model):
+    """A batch of ad hoc charges against all active tokens.
+
+    ``last_token_id`` checkpoints the progress of the run so that an interrupted
+    run resumes where it stopped.
+    """
+
+    name = models.CharField(max_length=128, unique=True)
+    last_token_id = models.PositiveIntegerField(default=0)
+    charged = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+
+    date_created = models.DateTimeField(default=timezone.now)
+    date_finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('-date_created',)
+
+    def __str__(self):
+        return u'Payfast charge run %s | charged: %s | failed: %s' % (self.name, self.charged, self.failed)
+
+
+class PayfastCharge(models.Model):
+    """A single ad hoc charge of a run.
+
+    The row is written as ``PENDING`` before the charge is sent. A charge left
+    ``PENDING`` by a crash has an unknown outcome and is never retried.
+    """
+
+    run = models.ForeignKey(PayfastChargeRun, related_name='charges', on_delete=models.CASCADE)
+    token = models.ForeignKey(PayfastToken, related_name='charges', on_delete=models.CASCADE)
+
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    status = models.CharField(max_length=32, default=Constants.CHARGE_PENDING)
+    message = models.CharField(max_length=255, blank=True)
+
+    date_created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('run', 'token')
+
+    def __str__(self):
+        return u'Payfast charge %s | token: %s | status: %s' % (self.amount, self.token_id, self.status)
+
+
+class PayfastRefundRun(models.Model):
+    """A batch of refunds of a list of orders.
+
+    ``position`` checkpoints the progress of the run through the list so that
+    an interrupted run resumes where it stopped.
+    """
+
+    name = models.CharField(max_length=128, unique=True)
+    position = models.PositiveIntegerField(default=0)
+    refunded = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+
+    date_created = models.DateTimeField(default=timezone.now)
+    date_finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('-date_created',)
+
+    def __str__(self):
+        return u'Payfast refund run %s | refunded: %s | failed: %s | skipped: %s' % (
+            self.name, self.refunded, self.failed, self.skipped)
+
+
+class PayfastRefund(models.Model):
+    """A refund of a Payfast payment, on its own or as part of a run.
+
+    The row is written as ``PENDING`` before the refund is sent. A refund left
+    ``PENDING`` by a crash has an unknown outcome and is never retried.
+    """
+
+    run = models.ForeignKey(PayfastRefundRun, related_name='refunds', blank=True, null=True, on_delete=models.CASCADE)
+    order_number = models.CharField(max_length=20, db_index=True)
+    payfast_reference = models.CharField(max_length=255, db_index=True)
+
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    reason = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=32, default=Constants.REFUND_PENDING)
+    message = models.CharField(max_length=255, blank=True)
+
+    date_created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ('-date_created',)
+        unique_together = ('run', 'order_number')
+
+    def __str__(self):
+        return u'Payfast refund %s | order: %s | status: %s' % (self.amount, self.order_number, self.status)
+
+
+class PayfastSweepRun(models.Model):
+    """A sweep of the orders left pending by customers who never paid.
+
+    ``cutoff`` is fixed when the run starts and ``last_order_id`` checkpoints
+    its progress, so an interrupted run resumes on the same orders.
+    """
+
+    name = models.CharField(max_length=128, unique=True)
+    cutoff = models.DateTimeField()
+    last_order_id = models.PositiveIntegerField(default=0)
+    settled = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+
+    date_created = models.DateTimeField(default=timezone.now)
+    date_finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('-date_created',)
+
+    def __str__(self):
+        return u'Payfast sweep %s | settled: %s | cancelled: %s | skipped: %s' % (
+            self.name, self.settled, self.cancelled, self.skipped)
+
+
+class PayfastMerchant(models.Model):
+    """A Payfast (sub-)merchant account payments can be routed to."""
+
+    merchant_id = models.CharField(max_length=20, unique=True)
+    merchant_key = models.CharField(max_length=40)
+    passphrase = models.CharField(max_length=255, blank=True)
+    name = models.CharField(max_length=128, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    date_created = models.DateTimeField(default=timezone.now)
+    date_updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        ordering = ('merchant_id',)
+
+    def __str__(self):
+        return u'Payfast merchant %s | %s' % (self.merchant_id, self.name)
+
+
+class PayfastWebhookEvent(models.Model):
+    """A payment event waiting to be delivered to a downstream webhook endpoint.
+
+    Events are written in the same transaction as the notification they come
+    from (the outbox pattern), one per endpoint, and delivered later by the
+    ``payfast_deliver_webhooks`` command. ``next_attempt_at`` schedules retries.
+    """
+
+    url = models.URLField(max_length=500)
+    event_type = models.CharField(max_length=64)
+    payload = models.TextField()
+
+    status = models.CharField(max_length=32, default=Constants.WEBHOOK_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=255, blank=True)
+
+    date_created = models.DateTimeField(default=timezone.now)
+    date_delivered = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('pk',)
+        index_together = (('status', 'next_attempt_at'),)
+
+    def __str__(self):
+        return u'Payfast webhook %s | %s | status: %s' % (self.event_type, self.url, self.status)
+
+
+class PayfastDeferredNotification(models.Model):
+    """A genuine looking notification Payfast could not confirm when it arrived.
+
+    It is kept with its signature and processed again by the
+    ``payfast_process_deferred`` command once Payfast is reachable.
+    """
+
+    params = models.TextField()
+    ip_address = models.GenericIPAddressField(blank=True, null=True)
+    error = models.CharField(max_length=255, blank=True)
+
+    date_created = models.DateTimeField(default=timezone.now)
+    date_processed = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    class Meta:
+        ordering = ('pk',)
+
+    def __str__(self):
+        return u'Payfast deferred notification %s | processed: %s' % (self.pk, self.date_processed)
+
+
+class PayfastTransactionArchive(models.Model):
+    """A :class:`PayfastTransaction` moved out of the hot table by the retention job."""
+
+    original_id = models.PositiveIntegerField(unique=True)
+    order_number = models.CharField(max_length=20, db_index=True)
+
+    payfast_reference = models.CharField(max_length=255, blank=True, null=True, db_index=True)
+    method = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=255, blank=True, null=True)
+
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    amount_net = models.DecimalField(decimal_places=2, max_digits=12, blank=True, null=True)
+    amount_fee = models.DecimalField(decimal_places=2, max_digits=12, blank=True, null=True)
+    currency = models.CharField(max_length=3, default=settings.OSCAR_DEFAULT_CURRENCY)
+
+    ip_address = models.GenericIPAddressField(blank=True, null=True)
+    date_created = models.DateTimeField()
+    date_archived = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ('-date_created',)
+
+    def __str__(self):
+        return u'Archived Payfast txn %s | order: %s | amount: %s' % (
+            self.payfast_reference, self.order_number, self.amount)
+
+
+class PayfastPaymentForm(models.Model):
+    """The signed payment form fields of an order, computed once when it is placed.
+
+    ``redirect_view`` renders them as they are instead of signing the form on
+    every redirect. ``amount`` is the total the fields were signed for, the
+    record is deleted as soon as the order is saved with another total.
+    """
+
+    order_number = models.CharField(max_length=128, unique=True)
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    # JSON list of [name, value] pairs, in signing order.
+    fields = models.TextField()
+
+    date_created = models.DateTimeField(default=timezone.now)
+
+    def get_form_fields(self):
+        """Return the fields in the format of :meth:`payfast.facade.Facade.build_payment_form_fields`."""
+        return [{'type': 'hidden', 'name': name, 'value': value} for name, value in json.loads(self.fields)]
+
+    def __str__(self):
+        return u'Payfast payment form | order: %s | amount: %s' % (self.order_number, self.amount)
+
+
+def invalidate_payment_form(sender, instance, **kwargs):
+    """Drop the presigned form of an order whose total no longer matches it.
+
+    Orders changed with ``QuerySet.update()`` do not send ``post_save``, their
+    forms have to be deleted explicitly.
+    """
+    PayfastPaymentForm.objects.filter(order_number=instance.number).exclude(amount=instance.total_incl_tax).delete()
+
+
+post_save.connect(invalidate_payment_form, sender='order.Order', dispatch_uid='payfast_invalidate_payment_form')
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Onsite payments: the Payfast payment modal opened on the checkout page.
+
+Instead of posting the payment form to Payfast, the signed form fields are
+posted server to server to the Payfast onsite endpoint, which answers with a
+UUID. The page then loads the Payfast engine script and opens the modal with
+``window.payfast_do_onsite_payment({uuid: ...})``.
+
+Asking for a UUID is a round trip to Payfast, so :func:`get_onsite_uuid` keeps
+the UUID of every order in a cache (``payfast:onsite:<m_payment_id>``) together
+with the signature of the fields it was issued for. Reloading the checkout page
+reuses the UUID until the order changes, which changes the signature.
+
+Concurrent requests for one order, such as a double click or a page loaded in
+two tabs, are collapsed into a single call: the first request takes a lock with
+``cache.add`` and calls Payfast, the others poll the cache for its UUID every
+:data:`POLL_INTERVAL` seconds. With a shared cache backend this holds across
+processes as well as threads.
+"""
+import time
+
+from .constants import Constants
+from .exceptions import PayfastUnavailableException
+
+#: Seconds between two cache reads of a request waiting for a UUID.
+POLL_INTERVAL = 0.05
+
+
+def _cache_key(order_number):
+    return 'payfast:onsite:%s' % order_number
+
+
+def get_onsite_uuid(fields, request_uuid, cache, timeout, wait):
+    """Return the onsite payment UUID of the signed payment form ``fields``.
+
+    :param dict fields: Signed payment form fields.
+    :param request_uuid: Callable asking Payfast for the UUID of ``fields``,
+        only called when no UUID for these exact fields is cached.
+    :param cache: Django cache the UUIDs are kept in.
+    :param int timeout: Seconds a UUID is reused for.
+    :param wait: Seconds to wait for a concurrent request asking for the same
+        UUID, and lifetime of its lock.
+    :raises: PayfastUnavailableException when the concurrent request did not
+        get a UUID in time, or what ``request_uuid`` raises.
+    """
+    key = _cache_key(fields[Constants.M_PAYMENT_ID])
+    lock_key = key + ':lock'
+    signature = fields[Constants.SIGNATURE]
+    deadline = time.time() + wait
+
+    while True:
+        cached = cache.get(key)
+        if cached is not None and cached['signature'] == signature:
+            return cached['uuid']
+
+        if cache.add(lock_key, signature, wait):
+            try:
+                uuid = request_uuid()
+                cache.set(key, {'signature': signature, 'uuid': uuid}, timeout)
+                return uuid
+            finally:
+                cache.delete(lock_key)
+
+        if time.time() >= deadline:
+            raise PayfastUnavailableException(
+                "Timed out waiting for the onsite payment of order %s" % fields[Constants.M_PAYMENT_ID])
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Optional time based partitioning of :class:`~payfast.models.PayfastTransaction`.
+
+On PostgreSQL 11 and later the transaction table can be turned into a
+declarative partitioned table with one partition per month of
+``date_created``, plus a default partition catching anything else. New rows
+are routed to their month by PostgreSQL itself, so concurrent ITN writes of
+different months never touch the same heap and indexes, and old months can be
+detached or dropped at once.
+
+The conversion is a one off, run from a project migration::
+
+    from django.db import migrations
+    from payfast.partitioning import partition_transactions
+
+    class Migration(migrations.Migration):
+        dependencies = [('payfast', '...')]
+        operations = [migrations.RunPython(partition_transactions, migrations.RunPython.noop)]
+
+or with ``manage.py payfast_partitions --convert``. Partitions for the coming
+months must then be created ahead of time, for instance daily from cron with
+``manage.py payfast_partitions``. A month missed by those runs has its rows in
+the default partition, creating it later moves them to it.
+
+Any other database, SQLite in tests for instance, keeps a plain table: every
+helper here is then a no-op, and the date bounded queries of
+:class:`~payfast.models.PayfastTransactionQuerySet` behave the same.
+"""
+from datetime import datetime, timedelta
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+DEFAULT_MONTHS_AHEAD = 3
+
+
+def is_supported(connection):
+    """Return whether ``connection`` supports declarative partitioning."""
+    return connection.vendor == 'postgresql' and connection.pg_version >= 110000
+
+
+def month_start(moment):
+    """Return the first instant (UTC) of the month of ``moment``."""
+    moment = timezone.localtime(moment, timezone.utc) if timezone.is_aware(moment) else moment
+    start = datetime(moment.year, moment.month, 1)
+    return timezone.make_aware(start, timezone.utc) if timezone.is_aware(moment) else start
+
+
+def next_month(start):
+    """Return the first instant of the month after the month starting at ``start``."""
+    return month_start(start + timedelta(days=32))
+
+
+def partition_name(table, start):
+    """Return the name of the partition of ``table`` holding the month starting at ``start``."""
+    return '%s_y%04dm%02d' % (table, start.year, start.month)
+
+
+def _months(table, start, months):
+    """Yield ``(name, start, end)`` for the partitions of ``months`` months from ``start``."""
+    start = month_start(start)
+    for __ in range(months):
+        end = next_month(start)
+        yield partition_name(table, start), start, end
+        start = end
+
+
+def _create_sql(table, name, start, end):
+    return (
+        'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+        "FOR VALUES FROM ('{start}') TO ('{end}')"
+    ).format(name=name, table=table, start=start.isoformat(), end=end.isoformat())
+
+
+def partitions_sql(table, start, months):
+    """Return the statements creating the partitions of ``months`` months from ``start``.
+
+    :return: List of ``(name, sql)`` tuples.
+    """
+    return [(name, _create_sql(table, name, start, end)) for name, start, end in _months(table, start, months)]
+
+
+def split_default_sql(table, name, start, end):
+    """Return the statements creating a partition for rows already in the default partition.
+
+    PostgreSQL refuses to create a partition whose range holds rows of the
+    default partition, as happens after a missed run of
+    :func:`ensure_partitions`. The default partition is detached, the month
+    created, its rows moved out of the default partition and the default
+    partition attached again. Run them in one transaction.
+    """
+    default = '%s_default' % table
+    bounds = "\"date_created\" >= '{start}' AND \"date_created\" < '{end}'".format(
+        start=start.isoformat(), end=end.isoformat())
+    return [
+        'ALTER TABLE "{table}" DETACH PARTITION "{default}"'.format(table=table, default=default),
+        _create_sql(table, name, start, end),
+        'INSERT INTO "{name}" SELECT * FROM "{default}" WHERE {bounds}'.format(name=name, default=default, bounds=bounds),
+        'DELETE FROM "{default}" WHERE {bounds}'.format(default=default, bounds=bounds),
+        'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT'.format(table=table, default=default),
+    ]
+
+
+def _index_columns(model):
+    """Yield the column tuples indexed on ``model``, except its primary key."""
+    for field in model._meta.fields:
+        if field.db_index and not field.primary_key and not field.unique:
+            yield (field.column,)
+    for fields in model._meta.index_together:
+        yield tuple(model._meta.get_field(name).column for name in fields)
+
+
+def convert_sql(model, now=None, months_ahead=DEFAULT_MONTHS_AHEAD):
+    """Return the statements turning the table of ``model`` into a partitioned table.
+
+    The existing rows are copied to the partitioned table, which keeps the
+    table name, the columns, their defaults (including the ``id`` sequence) and
+    the indexes of ``model``. PostgreSQL requires the partition key to be part
+    of the primary key, so it becomes ``(id, date_created)``.
+    """
+    table = model._meta.db_table
+    legacy = table + '_unpartitioned'
+    pk = model._meta.pk.column
+    now = now or timezone.now()
+
+    statements = [
+        'ALTER TABLE "{table}" RENAME TO "{legacy}"',
+        'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS) PARTITION BY RANGE ("date_created")',
+        'ALTER TABLE "{table}" ADD PRIMARY KEY ("{pk}", "date_created")',
+        'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT',
+    ]
+    statements = [statement.format(table=table, legacy=legacy, pk=pk) for statement in statements]
+    # Partitions must exist before the copy, rows of other months land in the default one.
+    statements.extend(sql for __, sql in partitions_sql(table, now, months_ahead))
+    for columns in _index_columns(model):
+        statements.append('CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({columns})'.format(
+            name='%s_%s_part_idx' % (table, '_'.join(columns)), table=table,
+            columns=', '.join('"%s"' % column for column in columns)))
+    statements.extend(statement.format(table=table, legacy=legacy, pk=pk) for statement in (
+        'INSERT INTO "{table}" SELECT * FROM "{legacy}"',
+        # The sequence belongs to the old table and would be dropped with it.
+        'ALTER SEQUENCE "{table}_{pk}_seq" OWNED BY "{table}"."{pk}"',
+        'DROP TABLE "{legacy}"',
+    ))
+    return statements
+
+
+def _transaction_model(apps=None):
+    if apps is not None:
+        return apps.get_model('payfast', 'PayfastTransaction')
+    from .models import PayfastTransaction
+
+    return PayfastTransaction
+
+
+def is_partitioned(connection, table):
+    """Return whether ``table`` already is a partitioned table."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s', [table])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def partition_transactions(apps=None, schema_editor=None, using='default'):
+    """Turn the transaction table into a partitioned table.
+
+    Usable as a ``RunPython`` migration operation. Does nothing on databases
+    without declarative partitioning.
+
+    :return: Whether the table was converted.
+    """
+    connection = schema_editor.connection if schema_editor is not None else connections[using]
+    if not is_supported(connection):
+        return False
+
+    model = _transaction_model(apps)
+    if is_partitioned(connection, model._meta.db_table):
+        return False
+    with connection.cursor() as cursor:
+        for statement in convert_sql(model):
+            cursor.execute(statement)
+    return True
+
+
+def _table_exists(cursor, name):
+    cursor.execute('SELECT 1 FROM pg_class WHERE relname = %s', [name])
+    return cursor.fetchone() is not None
+
+
+def _default_has_rows(cursor, table, start, end):
+    cursor.execute(
+        'SELECT EXISTS (SELECT 1 FROM "%s_default" WHERE "date_created" >= %%s AND "date_created" < %%s)' % table,
+        [start, end])
+    return cursor.fetchone()[0]
+
+
+def ensure_partitions(using='default', months_ahead=DEFAULT_MONTHS_AHEAD, now=None):
+    """Create the partitions of the current month and of the ``months_ahead`` next ones.
+
+    A month whose rows already went to the default partition is split out of
+    it, see :func:`split_default_sql`.
+
+    :return: Names of the partitions ensured, empty when the table is not partitioned.
+    """
+    connection = connections[using]
+    table = _transaction_model()._meta.db_table
+    if not is_supported(connection) or not is_partitioned(connection, table):
+        return []
+
+    names = []
+    for name, start, end in _months(table, now or timezone.now(), months_ahead + 1):
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            if not _table_exists(cursor, name):
+                if _default_has_rows(cursor, table, start, end):
+                    statements = split_default_sql(table, name, start, end)
+                else:
+                    statements = [_create_sql(table, name, start, end)]
+                for statement in statements:
+                    cursor.execute(statement)
+        names.append(name)
+    return names
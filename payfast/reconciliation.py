@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Reconcile Payfast settlement exports against recorded transactions.
+
+Settlement exports downloaded from the Payfast dashboard can hold hundreds of
+thousands of rows. Everything here is a generator: rows are parsed lazily,
+grouped in chunks, and every chunk is matched with one query against
+:class:`~payfast.models.PayfastTransaction` and one against Oscar orders. Memory
+use therefore depends on the chunk size, not on the size of the export.
+"""
+import csv
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import connections
+
+from .concurrency import imap_bounded
+from .constants import Constants
+from .loading import lazy_model
+from .models import PayfastTransaction
+
+Order = lazy_model('order', 'Order')
+
+#: Column names of the Payfast settlement export.
+SETTLEMENT_COLUMNS = {
+    Constants.PF_PAYMENT_ID: 'PF Payment ID',
+    Constants.M_PAYMENT_ID: 'M Payment ID',
+    Constants.AMOUNT_GROSS: 'Gross',
+    Constants.AMOUNT_FEE: 'Fee',
+}
+
+SettlementRow = namedtuple('SettlementRow', 'line reference order_number amount amount_fee')
+
+Mismatch = namedtuple('Mismatch', 'kind line reference order_number expected actual')
+
+MISSING_ITN = 'missing_itn'
+MISSING_ORDER = 'missing_order'
+AMOUNT_DRIFT = 'amount_drift'
+FEE_DRIFT = 'fee_drift'
+
+
+def _to_decimal(value):
+    try:
+        return Decimal((value or '').replace(',', '').strip())
+    except InvalidOperation:
+        return None
+
+
+def read_settlement(lines, columns=None):
+    """Yield a :class:`SettlementRow` for every payment in a settlement export.
+
+    :param lines: An iterable of CSV lines, such as an open file.
+    :param dict columns: Overrides for :data:`SETTLEMENT_COLUMNS`.
+
+    Rows without a Payfast payment id (balance lines, payouts) are skipped.
+    """
+    names = dict(SETTLEMENT_COLUMNS, **(columns or {}))
+    reader = csv.DictReader(lines)
+    for line, row in enumerate(reader, start=2):
+        reference = (row.get(names[Constants.PF_PAYMENT_ID]) or '').strip()
+        if not reference:
+            continue
+
+        yield SettlementRow(
+            line=line,
+            reference=reference,
+            order_number=(row.get(names[Constants.M_PAYMENT_ID]) or '').strip(),
+            amount=_to_decimal(row.get(names[Constants.AMOUNT_GROSS])),
+            amount_fee=_to_decimal(row.get(names[Constants.AMOUNT_FEE])),
+        )
+
+
+def chunked(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def reconcile_chunk(rows):
+    """Return the mismatches found in a chunk of settlement ``rows``."""
+    transactions = {}
+    queryset = PayfastTransaction.objects.filter(
+        payfast_reference__in=[row.reference for row in rows],
+        status=Constants.PAYMENT_RESULT_COMPLETE,
+    ).values_list('payfast_reference', 'order_number', 'amount', 'amount_fee')
+    # Payfast retries ITNs, the latest one recorded wins.
+    for reference, order_number, amount, amount_fee in queryset.order_by('date_created', 'id'):
+        transactions[reference] = (order_number, amount, amount_fee)
+
+    order_numbers = set(row.order_number for row in rows if row.order_number)
+    order_numbers.update(txn[0] for txn in transactions.values())
+    totals = dict(Order.objects.filter(number__in=order_numbers).values_list('number', 'total_incl_tax'))
+
+    mismatches = []
+    for row in rows:
+        txn = transactions.get(row.reference)
+        if txn is None:
+            mismatches.append(Mismatch(MISSING_ITN, row.line, row.reference, row.order_number, row.amount, None))
+            continue
+
+        order_number, amount, amount_fee = txn
+        if order_number not in totals:
+            mismatches.append(Mismatch(MISSING_ORDER, row.line, row.reference, order_number, row.amount, None))
+        elif row.amount != amount or row.amount != totals[order_number]:
+            actual = amount if row.amount != amount else totals[order_number]
+            mismatches.append(Mismatch(AMOUNT_DRIFT, row.line, row.reference, order_number, row.amount, actual))
+
+        # Payfast reports fees as negative amounts in some places only.
+        if amount_fee is not None and row.amount_fee is not None and abs(row.amount_fee) != abs(amount_fee):
+            mismatches.append(Mismatch(FEE_DRIFT, row.line, row.reference, order_number, row.amount_fee, amount_fee))
+
+    return mismatches
+
+
+def _reconcile_chunk_in_thread(rows):
+    try:
+        return reconcile_chunk(rows)
+    finally:
+        # Worker threads own their database connections.
+        connections.close_all()
+
+
+def reconcile(rows, chunk_size=1000, workers=1):
+    """Yield a :class:`Mismatch` for every discrepancy in settlement ``rows``.
+
+    :param rows: Iterable of :class:`SettlementRow`, see :func:`read_settlement`.
+    :param int chunk_size: Number of rows matched per query.
+    :param int workers: Number of chunks matched concurrently.
+    """
+    func = _reconcile_chunk_in_thread if workers > 1 else reconcile_chunk
+    for mismatches in imap_bounded(func, chunked(rows, chunk_size), workers=workers):
+        for mismatch in mismatches:
+            yield mismatch
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""Refunds of Payfast payments through the Payfast API.
+
+A payment is refunded against the latest ``COMPLETE``
+:class:`~payfast.models.PayfastTransaction` of its order, whose
+``payfast_reference`` is the Payfast payment id. Refunds that succeeded or are
+still pending count against the amount left to refund, so an order is never
+refunded more than it paid. Successful refunds are also recorded on the Oscar
+payment ``Source`` of the order.
+
+:func:`refund_order` refunds a single order. :func:`run_refunds` refunds a list
+of orders in batches:
+
+1. a ``PENDING`` :class:`~payfast.models.PayfastRefund` is written for every
+   refundable order of the batch that this run has not refunded yet, with the
+   Payfast transactions of the batch locked,
+2. the refunds are sent through a shared, pooled
+   :class:`~payfast.client.PayfastAPIClient` by a bounded number of threads,
+3. the results and the run checkpoint, the position in the list, are saved in
+   one transaction.
+
+Running the same run on the same list again after a crash resumes after the
+last checkpoint. Refunds still ``PENDING``, left by a crash or by a call
+Payfast did not answer, may or may not have been paid out: they keep counting
+against the amount left to refund, are never sent again and have to be
+checked by hand.
+"""
+import logging
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .concurrency import imap_bounded
+from .constants import Constants
+from .exceptions import InvalidRefundException, PayfastAPIException, PayfastUnavailableException
+from .loading import lazy_model
+from .models import PayfastRefund, PayfastRefundRun, PayfastTransaction
+
+Source = lazy_model('payment', 'Source')
+
+logger = logging.getLogger('payfast')
+
+# Refunds counting against the amount left to refund.
+COUNTED_STATUSES = (Constants.REFUND_PENDING, Constants.REFUND_SUCCESS)
+
+
+def _refundable_transactions(order_numbers, lock=False):
+    """Return the latest completed Payfast transaction of every order, by order number."""
+    transactions = PayfastTransaction.objects.filter(
+        order_number__in=order_numbers,
+        status=Constants.PAYMENT_RESULT_COMPLETE,
+        payfast_reference__isnull=False,
+    ).order_by('date_created', 'pk')
+    if lock:
+        transactions = transactions.select_for_update()
+    # Later transactions overwrite earlier ones.
+    return dict((txn.order_number, txn) for txn in transactions)
+
+
+def _refunded_amounts(references):
+    """Return the amount already refunded, or being refunded, per Payfast reference."""
+    rows = PayfastRefund.objects.filter(payfast_reference__in=references, status__in=COUNTED_STATUSES).values(
+        'payfast_reference').annotate(total=Sum('amount')).order_by()
+    return dict((row['payfast_reference'], row['total']) for row in rows)
+
+
+def _check_amount(order_number, txn, refunded, amount=None):
+    """Return the amount to refund, all that is left by default.
+
+    :raises: InvalidRefundException
+    """
+    if txn is None:
+        raise InvalidRefundException("Order %s has no completed Payfast payment" % order_number)
+
+    left = txn.amount - (refunded or 0)
+    amount = left if amount is None else Decimal(amount)
+    if amount <= 0 or amount > left:
+        raise InvalidRefundException("Order %s has %s left to refund, cannot refund %s" % (order_number, left, amount))
+    return amount
+
+
+def _send_refund(client, refund, notify_buyer=True):
+    """Send ``refund`` and return it with its outcome. Runs in a worker thread.
+
+    A refund Payfast did not answer, because of a timeout, a connection error
+    or a server error, may still have been paid out: it stays ``PENDING``.
+    """
+    try:
+        client.refund_payment(refund.payfast_reference, refund.amount, refund.reason, notify_buyer=notify_buyer)
+    except PayfastUnavailableException as e:
+        logger.warning("Refund of order %s has an unknown outcome: %s", refund.order_number, e)
+        refund.message = str(e)[:255]
+    except PayfastAPIException as e:
+        logger.warning("Refund of order %s failed: %s", refund.order_number, e)
+        refund.status, refund.message = Constants.REFUND_FAILED, str(e)[:255]
+    else:
+        refund.status = Constants.REFUND_SUCCESS
+    return refund
+
+
+def _record_source_refunds(refunds):
+    """Record successful ``refunds`` on the Oscar payment sources of their orders."""
+    refunds = dict((refund.payfast_reference, refund) for refund in refunds)
+    sources = Source.objects.filter(
+        reference__in=refunds, source_type__name=Constants.SOURCE_TYPE_NAME).select_related('order')
+    for source in sources:
+        refund = refunds[source.reference]
+        if source.order.number == refund.order_number:
+            source.refund(refund.amount, reference=refund.payfast_reference, status=refund.status)
+
+
+def refund_order(client, order_number, amount=None, reason='', notify_buyer=True):
+    """Refund the Payfast payment of ``order_number``.
+
+    :param client: A :class:`~payfast.client.PayfastAPIClient`.
+    :param amount: Amount to refund, defaults to all that is left to refund.
+    :param str reason: Reason of the refund, shown to the buyer.
+    :param bool notify_buyer: Have Payfast email the buyer about the refund.
+    :return: The :class:`~payfast.models.PayfastRefund`, ``SUCCESS``,
+        ``FAILED`` with the reason in ``message``, or still ``PENDING`` when
+        Payfast did not answer and the refund has to be checked by hand.
+    :raises: InvalidRefundException when the order cannot be refunded.
+    """
+    order_number = str(order_number)
+    with transaction.atomic():
+        # Locking the transaction serializes concurrent refunds of the order.
+        txn = _refundable_transactions([order_number], lock=True).get(order_number)
+        refunded = _refunded_amounts([txn.payfast_reference]).get(txn.payfast_reference) if txn else None
+        amount = _check_amount(order_number, txn, refunded, amount)
+        refund = PayfastRefund.objects.create(
+            order_number=order_number, payfast_reference=txn.payfast_reference, amount=amount, reason=reason)
+
+    _send_refund(client, refund, notify_buyer)
+    with transaction.atomic():
+        refund.save(update_fields=['status', 'message'])
+        if refund.status == Constants.REFUND_SUCCESS:
+            _record_source_refunds([refund])
+    return refund
+
+
+def _reserve_refunds(run, batch, reason):
+    """Write the ``PENDING`` refunds of a batch and return them with the number of skipped orders.
+
+    Runs in the caller's transaction. The Payfast transactions of the batch are
+    locked like in :func:`refund_order`, so concurrent refunds of the same orders
+    are checked against each other's amounts.
+    """
+    order_numbers = [order_number for order_number, __ in batch]
+    transactions = _refundable_transactions(order_numbers, lock=True)
+    done = set(PayfastRefund.objects.filter(run=run, order_number__in=order_numbers).values_list(
+        'order_number', flat=True))
+    refunded = _refunded_amounts([txn.payfast_reference for txn in transactions.values()])
+
+    refunds, skipped = [], 0
+    for order_number, amount in batch:
+        if order_number in done:
+            continue
+        txn = transactions.get(order_number)
+        try:
+            amount = _check_amount(order_number, txn, refunded.get(getattr(txn, 'payfast_reference', None)), amount)
+        except InvalidRefundException as e:
+            logger.info("Skipping refund: %s", e)
+            skipped += 1
+            continue
+        done.add(order_number)
+        refunds.append(PayfastRefund(
+            run=run, order_number=order_number, payfast_reference=txn.payfast_reference, amount=amount, reason=reason))
+
+    PayfastRefund.objects.bulk_create(refunds)
+    return refunds, skipped
+
+
+def _save_results(run, refunds, skipped, position):
+    """Save the outcome of a batch and move the run checkpoint forward."""
+    succeeded = [refund for refund in refunds if refund.status == Constants.REFUND_SUCCESS]
+    failed = [refund for refund in refunds if refund.status == Constants.REFUND_FAILED]
+    unknown = [refund for refund in refunds if refund.status == Constants.REFUND_PENDING]
+
+    with transaction.atomic():
+        PayfastRefund.objects.filter(run=run, order_number__in=[refund.order_number for refund in succeeded]).update(
+            status=Constants.REFUND_SUCCESS)
+        for refund in failed + unknown:
+            PayfastRefund.objects.filter(run=run, order_number=refund.order_number).update(
+                status=refund.status, message=refund.message)
+        _record_source_refunds(succeeded)
+        PayfastRefundRun.objects.filter(pk=run.pk).update(
+            position=position,
+            refunded=F('refunded') + len(succeeded),
+            failed=F('failed') + len(failed),
+            skipped=F('skipped') + skipped,
+        )
+    run.position = position
+
+
+def run_refunds(name, client, orders, reason='', notify_buyer=True, workers=4, batch_size=100):
+    """Refund every order of ``orders`` once for the run ``name``.
+
+    :param str name: Unique name of the run. Calling this again with the same
+        name and the same ``orders`` resumes the run.
+    :param client: A shared :class:`~payfast.client.PayfastAPIClient`.
+    :param orders: Iterable of ``(order_number, amount)``, ``amount`` is None
+        to refund all that is left. It is read lazily.
+    :param str reason: Reason of the refunds, shown to the buyers.
+    :param bool notify_buyer: Have Payfast email the buyers about the refunds.
+    :param int workers: Maximum number of refunds in flight at once.
+    :param int batch_size: Number of orders per checkpoint.
+    :return: The :class:`~payfast.models.PayfastRefundRun`.
+    """
+    run, __ = PayfastRefundRun.objects.get_or_create(name=name)
+    if run.date_finished:
+        return run
+
+    orders = islice(((str(order_number), amount) for order_number, amount in orders), run.position, None)
+    while True:
+        batch = list(islice(orders, batch_size))
+        if not batch:
+            break
+
+        with transaction.atomic():
+            refunds, skipped = _reserve_refunds(run, batch, reason)
+        # Reserved refunds carry everything the call needs, the workers only do HTTP.
+        results = list(imap_bounded(lambda refund: _send_refund(client, refund, notify_buyer), refunds, workers=workers))
+        _save_results(run, results, skipped, position=run.position + len(batch))
+
+    PayfastRefundRun.objects.filter(pk=run.pk).update(date_finished=timezone.now())
+    run.refresh_from_db()
+    return run
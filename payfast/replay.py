@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""Replay signed Payfast notifications (ITNs) against the notify endpoint.
+
+This is the library behind the ``payfast_replay_itn`` management command. It is
+meant to measure how many notifications a worker can take and to compare
+releases:
+
+* :func:`generate_notifications` builds signed ITN payloads and
+  :func:`load_notifications` reads recorded ones,
+* :class:`ClientTarget` posts them in process through Django's test client,
+  :class:`WSGITarget` calls a WSGI application in process, such as the project
+  application or the lean :class:`payfast.wsgi.NotifyHandler`, and
+  :class:`HTTPTarget` posts them to a running server,
+* :func:`replay` fires them with a configurable concurrency and returns a
+  :class:`ReplayReport` with throughput, latency percentiles and error mix.
+
+.. note::
+
+    ``notify_view`` always answers ``200 OK`` as required by Payfast, so the
+    error mix only shows transport errors and unexpected responses. Rejected
+    notifications are visible in the ``payfast`` logger.
+"""
+import io
+import json
+import sys
+from collections import Counter
+from timeit import default_timer
+
+from .concurrency import imap_bounded
+from .config import get_config
+from .constants import Constants
+from .signer import MD5Signer
+
+try:
+    # Python > 3
+    import urllib.parse as parse
+except ImportError:
+    # Python < 3
+    import urllib as parse
+
+
+def generate_notifications(count, order_numbers=None, amount='100.00', payment_status=None, signer=None):
+    """Yield ``count`` signed notifications.
+
+    :param int count: Number of notifications to generate.
+    :param list order_numbers: Order numbers to cycle through. Defaults to
+        sequential numbers starting at ``100000``.
+    :param str amount: Gross amount of every notification.
+    :param str payment_status: Defaults to ``COMPLETE``.
+    :param signer: Signer used to sign the notifications, an
+        :class:`~payfast.signer.MD5Signer` by default.
+    """
+    signer = signer or MD5Signer()
+    merchant_id = str(get_config().get_merchant_id())
+    payment_status = payment_status or Constants.PAYMENT_RESULT_COMPLETE
+
+    for index in range(count):
+        order_number = order_numbers[index % len(order_numbers)] if order_numbers else str(100000 + index)
+        fields = {
+            Constants.M_PAYMENT_ID: order_number,
+            Constants.PF_PAYMENT_ID: str(900000 + index),
+            Constants.PAYMENT_STATUS: payment_status,
+            Constants.ITEM_NAME: 'Payfast order: {}'.format(order_number),
+            Constants.AMOUNT_GROSS: amount,
+            Constants.AMOUNT_FEE: '0.00',
+            Constants.AMOUNT_NET: amount,
+            Constants.MERCHANT_ID: merchant_id,
+        }
+        fields[Constants.SIGNATURE] = signer.sign_notification(fields)
+        yield fields
+
+
+def load_notifications(lines, resign=False, signer=None):
+    """Yield notifications recorded as one JSON object per line.
+
+    :param lines: Any iterable of lines, such as an open file.
+    :param bool resign: Replace the recorded signature with one computed with
+        the current configuration, for payloads recorded with another passphrase.
+    """
+    signer = signer or MD5Signer()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        fields = json.loads(line)
+        if resign:
+            fields.pop(Constants.SIGNATURE, None)
+            fields[Constants.SIGNATURE] = signer.sign_notification(fields)
+        yield fields
+
+
+class ClientTarget(object):
+    """Post notifications in process through Django's test client.
+
+    This exercises URL resolving, the middleware stack and the view without any
+    network overhead. ``remote_addr`` is the source address the notifications
+    appear to come from.
+    """
+
+    def __init__(self, path=None, remote_addr='127.0.0.1', host='localhost'):
+        from django.urls import reverse
+
+        self.path = path or reverse('payfast-notify')
+        self.remote_addr = remote_addr
+        self.host = host
+
+    def __call__(self, fields):
+        # Imported here so that the test framework is only loaded when used.
+        from django.test import Client
+
+        response = Client().post(self.path, fields, REMOTE_ADDR=self.remote_addr, HTTP_HOST=self.host)
+        return response.status_code
+
+
+class WSGITarget(object):
+    """Post notifications in process straight to a WSGI application.
+
+    :param application: WSGI application, the project one by default.
+
+    Unlike :class:`ClientTarget` nothing but the application itself is measured,
+    which makes it suitable to compare the full stack with
+    :class:`payfast.wsgi.NotifyHandler`.
+    """
+
+    def __init__(self, application=None, path=None, remote_addr='127.0.0.1', host='localhost'):
+        from django.core.wsgi import get_wsgi_application
+        from django.urls import reverse
+
+        self.application = application or get_wsgi_application()
+        self.path = path or reverse('payfast-notify')
+        self.remote_addr = remote_addr
+        self.host = host
+
+    def __call__(self, fields):
+        body = parse.urlencode(fields).encode('utf-8')
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': self.path,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': '',
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.host,
+            'REMOTE_ADDR': self.remote_addr,
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(status)
+
+        result = self.application(environ, start_response)
+        try:
+            for __ in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return int(statuses[0].split(' ', 1)[0])
+
+
+class HTTPTarget(object):
+    """Post notifications to a running server.
+
+    A single ``requests`` session is shared by all workers, its connection pool
+    is sized to ``workers`` so connections are reused rather than reopened.
+    """
+
+    def __init__(self, url, workers=1, timeout=10):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __call__(self, fields):
+        return self.session.post(self.url, data=fields, timeout=self.timeout).status_code
+
+
+class ReplayReport(object):
+    """Latencies and outcomes of a replay.
+
+    Outcomes are HTTP status codes, or the exception class name when a
+    notification could not be delivered at all.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self):
+        self.durations = []
+        self.outcomes = Counter()
+        self.elapsed = 0.0
+
+    def add(self, duration, outcome):
+        self.durations.append(duration)
+        self.outcomes[outcome] += 1
+
+    @property
+    def total(self):
+        return len(self.durations)
+
+    @property
+    def errors(self):
+        return self.total - self.outcomes[200]
+
+    @property
+    def throughput(self):
+        """Notifications per second over the whole replay."""
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, percent):
+        """Return the ``percent`` latency percentile in seconds (nearest rank)."""
+        if not self.durations:
+            return 0.0
+        durations = sorted(self.durations)
+        rank = int(round(percent / 100.0 * len(durations) + 0.5)) - 1
+        return durations[min(max(rank, 0), len(durations) - 1)]
+
+    def as_dict(self):
+        report = {
+            'total': self.total,
+            'errors': self.errors,
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+            'outcomes': dict((str(outcome), count) for outcome, count in self.outcomes.items()),
+        }
+        for percent in self.PERCENTILES:
+            report['p%d' % percent] = self.percentile(percent)
+        return report
+
+    def __str__(self):
+        lines = [
+            'Notifications: %d in %.2fs (%.1f/s)' % (self.total, self.elapsed, self.throughput),
+            'Latency: ' + ', '.join('p%d %.1fms' % (percent, self.percentile(percent) * 1000)
+                                    for percent in self.PERCENTILES),
+            'Errors: %d' % self.errors,
+        ]
+        lines.extend('  %s: %d' % (outcome, count) for outcome, count in sorted(self.outcomes.items(), key=str))
+        return '\n'.join(lines)
+
+
+def replay(notifications, target, concurrency=1):
+    """Fire ``notifications`` at ``target`` and return a :class:`ReplayReport`.
+
+    :param notifications: Iterable of notification dicts, consumed lazily.
+    :param target: Callable posting one notification and returning an outcome,
+        such as :class:`ClientTarget` or :class:`HTTPTarget`.
+    :param int concurrency: Number of notifications in flight at once.
+    """
+    def fire(fields):
+        start = default_timer()
+        try:
+            outcome = target(fields)
+        except Exception as e:  # noqa
+            outcome = e.__class__.__name__
+        return default_timer() - start, outcome
+
+    report = ReplayReport()
+    start = default_timer()
+    for duration, outcome in imap_bounded(fire, notifications, workers=concurrency):
+        report.add(duration, outcome)
+    report.elapsed = default_timer() - start
+
+    return report
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Retention of the Payfast notification history.
+
+:func:`archive_transactions` moves the transactions older than a cut-off date
+out of :class:`~payfast.models.PayfastTransaction` into an archive, in batches
+ordered by primary key:
+
+1. a batch of old rows is read,
+2. it is written to the archive,
+3. the rows are deleted from the hot table,
+
+with an optional pause between batches so replicas can keep up. Since archived
+rows are deleted, running the job again after an interruption simply picks up
+the rows that are left.
+
+Two archives are available:
+
+* :class:`TableArchive` copies rows to :class:`~payfast.models.PayfastTransactionArchive`.
+  Copy and delete share a transaction.
+* :class:`JSONLinesArchive` writes every batch to its own gzipped JSON lines
+  file, named after the primary key range of the batch. A batch interrupted
+  between writing and deleting is written to the same file again on the next
+  run, so no row is archived twice.
+
+The queues fed by notifications grow just as fast. Once their rows are done
+with, what they recorded is in the transaction history, so
+:func:`purge_deferred_notifications` and :func:`purge_webhook_events` delete
+them in the same batches, writing them to a :class:`JSONLinesArchive` first
+when one is given.
+"""
+import gzip
+import json
+import os
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .constants import Constants
+from .models import PayfastDeferredNotification, PayfastTransaction, PayfastTransactionArchive, PayfastWebhookEvent
+
+FIELDS = (
+    'id', 'order_number', 'payfast_reference', 'method', 'status', 'amount', 'amount_net', 'amount_fee',
+    'currency', 'ip_address', 'date_created',
+)
+
+DEFERRED_NOTIFICATION_FIELDS = ('id', 'params', 'ip_address', 'error', 'date_created', 'date_processed')
+
+WEBHOOK_EVENT_FIELDS = (
+    'id', 'url', 'event_type', 'payload', 'status', 'attempts', 'last_error', 'date_created', 'date_delivered',
+)
+
+
+class TableArchive(object):
+    """Archive rows to the :class:`~payfast.models.PayfastTransactionArchive` table."""
+
+    def write(self, rows):
+        archived = []
+        for row in rows:
+            row = dict(row)
+            archived.append(PayfastTransactionArchive(original_id=row.pop('id'), **row))
+        PayfastTransactionArchive.objects.bulk_create(archived)
+
+    def __str__(self):
+        return PayfastTransactionArchive._meta.db_table
+
+
+class JSONLinesArchive(object):
+    """Archive rows to gzipped JSON lines files in ``directory``.
+
+    :param str prefix: Prefix of the file names, one per kind of row.
+    """
+
+    def __init__(self, directory, prefix='payfast-transactions'):
+        self.directory = directory
+        self.prefix = prefix
+
+    def path(self, rows):
+        return os.path.join(self.directory, '%s-%d-%d.jsonl.gz' % (self.prefix, rows[0]['id'], rows[-1]['id']))
+
+    def write(self, rows):
+        path = self.path(rows)
+        # Write to a temporary file first so a crash never leaves a truncated archive.
+        with gzip.open(path + '.tmp', 'wb') as archive:
+            for row in rows:
+                archive.write((json.dumps(row, cls=DjangoJSONEncoder, sort_keys=True) + '\n').encode('utf-8'))
+        os.rename(path + '.tmp', path)
+
+    def __str__(self):
+        return self.directory
+
+
+def _move(expired, fields, archive, batch_size, sleep, dry_run, max_batches):
+    """Move the rows of ``expired`` to ``archive``, or delete them if it is None, in batches."""
+    expired = expired.order_by('pk')
+
+    batches, last_pk = 0, 0
+    if dry_run:
+        total = expired.count()
+        while total > 0 and (max_batches is None or batches < max_batches):
+            yield min(total, batch_size)
+            total -= batch_size
+            batches += 1
+        return
+
+    while max_batches is None or batches < max_batches:
+        if batches and sleep:
+            time.sleep(sleep)
+
+        # The keyset on pk skips rows left behind by a concurrent archiver.
+        rows = list(expired.filter(pk__gt=last_pk).values(*fields)[:batch_size])
+        if not rows:
+            return
+
+        with transaction.atomic():
+            if archive is not None:
+                archive.write(rows)
+            expired.model.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+
+        last_pk = rows[-1]['id']
+        batches += 1
+        yield len(rows)
+
+
+def archive_transactions(before, archive, batch_size=1000, sleep=0, dry_run=False, max_batches=None):
+    """Move the transactions created before ``before`` to ``archive``.
+
+    :param datetime before: Cut-off date, newer transactions are kept.
+    :param archive: A :class:`TableArchive` or a :class:`JSONLinesArchive`.
+    :param int batch_size: Number of rows moved per batch.
+    :param sleep: Seconds to pause between batches.
+    :param bool dry_run: Only count the rows that would be moved.
+    :param int max_batches: Stop after this many batches, the next run resumes.
+    :return: Generator of the number of rows of every batch.
+    """
+    expired = PayfastTransaction.objects.filter(date_created__lt=before)
+    return _move(expired, FIELDS, archive, batch_size, sleep, dry_run, max_batches)
+
+
+def purge_deferred_notifications(before, archive=None, batch_size=1000, sleep=0, dry_run=False, max_batches=None):
+    """Delete the deferred notifications processed before ``before``.
+
+    Notifications still waiting to be processed are kept whatever their age.
+    Takes the same arguments as :func:`archive_transactions`, ``archive`` is
+    an optional :class:`JSONLinesArchive`.
+    """
+    expired = PayfastDeferredNotification.objects.filter(date_processed__lt=before)
+    return _move(expired, DEFERRED_NOTIFICATION_FIELDS, archive, batch_size, sleep, dry_run, max_batches)
+
+
+def purge_webhook_events(before, archive=None, batch_size=1000, sleep=0, dry_run=False, max_batches=None):
+    """Delete the webhook events created before ``before`` that were delivered or given up on.
+
+    Events still pending delivery are kept whatever their age. Takes the same
+    arguments as :func:`purge_deferred_notifications`.
+    """
+    expired = PayfastWebhookEvent.objects.filter(
+        date_created__lt=before, status__in=(Constants.WEBHOOK_DELIVERED, Constants.WEBHOOK_FAILED))
+    return _move(expired, WEBHOOK_EVENT_FIELDS, archive, batch_size, sleep, dry_run, max_batches)
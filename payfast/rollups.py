@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Daily revenue and fee totals of the Payfast transactions.
+
+:class:`~payfast.models.PayfastRollup` holds the count and the sums of
+``amount``, ``amount_fee`` and ``amount_net`` of the transactions of every
+day, status and currency. Reports read these rows instead of aggregating
+:class:`~payfast.models.PayfastTransaction`, which keeps them constant time as
+the transaction table grows.
+
+* :func:`add_transaction` adds a transaction to its row as it is recorded, in
+  the same transaction as the insert, so the totals never disagree with the
+  transactions. Concurrent notifications only contend on the row of their day.
+* :func:`rebuild_rollups` recomputes whole days from the transaction and
+  archive tables, a chunk of days per transaction. It backfills the totals of
+  the transactions recorded before the rollups existed (see the
+  ``payfast_rollup_transactions`` command).
+"""
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .core.fields import CENTS
+from .models import PayfastRollup, PayfastTransaction, PayfastTransactionArchive
+
+AMOUNT_FIELDS = ('amount', 'amount_fee', 'amount_net')
+
+
+def get_day(date_created):
+    """Return the day ``date_created`` is counted in, in the current time zone like ``TruncDate``."""
+    if timezone.is_aware(date_created):
+        date_created = timezone.localtime(date_created)
+    return date_created.date()
+
+
+def _to_datetime(day):
+    value = datetime.combine(day, datetime.min.time())
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def _decimal(value):
+    return Decimal(str(value)).quantize(CENTS) if value is not None else None
+
+
+def add_transaction(txn):
+    """Add the :class:`~payfast.models.PayfastTransaction` ``txn`` to its daily totals.
+
+    Call it in the transaction that recorded ``txn``.
+    """
+    key = {'day': get_day(txn.date_created), 'status': txn.status or '', 'currency': txn.currency}
+    amounts = dict((field, _decimal(getattr(txn, field))) for field in AMOUNT_FIELDS)
+
+    changes = dict((field, F(field) + value) for field, value in amounts.items() if value is not None)
+    changes['count'] = F('count') + 1
+    if PayfastRollup.objects.filter(**key).update(**changes):
+        return
+
+    try:
+        with transaction.atomic():
+            PayfastRollup.objects.create(count=1, **dict(
+                key, **dict((field, value or 0) for field, value in amounts.items())))
+    except IntegrityError:
+        # Another notification of the same day created the row first.
+        PayfastRollup.objects.filter(**key).update(**changes)
+
+
+def aggregate_transactions(queryset):
+    """Return the totals of ``queryset`` per ``(day, status, currency)`` in one grouped query."""
+    rows = queryset.annotate(day=TruncDate('date_created')).values('day', 'status', 'currency').annotate(
+        total_count=Count('id'),
+        **dict(('total_%s' % field, Sum(field)) for field in AMOUNT_FIELDS)
+    ).order_by()
+
+    totals = {}
+    for row in rows:
+        values = dict((field, _decimal(row['total_%s' % field]) or 0) for field in AMOUNT_FIELDS)
+        values['count'] = row['total_count']
+        totals[(row['day'], row['status'] or '', row['currency'])] = values
+    return totals
+
+
+def _aggregate_days(start, end):
+    """Return the totals of the transactions, archived or not, from ``start`` to ``end`` (exclusive)."""
+    totals = aggregate_transactions(PayfastTransaction.objects.created_between(start, end))
+    archived = PayfastTransactionArchive.objects.filter(date_created__gte=start, date_created__lt=end)
+    for key, values in aggregate_transactions(archived).items():
+        if key in totals:
+            for field, value in values.items():
+                totals[key][field] += value
+        else:
+            totals[key] = values
+    return totals
+
+
+def _first_day():
+    """Return the day of the oldest transaction, archived or not, or None."""
+    days = [get_day(value) for value in (
+        PayfastTransaction.objects.aggregate(first=Min('date_created'))['first'],
+        PayfastTransactionArchive.objects.aggregate(first=Min('date_created'))['first'],
+    ) if value is not None]
+    return min(days) if days else None
+
+
+def rebuild_rollups(start=None, end=None, chunk_days=7, sleep=0):
+    """Recompute the daily totals from ``start`` to ``end``, both inclusive.
+
+    :param date start: First day, defaults to the day of the oldest transaction.
+    :param date end: Last day, defaults to yesterday. A day still receiving
+        notifications can be rebuilt, but is best rebuilt once it is over.
+    :param int chunk_days: Number of days rebuilt per transaction.
+    :param float sleep: Seconds to pause between chunks, to spare the database.
+    :return: A generator yielding ``(first_day, last_day, rows)`` for every chunk.
+
+    The rows of every chunk are replaced in a transaction, so the job can be
+    interrupted and run again at any time.
+    """
+    start = start or _first_day()
+    end = end or get_day(timezone.now()) - timedelta(days=1)
+    if start is None:
+        return
+
+    while start <= end:
+        last = min(start + timedelta(days=chunk_days - 1), end)
+        with transaction.atomic():
+            # Deleting first makes notifications of these days wait for the
+            # rebuild, or be counted by it, rather than be lost.
+            PayfastRollup.objects.between(start, last).delete()
+            totals = _aggregate_days(_to_datetime(start), _to_datetime(last + timedelta(days=1)))
+            PayfastRollup.objects.bulk_create([
+                PayfastRollup(day=day, status=status, currency=currency, **values)
+                for (day, status, currency), values in sorted(totals.items())
+            ])
+
+        yield start, last, len(totals)
+        start = last + timedelta(days=1)
+        if sleep and start <= end:
+            time.sleep(sleep)
@@ -40,11 +40,13 @@ class WebIntegrationConfig(AbstractPayfastConfig):
     def get_action_url(self):
         """Return :data:`PAYFAST_ACTION_URL`.
         Returns the live payfast action url if the merchant id and the merchant key are set. Otherwise the sandbox url
-        is returned.
+        is returned. Setting :data:`PAYFAST_ACTION_URL` points the payment form elsewhere, for instance at the
+        :mod:`payfast.emulator`.
         """
         merchant_id = getattr(settings, 'PAYFAST_MERCHANT_ID', False)
         merchant_key = getattr(settings, 'PAYFAST_MERCHANT_KEY', False)
-        return Constants.ACTION_URL_LIVE if merchant_id and merchant_key else Constants.ACTION_URL_DEV
+        default = Constants.ACTION_URL_LIVE if merchant_id and merchant_key else Constants.ACTION_URL_DEV
+        return getattr(settings, 'PAYFAST_ACTION_URL', default)
 
     def get_merchant_key(self):
         """Return :data:`PAYFAST_MERCHANT_KEY`."""
@@ -63,3 +65,156 @@ class WebIntegrationConfig(AbstractPayfastConfig):
         a proxy and the real ip is passed in an alternate header.
         """
         return getattr(settings, 'PAYFAST_IP_ADDRESS_HTTP_HEADER', 'REMOTE_ADDR')
+
+    def get_valid_hosts(self):
+        """Return :data:`PAYFAST_VALID_HOSTS` or the Payfast ITN hosts.
+
+        Defaults to :attr:`Constants.VALID_PAYFAST_HOSTS`. Overriding this is mostly
+        useful for tests and local development where notifications are posted from
+        the local machine.
+        """
+        return getattr(settings, 'PAYFAST_VALID_HOSTS', Constants.VALID_PAYFAST_HOSTS)
+
+    def get_pending_order_status(self):
+        """Return :data:`PAYFAST_PENDING_ORDER_STATUS` or :data:`OSCAR_INITIAL_ORDER_STATUS`.
+
+        Only orders in this status are moved by a Payfast notification.
+        """
+        return getattr(settings, 'PAYFAST_PENDING_ORDER_STATUS', getattr(settings, 'OSCAR_INITIAL_ORDER_STATUS', ''))
+
+    def get_paid_order_status(self):
+        """Return :data:`PAYFAST_PAID_ORDER_STATUS` or ``Paid``."""
+        return getattr(settings, 'PAYFAST_PAID_ORDER_STATUS', 'Paid')
+
+    def get_cancelled_order_status(self):
+        """Return :data:`PAYFAST_CANCELLED_ORDER_STATUS` or ``Cancelled``."""
+        return getattr(settings, 'PAYFAST_CANCELLED_ORDER_STATUS', 'Cancelled')
+
+    def get_api_url(self):
+        """Return :data:`PAYFAST_API_URL` or :attr:`Constants.API_URL`."""
+        return getattr(settings, 'PAYFAST_API_URL', Constants.API_URL)
+
+    def get_api_timeout(self):
+        """Return :data:`PAYFAST_API_TIMEOUT` or 10 seconds."""
+        return getattr(settings, 'PAYFAST_API_TIMEOUT', 10)
+
+    def get_notify_max_size(self):
+        """Return :data:`PAYFAST_NOTIFY_MAX_SIZE` or 8192 bytes."""
+        return getattr(settings, 'PAYFAST_NOTIFY_MAX_SIZE', 8192)
+
+    def get_notify_max_fields(self):
+        """Return :data:`PAYFAST_NOTIFY_MAX_FIELDS` or 50."""
+        return getattr(settings, 'PAYFAST_NOTIFY_MAX_FIELDS', 50)
+
+    def get_notify_rate_limit(self):
+        """Return :data:`PAYFAST_NOTIFY_RATE_LIMIT` or 1 request per second with bursts of 20.
+
+        Set it to ``None`` to disable rate limiting.
+        """
+        return getattr(settings, 'PAYFAST_NOTIFY_RATE_LIMIT', (1, 20))
+
+    def get_notify_rate_limit_cache(self):
+        """Return :data:`PAYFAST_NOTIFY_RATE_LIMIT_CACHE` or None (process memory)."""
+        return getattr(settings, 'PAYFAST_NOTIFY_RATE_LIMIT_CACHE', None)
+
+    def use_merchant_directory(self):
+        """Return :data:`PAYFAST_MERCHANT_DIRECTORY` or False."""
+        return getattr(settings, 'PAYFAST_MERCHANT_DIRECTORY', False)
+
+    def get_merchant_directory_ttl(self):
+        """Return :data:`PAYFAST_MERCHANT_DIRECTORY_TTL` or 60 seconds."""
+        return getattr(settings, 'PAYFAST_MERCHANT_DIRECTORY_TTL', 60)
+
+    def get_webhook_urls(self):
+        """Return :data:`PAYFAST_WEBHOOK_URLS` or no endpoints."""
+        return getattr(settings, 'PAYFAST_WEBHOOK_URLS', ())
+
+    def get_webhook_secret(self):
+        """Return :data:`PAYFAST_WEBHOOK_SECRET` or None."""
+        return getattr(settings, 'PAYFAST_WEBHOOK_SECRET', None)
+
+    def get_webhook_max_attempts(self):
+        """Return :data:`PAYFAST_WEBHOOK_MAX_ATTEMPTS` or 10."""
+        return getattr(settings, 'PAYFAST_WEBHOOK_MAX_ATTEMPTS', 10)
+
+    def validate_notifications(self):
+        """Return :data:`PAYFAST_VALIDATE_NOTIFICATIONS` or False."""
+        return getattr(settings, 'PAYFAST_VALIDATE_NOTIFICATIONS', False)
+
+    def get_validate_url(self):
+        """Return :data:`PAYFAST_VALIDATE_URL`.
+
+        Defaults to the live or the sandbox validate URL, like :meth:`get_action_url`.
+        """
+        merchant_id = getattr(settings, 'PAYFAST_MERCHANT_ID', False)
+        merchant_key = getattr(settings, 'PAYFAST_MERCHANT_KEY', False)
+        default = Constants.VALIDATE_URL_LIVE if merchant_id and merchant_key else Constants.VALIDATE_URL_DEV
+        return getattr(settings, 'PAYFAST_VALIDATE_URL', default)
+
+    def get_validation_fallback(self):
+        """Return :data:`PAYFAST_VALIDATION_FALLBACK` or ``queue``."""
+        return getattr(settings, 'PAYFAST_VALIDATION_FALLBACK', Constants.VALIDATION_FALLBACK_QUEUE)
+
+    def get_breaker_threshold(self):
+        """Return :data:`PAYFAST_BREAKER_THRESHOLD` or 5 failures."""
+        return getattr(settings, 'PAYFAST_BREAKER_THRESHOLD', 5)
+
+    def get_breaker_reset_timeout(self):
+        """Return :data:`PAYFAST_BREAKER_RESET_TIMEOUT` or 30 seconds."""
+        return getattr(settings, 'PAYFAST_BREAKER_RESET_TIMEOUT', 30)
+
+    def get_breaker_cache(self):
+        """Return :data:`PAYFAST_BREAKER_CACHE` or ``default``."""
+        return getattr(settings, 'PAYFAST_BREAKER_CACHE', 'default')
+
+    def get_retention_days(self):
+        """Return :data:`PAYFAST_RETENTION_DAYS` or 365 days."""
+        return getattr(settings, 'PAYFAST_RETENTION_DAYS', 365)
+
+    def get_abandoned_order_hours(self):
+        """Return :data:`PAYFAST_ABANDONED_ORDER_HOURS` or 24 hours."""
+        return getattr(settings, 'PAYFAST_ABANDONED_ORDER_HOURS', 24)
+
+    def get_sweep_rate(self):
+        """Return :data:`PAYFAST_SWEEP_RATE` or 5 queries per second."""
+        return getattr(settings, 'PAYFAST_SWEEP_RATE', 5)
+
+    def get_status_cache(self):
+        """Return :data:`PAYFAST_STATUS_CACHE` or ``default``."""
+        return getattr(settings, 'PAYFAST_STATUS_CACHE', 'default')
+
+    def get_status_timeout(self):
+        """Return :data:`PAYFAST_STATUS_TIMEOUT` or an hour."""
+        return getattr(settings, 'PAYFAST_STATUS_TIMEOUT', 3600)
+
+    def get_status_max_wait(self):
+        """Return :data:`PAYFAST_STATUS_MAX_WAIT` or 25 seconds."""
+        return getattr(settings, 'PAYFAST_STATUS_MAX_WAIT', 25)
+
+    def get_onsite_url(self):
+        """Return :data:`PAYFAST_ONSITE_URL`.
+
+        Defaults to the live or the sandbox onsite URL, like :meth:`get_action_url`.
+        """
+        merchant_id = getattr(settings, 'PAYFAST_MERCHANT_ID', False)
+        merchant_key = getattr(settings, 'PAYFAST_MERCHANT_KEY', False)
+        default = Constants.ONSITE_URL_LIVE if merchant_id and merchant_key else Constants.ONSITE_URL_DEV
+        return getattr(settings, 'PAYFAST_ONSITE_URL', default)
+
+    def get_onsite_engine_url(self):
+        """Return :data:`PAYFAST_ONSITE_ENGINE_URL`.
+
+        Defaults to the live or the sandbox onsite engine, like :meth:`get_action_url`.
+        """
+        merchant_id = getattr(settings, 'PAYFAST_MERCHANT_ID', False)
+        merchant_key = getattr(settings, 'PAYFAST_MERCHANT_KEY', False)
+        default = Constants.ONSITE_ENGINE_URL_LIVE if merchant_id and merchant_key else Constants.ONSITE_ENGINE_URL_DEV
+        return getattr(settings, 'PAYFAST_ONSITE_ENGINE_URL', default)
+
+    def get_onsite_cache(self):
+        """Return :data:`PAYFAST_ONSITE_CACHE` or ``default``."""
+        return getattr(settings, 'PAYFAST_ONSITE_CACHE', 'default')
+
+    def get_onsite_uuid_timeout(self):
+        """Return :data:`PAYFAST_ONSITE_UUID_TIMEOUT` or 30 minutes."""
+        return getattr(settings, 'PAYFAST_ONSITE_UUID_TIMEOUT', 30 * 60)
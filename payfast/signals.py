@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""Signals sent by the Payfast plugin."""
+from django.dispatch import Signal
+
+payment_notification_accepted = Signal(providing_args=['transaction', 'status', 'params', 'order_status'])
+"""Sent for every genuine Payfast notification once it has been applied.
+
+Receivers run inside the notification transaction: anything slow or with side
+effects outside the database belongs in :func:`django.db.transaction.on_commit`.
+``order_status`` is the status the order was moved to, or None if it was not
+moved.
+"""
@@ -22,18 +22,13 @@ This class could be modified in future should payfast implement other signature
     The signing string should be packed into a binary format containing hex
     characters, and then encoded for transmission.
 
+The signing itself lives in the Django free :mod:`payfast.core.signing`, the
+signers only add the configured passphrase.
 """
-import hashlib
-try:
-    # Python > 3
-    import urllib.parse as parse
-except ImportError:
-    # Python < 3
-    import urllib as parse
-
-
-from payfast.constants import Constants
 from .config import get_config
+from .core import signing
+# Kept importable from here for backwards compatibility.
+from .core.signing import passphrase_salt  # noqa
 
 
 class AbstractSigner:
@@ -98,48 +93,33 @@ class MD5Signer(AbstractSigner):
 
 
     """
-    REQUEST_HASH_KEYS = (
-        Constants.MERCHANT_ID,
-        Constants.MERCHANT_KEY,
-        Constants.RETURN_URL,
-        Constants.CANCEL_URL,
-        Constants.NOTIFY_URL,
-        Constants.NAME_FIRST,
-        Constants.NAME_LAST,
-        Constants.EMAIL_ADDRESS,
-        Constants.CELL_NUMBER,
-        Constants.M_PAYMENT_ID,
-        Constants.AMOUNT,
-        Constants.ITEM_NAME,
-        Constants.ITEM_DESCRIPTION,
-        Constants.EMAIL_CONFIRMATION,
-        Constants.CONFIRMATION_ADDRESS
-    )
+    REQUEST_HASH_KEYS = signing.REQUEST_HASH_KEYS
     """An ordered tuple of possible request keys
     This is used to build or verify the payfast signature before the user is directed to the payfast gateway.
     Note that the order of the fields matter to generate the hash with the MD5 algorithm.
     """
 
-    RESPONSE_HASH_KEYS = (
-        Constants.M_PAYMENT_ID,
-        Constants.PF_PAYMENT_ID,
-        Constants.PAYMENT_STATUS,
-        Constants.ITEM_NAME,
-        Constants.ITEM_DESCRIPTION,
-        Constants.AMOUNT_GROSS,
-        Constants.AMOUNT_FEE,
-        Constants.AMOUNT_NET,
-        Constants.NAME_FIRST,
-        Constants.NAME_LAST,
-        Constants.EMAIL_ADDRESS,
-        Constants.MERCHANT_ID
-    )
+    RESPONSE_HASH_KEYS = signing.RESPONSE_HASH_KEYS
     """An ordered tuple of possible response/notification keys
 
     This is used to build or verify the payfast signature that is by payfast to the ITN endpoint. Note that the order of
     the fields matter to generate the hash with the MD5 algorithm.
     """
 
+    def __init__(self, passphrase=None):
+        """
+        :param str passphrase: Passphrase salting the signatures, for instance the
+            passphrase of a sub-merchant. Defaults to the configured
+            :data:`PAYFAST_PASSPHRASE`.
+        """
+        self.passphrase = passphrase
+
+    def get_passphrase(self):
+        """Return the passphrase of this signer or the configured one."""
+        if self.passphrase is not None:
+            return self.passphrase
+        return get_config().get_passphrase()
+
     def sign(self, fields):
         """Sign the given form ``fields`` and return the signature field.
 
@@ -151,11 +131,7 @@ class MD5Signer(AbstractSigner):
             The :meth:`AbstractSigner.sign` method for usage.
 
         """
-        signature_list = [(key, fields[key]) for key in self.REQUEST_HASH_KEYS if fields.get(key, None)]
-        signature_string = parse.urlencode(signature_list)
-        signature = self.generate_hash(signature_string)
-
-        return signature
+        return self.generate_hash(signing.request_signature_string(fields))
 
     def verify(self, fields):
         """Verify ``fields`` contains the appropriate signature response from payfast.
@@ -169,12 +145,21 @@ class MD5Signer(AbstractSigner):
 
         """
         response_signature = fields.pop('signature', None)
-        signature_list = [(key, fields[key]) for key in self.RESPONSE_HASH_KEYS if fields.get(key, None)]
-        signature_string = parse.urlencode(signature_list)
-        signature = self.generate_hash(signature_string)
+        signature = self.sign_notification(fields)
 
         return signature == response_signature
 
+    def sign_notification(self, fields):
+        """Sign the given notification ``fields`` the way Payfast signs an ITN.
+
+        :param dict fields: A dictionary of notification fields
+        :returns str signature: The signature Payfast would send with these fields
+
+        This is the counterpart of :meth:`verify` and is mostly useful to build
+        notifications for tests, replays and load tests.
+        """
+        return self.generate_hash(signing.notification_signature_string(fields))
+
     def generate_hash(self, signature_string):
         """Generate the hash using the ``hashlib.md5`` algorithm.
 
@@ -183,7 +168,4 @@ class MD5Signer(AbstractSigner):
             The :meth:`AbstractSigner.genetrate_hash` method for usage.
 
         """
-        if get_config().get_passphrase():
-            signature_string += '&passphrase=' + parse.quote(get_config().get_passphrase())
-
-        return hashlib.md5(signature_string.encode()).hexdigest()
+        return signing.generate_hash(signature_string, self.get_passphrase())
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""In-process counters of rejected notifications.
+
+Notifications go through staged checks, cheapest first (see
+:meth:`payfast.gateway.PaymentNotification.validate`). Every rejection is
+counted against the stage that rejected it, which tells junk traffic (``rate``,
+``ip``, ``size``) apart from integration problems (``merchant``, ``signature``).
+Counters are per process, export them to your metrics system as needed.
+"""
+import threading
+from collections import Counter
+
+STAGE_RATE = 'rate'
+STAGE_IP = 'ip'
+STAGE_SIZE = 'size'
+STAGE_FIELDS = 'fields'
+STAGE_MERCHANT = 'merchant'
+STAGE_SIGNATURE = 'signature'
+STAGE_REMOTE = 'remote'
+
+#: Validation stages of a notification, in the order they run.
+STAGES = (STAGE_RATE, STAGE_IP, STAGE_SIZE, STAGE_FIELDS, STAGE_MERCHANT, STAGE_SIGNATURE, STAGE_REMOTE)
+
+_rejections = Counter()
+_lock = threading.Lock()
+
+
+def record_rejection(stage):
+    """Count a notification rejected by ``stage``."""
+    with _lock:
+        _rejections[stage] += 1
+
+
+def get_rejection_counts():
+    """Return the number of rejections of every stage."""
+    with _lock:
+        return dict((stage, _rejections[stage]) for stage in STAGES)
+
+
+def reset_rejection_counts():
+    """Set every rejection counter back to zero."""
+    with _lock:
+        _rejections.clear()
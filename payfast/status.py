@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Payment status channel for the thank-you page.
+
+Customers come back from Payfast through ``return_url``, often before the ITN
+arrived. Rather than having the page poll the database, the notification
+pipeline publishes the outcome of every notification, once committed, to a cache key
+per order (``payfast:status:<m_payment_id>``), and the ``payfast-status`` view
+answers from that key only:
+
+* a plain ``GET`` returns the current status as JSON,
+* ``?wait=<seconds>`` long polls until the status changes,
+* ``Accept: text/event-stream`` streams the changes as Server-Sent Events.
+
+Waiting clients cost one cache read per :data:`POLL_INTERVAL`, never an order
+query. Status URLs carry a token signed with ``SECRET_KEY`` so that order
+numbers, which are easy to guess, are not enough to read a payment status; build
+them with :func:`get_status_url`.
+
+.. note::
+
+    A long poll or an event stream occupies a worker for up to
+    :meth:`~payfast.config.AbstractPayfastConfig.get_status_max_wait` seconds,
+    size the worker pool, or use an asynchronous worker class, accordingly.
+"""
+import json
+import time
+
+from django.core import signing
+from django.core.cache import caches
+
+from .config import get_config
+from .constants import Constants
+
+#: Seconds between two cache reads of a waiting client.
+POLL_INTERVAL = 0.5
+
+# Statuses after which the status of a payment no longer changes.
+FINAL_STATUSES = (
+    Constants.PAYMENT_RESULT_COMPLETE,
+    Constants.PAYMENT_RESULT_CANCELLED,
+    Constants.PAYMENT_RESULT_FAILED,
+)
+
+_SALT = 'payfast.status'
+
+
+def _cache_key(order_number):
+    return 'payfast:status:%s' % order_number
+
+
+def _get_cache(config=None):
+    return caches[(config or get_config()).get_status_cache()]
+
+
+def get_status_token(order_number):
+    """Return the token granting access to the status of ``order_number``."""
+    return signing.Signer(salt=_SALT).signature(str(order_number))
+
+
+def check_status_token(order_number, token):
+    """Return whether ``token`` grants access to the status of ``order_number``."""
+    return signing.constant_time_compare(get_status_token(order_number), token or '')
+
+
+def get_status_url(order_number):
+    """Return the ``payfast-status`` URL of ``order_number``, token included."""
+    from django.urls import reverse
+
+    url = reverse('payfast-status', kwargs={'m_payment_id': order_number})
+    return '%s?token=%s' % (url, get_status_token(order_number))
+
+
+def publish_payment_status(order_number, payment_status, order_status=None, config=None):
+    """Publish the outcome of a notification to the clients waiting on ``order_number``.
+
+    A final status is never replaced, so a replayed notification, which does
+    not move the order again, cannot hide the status the order was moved to.
+
+    :param payment_status: Payfast payment status, such as ``COMPLETE``.
+    :param order_status: Status the order was moved to, or None.
+    :return: The published status.
+    """
+    config = config or get_config()
+    cache = _get_cache(config)
+    current = cache.get(_cache_key(order_number))
+    if is_final(current):
+        return current
+
+    status = {
+        Constants.M_PAYMENT_ID: str(order_number),
+        Constants.PAYMENT_STATUS: payment_status,
+        'order_status': order_status,
+        # Milliseconds since the epoch, used as Server-Sent Event id.
+        'version': int(time.time() * 1000),
+    }
+    cache.set(_cache_key(order_number), status, config.get_status_timeout())
+    return status
+
+
+def get_payment_status(order_number, config=None):
+    """Return the last published status of ``order_number`` or None."""
+    return _get_cache(config).get(_cache_key(order_number))
+
+
+def wait_for_payment_status(order_number, since=None, timeout=0, config=None):
+    """Return the status of ``order_number`` once it is newer than ``since``.
+
+    :param since: Version of the status the client already has, if any.
+    :param timeout: Maximum number of seconds to wait.
+    :return: The status, or None if nothing new was published in time.
+    """
+    deadline = time.time() + timeout
+    cache = _get_cache(config)
+    while True:
+        status = cache.get(_cache_key(order_number))
+        if status is not None and (since is None or status['version'] > since):
+            return status
+        if time.time() >= deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def is_final(status):
+    """Return whether ``status`` is the last one a payment gets."""
+    return status is not None and status[Constants.PAYMENT_STATUS] in FINAL_STATUSES
+
+
+def stream_payment_status(order_number, since=None, timeout=0, config=None):
+    """Yield the status changes of ``order_number`` as Server-Sent Events.
+
+    The stream ends after a final status or ``timeout`` seconds. Browsers then
+    reconnect by themselves, sending the last event id as ``Last-Event-ID``.
+    Clients should close the stream once they received a final status.
+    """
+    deadline = time.time() + timeout
+    while True:
+        status = wait_for_payment_status(order_number, since, max(deadline - time.time(), 0), config)
+        if status is None:
+            return
+        since = status['version']
+        yield 'id: %d\nevent: status\ndata: %s\n\n' % (since, json.dumps(status))
+        if is_final(status):
+            return
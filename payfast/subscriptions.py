@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Ad hoc charge runs against tokenized cards.
+
+A run charges every active :class:`~payfast.models.PayfastToken` once. Tokens
+are processed in batches ordered by primary key:
+
+1. a ``PENDING`` :class:`~payfast.models.PayfastCharge` is written for every
+   token of the batch that has not been charged by this run yet,
+2. the charges are sent through a shared, pooled
+   :class:`~payfast.client.PayfastAPIClient` by a bounded number of threads,
+3. the results and the run checkpoint are saved in one transaction.
+
+Every charge is sent with its own ``m_payment_id``, see
+:func:`get_charge_payment_id`, so that the notification Payfast sends for it is
+told apart from the payment of the order that tokenized the card and applied
+to the charge by :func:`settle_charge`.
+
+Running the same run again after a crash resumes after the last checkpoint.
+Charges still ``PENDING`` at that point, or left ``PENDING`` because Payfast
+did not answer them, may or may not have gone through, so they are never sent
+again. Their notification settles them, if Payfast sends one, otherwise they
+have to be checked by hand.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .concurrency import imap_bounded
+from .constants import Constants
+from .exceptions import PayfastAPIException, PayfastUnavailableException
+from .models import PayfastCharge, PayfastChargeRun, PayfastToken
+
+logger = logging.getLogger('payfast')
+
+
+def get_charge_payment_id(charge):
+    """Return the ``m_payment_id`` the charge is sent with."""
+    return '%s%d' % (Constants.CHARGE_PAYMENT_ID_PREFIX, charge.pk)
+
+
+def settle_charge(m_payment_id, status):
+    """Apply a notification to the still ``PENDING`` charge it is for.
+
+    :param m_payment_id: ``m_payment_id`` of the notification.
+    :param status: Payfast payment status of the notification.
+    :return: Whether the notification is for an ad hoc charge.
+    """
+    prefix = Constants.CHARGE_PAYMENT_ID_PREFIX
+    if not (m_payment_id or '').startswith(prefix):
+        return False
+    try:
+        charge_id = int(m_payment_id[len(prefix):])
+    except ValueError:
+        return False
+
+    if status == Constants.PAYMENT_RESULT_COMPLETE:
+        new_status = Constants.CHARGE_SUCCESS
+    elif status in (Constants.PAYMENT_RESULT_FAILED, Constants.PAYMENT_RESULT_CANCELLED):
+        new_status = Constants.CHARGE_FAILED
+    else:
+        return True
+    PayfastCharge.objects.filter(pk=charge_id, status=Constants.CHARGE_PENDING).update(status=new_status)
+    return True
+
+
+def _send_charge(client, charge):
+    """Send ``charge`` and return it with its outcome. Runs in a worker thread.
+
+    A charge Payfast did not answer, because of a timeout, a connection error
+    or a server error, may still have gone through: it stays ``PENDING``.
+    """
+    try:
+        client.charge_token(
+            charge.token.token,
+            charge.amount,
+            item_name=charge.token.item_name or charge.run.name,
+            m_payment_id=get_charge_payment_id(charge),
+        )
+    except PayfastUnavailableException as e:
+        logger.warning("Charge of token %s has an unknown outcome: %s", charge.token.token, e)
+        charge.message = str(e)[:255]
+    except PayfastAPIException as e:
+        logger.warning("Charge of token %s failed: %s", charge.token.token, e)
+        charge.status, charge.message = Constants.CHARGE_FAILED, str(e)[:255]
+    else:
+        charge.status = Constants.CHARGE_SUCCESS
+    return charge
+
+
+def _reserve_charges(run, tokens, amount):
+    """Write the ``PENDING`` charges of a batch and return the ones to send."""
+    charged = set(PayfastCharge.objects.filter(run=run, token__in=tokens).values_list('token_id', flat=True))
+    tokens = [token for token in tokens if token.pk not in charged]
+    PayfastCharge.objects.bulk_create(PayfastCharge(run=run, token=token, amount=amount) for token in tokens)
+    # Read back for their ids, which not every database returns from bulk_create.
+    return list(PayfastCharge.objects.filter(run=run, token__in=tokens).select_related('run', 'token'))
+
+
+def _save_results(run, charges, checkpoint):
+    """Save the outcome of a batch and move the run checkpoint forward."""
+    succeeded = [charge.token_id for charge in charges if charge.status == Constants.CHARGE_SUCCESS]
+    failed = [charge for charge in charges if charge.status == Constants.CHARGE_FAILED]
+    unknown = [charge for charge in charges if charge.status == Constants.CHARGE_PENDING]
+
+    with transaction.atomic():
+        PayfastCharge.objects.filter(run=run, token_id__in=succeeded).update(status=Constants.CHARGE_SUCCESS)
+        for charge in failed:
+            PayfastCharge.objects.filter(run=run, token_id=charge.token_id).update(
+                status=charge.status, message=charge.message)
+        for charge in unknown:
+            # Its notification may have settled it already.
+            PayfastCharge.objects.filter(pk=charge.pk, status=Constants.CHARGE_PENDING).update(message=charge.message)
+        PayfastChargeRun.objects.filter(pk=run.pk).update(
+            last_token_id=checkpoint,
+            charged=F('charged') + len(succeeded),
+            failed=F('failed') + len(failed),
+        )
+    run.last_token_id = checkpoint
+
+
+def run_charges(name, client, amount, workers=4, batch_size=100):
+    """Charge every active token once for the run ``name``.
+
+    :param str name: Unique name of the run, such as ``nightly-2018-01-31``.
+        Calling this again with the same name resumes the run.
+    :param client: A shared :class:`~payfast.client.PayfastAPIClient`.
+    :param amount: Amount to charge every token. The amount stored with a token
+        is the one of the payment that tokenized the card, which may include
+        shipping or a setup fee, so it is never charged again implicitly.
+    :param int workers: Maximum number of charges in flight at once.
+    :param int batch_size: Number of tokens per checkpoint.
+    :return: The :class:`~payfast.models.PayfastChargeRun`.
+    """
+    run, __ = PayfastChargeRun.objects.get_or_create(name=name)
+    if run.date_finished:
+        return run
+
+    tokens = PayfastToken.objects.filter(is_active=True).order_by('pk')
+    while True:
+        batch = list(tokens.filter(pk__gt=run.last_token_id)[:batch_size])
+        if not batch:
+            break
+
+        charges = _reserve_charges(run, batch, amount)
+        # Reserved charges carry the token and run objects, the workers only do HTTP.
+        results = list(imap_bounded(lambda charge: _send_charge(client, charge), charges, workers=workers))
+        _save_results(run, results, checkpoint=batch[-1].pk)
+
+    PayfastChargeRun.objects.filter(pk=run.pk).update(date_finished=timezone.now())
+    run.refresh_from_db()
+    return run
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Sweep orders left pending by customers who never paid.
+
+Every checkout places an Oscar order before the customer is sent to Payfast,
+so abandoned payments leave pending orders behind. A sweep run looks at the
+pending orders placed before a cutoff, in batches ordered by primary key:
+
+1. the batch is read with a keyset query (``pk`` greater than the checkpoint),
+2. Payfast is queried about every order of the batch through a shared, pooled
+   :class:`~payfast.client.PayfastAPIClient` by a bounded number of threads,
+   paced by a :class:`~payfast.throttling.TokenBucket`,
+3. in one transaction, orders Payfast reports as paid are settled like a
+   notification would settle them, orders Payfast does not know or reports as
+   cancelled or failed are cancelled with a single ``UPDATE``, and the run
+   checkpoint moves forward.
+
+Orders Payfast still reports as pending, or could not be queried, are skipped.
+Running the same run again after a crash resumes after the last checkpoint.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .concurrency import imap_bounded
+from .constants import Constants
+from .exceptions import PayfastAPIException, PayfastNotFoundException
+from .loading import lazy_class, lazy_model
+from .models import PayfastSweepRun
+from .throttling import TokenBucket
+
+Facade = lazy_class('payfast.facade', 'Facade')
+order_status_changed = lazy_class('order.signals', 'order_status_changed')
+
+Line = lazy_model('order', 'Line')
+Order = lazy_model('order', 'Order')
+
+logger = logging.getLogger('payfast')
+
+#: Stands for the payment of an order Payfast does not know.
+NOT_FOUND = object()
+
+#: Payment statuses reported by the query API that cancel an order.
+CANCELLING_STATUSES = (Constants.PAYMENT_RESULT_CANCELLED, Constants.PAYMENT_RESULT_FAILED)
+
+
+def _wait_for_token(bucket):
+    """Block until ``bucket`` hands out a token."""
+    while not bucket.allow('query'):
+        time.sleep(1.0 / bucket.rate)
+
+
+def _query_order(client, order_number, bucket=None):
+    """Return the payment Payfast holds for ``order_number``.
+
+    :return: The payment fields, :data:`NOT_FOUND` if Payfast does not know
+        the order, or None if the query failed or its answer carried no
+        payment. Runs in a worker thread.
+    """
+    if bucket is not None:
+        _wait_for_token(bucket)
+    try:
+        return client.query_payment(order_number)
+    except PayfastNotFoundException:
+        return NOT_FOUND
+    except PayfastAPIException as e:
+        logger.warning("Payfast query of order %s failed: %s", order_number, e)
+        return None
+
+
+def cancel_orders(order_ids, config):
+    """Cancel the orders of ``order_ids`` that are still pending.
+
+    The orders are locked, moved with one ``UPDATE`` (and their lines with
+    another) and ``order_status_changed`` is sent for each of them. Must run
+    inside a transaction.
+
+    :return: The number of cancelled orders.
+    """
+    pending, cancelled = config.get_pending_order_status(), config.get_cancelled_order_status()
+    orders = list(Order.objects.select_for_update().filter(pk__in=order_ids, status=pending))
+    if not orders:
+        return 0
+
+    Order.objects.filter(pk__in=[order.pk for order in orders]).update(status=cancelled)
+    line_status = Order.cascade.get(cancelled)
+    if line_status:
+        Line.objects.filter(order__in=orders).update(status=line_status)
+
+    for order in orders:
+        order.status = cancelled
+        order_status_changed.send(sender=order, order=order, old_status=pending, new_status=cancelled)
+    return len(orders)
+
+
+def _apply_batch(run, facade, results, checkpoint):
+    """Settle and cancel the orders of a batch and move the run checkpoint forward."""
+    settled, to_cancel, skipped = 0, [], 0
+    with transaction.atomic():
+        for order_id, order_number, payment in results:
+            if payment is None:
+                skipped += 1
+                continue
+            status = None if payment is NOT_FOUND else payment.get(Constants.PAYMENT_STATUS)
+            if payment is NOT_FOUND or status in CANCELLING_STATUSES:
+                to_cancel.append(order_id)
+            elif status == Constants.PAYMENT_RESULT_COMPLETE:
+                params = dict(payment, **{Constants.M_PAYMENT_ID: order_number})
+                facade.process_notification(True, status, params)
+                settled += 1
+            else:
+                skipped += 1
+
+        cancelled = cancel_orders(to_cancel, facade.config) if to_cancel else 0
+        PayfastSweepRun.objects.filter(pk=run.pk).update(
+            last_order_id=checkpoint,
+            settled=F('settled') + settled,
+            cancelled=F('cancelled') + cancelled,
+            skipped=F('skipped') + skipped,
+        )
+    run.last_order_id = checkpoint
+
+
+def sweep_orders(name, client, hours=None, workers=4, batch_size=100, rate=None, sleep=0):
+    """Settle or cancel the orders left pending for more than ``hours``.
+
+    :param str name: Unique name of the run. Calling this again with the same
+        name resumes the run.
+    :param client: A shared :class:`~payfast.client.PayfastAPIClient`.
+    :param hours: Age in hours of the orders swept, see
+        :meth:`~payfast.config.AbstractPayfastConfig.get_abandoned_order_hours`.
+    :param int workers: Maximum number of queries in flight at once.
+    :param int batch_size: Number of orders per checkpoint.
+    :param rate: Maximum number of queries per second, see
+        :meth:`~payfast.config.AbstractPayfastConfig.get_sweep_rate`.
+    :param sleep: Seconds to pause between batches, to leave room to live traffic.
+    :return: The :class:`~payfast.models.PayfastSweepRun`.
+    """
+    facade = Facade()
+    config = facade.config
+    hours = config.get_abandoned_order_hours() if hours is None else hours
+    rate = config.get_sweep_rate() if rate is None else rate
+    bucket = TokenBucket(rate, burst=1) if rate else None
+
+    run, __ = PayfastSweepRun.objects.get_or_create(
+        name=name, defaults={'cutoff': timezone.now() - timedelta(hours=hours)})
+    if run.date_finished:
+        return run
+
+    orders = Order.objects.filter(status=config.get_pending_order_status(), date_placed__lt=run.cutoff)
+    orders = orders.order_by('pk').values_list('pk', 'number')
+    while True:
+        batch = list(orders.filter(pk__gt=run.last_order_id)[:batch_size])
+        if not batch:
+            break
+
+        results = imap_bounded(lambda order: order + (_query_order(client, order[1], bucket),), batch, workers=workers)
+        _apply_batch(run, facade, list(results), checkpoint=batch[-1][0])
+        if sleep:
+            time.sleep(sleep)
+
+    PayfastSweepRun.objects.filter(pk=run.pk).update(date_finished=timezone.now())
+    run.refresh_from_db()
+    return run
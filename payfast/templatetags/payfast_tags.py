@@ -0,0 +1,11 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def payfast_status_url(order_number):
+    """Return the payment status URL of an order, see :mod:`payfast.status`."""
+    from payfast.status import get_status_url
+
+    return get_status_url(order_number)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Token bucket rate limiting for the public notify endpoint.
+
+Every client key (the source IP address of a notification) owns a bucket of
+``burst`` tokens that refills at ``rate`` tokens per second. Each request takes
+a token, requests finding an empty bucket are rejected.
+
+Buckets live in process memory by default. :class:`CacheTokenBucket` keeps
+them in a Django cache instead so that all workers share the same limits.
+"""
+import threading
+import time
+
+
+class TokenBucket(object):
+    """In-memory token bucket limiter.
+
+    :param rate: Tokens added per second.
+    :param burst: Maximum number of tokens in a bucket.
+    :param int max_keys: Maximum number of buckets kept in memory. Buckets that
+        refilled completely are dropped first when the limit is reached.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _take(self, bucket, now):
+        """Return the allowance and the new state of ``bucket`` at ``now``."""
+        tokens, last = bucket if bucket is not None else (self.burst, now)
+        tokens = min(self.burst, tokens + max(now - last, 0) * self.rate)
+        if tokens >= 1:
+            return True, (tokens - 1, now)
+        return False, (tokens, now)
+
+    def allow(self, key, now=None):
+        """Take a token from the bucket of ``key`` and return whether one was left."""
+        now = time.time() if now is None else now
+        with self.lock:
+            allowed, bucket = self._take(self.buckets.get(key), now)
+            if key not in self.buckets and len(self.buckets) >= self.max_keys:
+                self._prune(now)
+            self.buckets[key] = bucket
+        return allowed
+
+    def _prune(self, now):
+        for key, (tokens, last) in list(self.buckets.items()):
+            if tokens + (now - last) * self.rate >= self.burst:
+                del self.buckets[key]
+        if len(self.buckets) >= self.max_keys:
+            self.buckets.clear()
+
+
+class CacheTokenBucket(TokenBucket):
+    """Token bucket limiter shared through a Django cache.
+
+    Reads and writes of a bucket are not atomic, so concurrent requests for the
+    same key may occasionally both get the last token. That is acceptable for
+    abuse shielding and avoids any locking.
+    """
+
+    def __init__(self, rate, burst, cache_alias='default'):
+        super(CacheTokenBucket, self).__init__(rate, burst)
+        self.cache_alias = cache_alias
+        # A bucket untouched for this long is full again and can expire.
+        self.timeout = max(int(self.burst / self.rate) + 1, 1)
+
+    def allow(self, key, now=None):
+        from django.core.cache import caches
+
+        cache = caches[self.cache_alias]
+        cache_key = 'payfast:bucket:%s' % key
+        now = time.time() if now is None else now
+        allowed, bucket = self._take(cache.get(cache_key), now)
+        cache.set(cache_key, bucket, self.timeout)
+        return allowed
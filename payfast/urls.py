@@ -3,6 +3,8 @@ from payfast import views
 
 urlpatterns = [
     url(r'^redirect/', views.redirect_view, name='payfast-redirect'),
+    url(r'^onsite/$', views.onsite_view, name='payfast-onsite'),
     url(r'^notify/', views.notify_view, name='payfast-notify'),
-    url(r'^cancel/', views.cancel_view, name='payfast-cancel')
+    url(r'^cancel/', views.cancel_view, name='payfast-cancel'),
+    url(r'^status/(?P<m_payment_id>[^/]+)/$', views.status_view, name='payfast-status'),
 ]
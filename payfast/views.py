@@ -1,22 +1,60 @@
-from oscar.core.loading import get_class, get_model
-from django.shortcuts import get_object_or_404, render
+import logging
+
+from django.shortcuts import get_object_or_404, redirect, render
 from django.shortcuts import reverse
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 
-Interface = get_class('payfast.interface', 'Interface')
-Order = get_model('order', 'Order')
+from .config import get_config
+from .exceptions import PayfastAPIException
+from .loading import lazy_class, lazy_model
 
+Interface = lazy_class('payfast.interface', 'Interface')
+Order = lazy_model('order', 'Order')
 
-def redirect_view(request):
-    interface = Interface()
-    order = get_object_or_404(Order, id=request.session.get('checkout_order_id', 0))
-    form_fields = interface.get_form_fields(order_data={
-        'm_payment_id': order.number,
-        'amount': order.total_incl_tax,
-        'item_name': 'Payfast order: {}'.format(order.number),
+logger = logging.getLogger('payfast')
+
+# Session key of the order whose payment form was presigned.
+PRESIGNED_ORDER_SESSION_KEY = 'payfast_presigned_order'
+
+
+def get_order_data(request, order_number, amount, item_description=None):
+    """Return the payment form data of an order placed through ``request``.
+
+    :param item_description: Summary of the order lines, see :mod:`payfast.descriptions`.
+    """
+    order_data = {
+        'm_payment_id': order_number,
+        'amount': amount,
+        'item_name': 'Payfast order: {}'.format(order_number),
         'return_url': request.build_absolute_uri(reverse('checkout:thank-you')),
         'notify_url': request.build_absolute_uri(reverse('payfast-notify'))
-    })
+    }
+    if item_description:
+        order_data['item_description'] = item_description
+    return order_data
+
+
+def presign_payment_form(request, order_number, amount, item_description=None):
+    """Sign the payment form of an order being placed, typically from ``handle_payment``.
+
+    :func:`redirect_view` then renders the stored fields without signing.
+    """
+    Interface().presign_form_fields(get_order_data(request, order_number, amount, item_description))
+    request.session[PRESIGNED_ORDER_SESSION_KEY] = order_number
+
+
+def redirect_view(request):
+    interface = Interface()
+    # Popped so that the form of a past order is never picked up for a later one.
+    form_fields = interface.get_presigned_form_fields(request.session.pop(PRESIGNED_ORDER_SESSION_KEY, None))
+    if form_fields is None:
+        from .descriptions import get_item_description
+
+        order = get_object_or_404(Order, id=request.session.get('checkout_order_id', 0))
+        order_data = get_order_data(request, order.number, order.total_incl_tax, get_item_description(order))
+        form_fields = interface.get_form_fields(order_data=order_data)
 
     form_action_url = interface.get_form_action()
 
@@ -26,8 +64,37 @@ def redirect_view(request):
     })
 
 
+def onsite_view(request):
+    """Open the Payfast onsite payment modal for the order being paid.
+
+    Falls back to :func:`redirect_view` when Payfast does not issue a UUID.
+    """
+    from .descriptions import get_item_description
+
+    interface = Interface()
+    order = get_object_or_404(Order, id=request.session.get('checkout_order_id', 0))
+    order_data = get_order_data(request, order.number, order.total_incl_tax, get_item_description(order))
+    try:
+        uuid = interface.get_onsite_uuid(order_data)
+    except PayfastAPIException as e:
+        logger.warning("No onsite payment for order %s, redirecting to Payfast: %s", order.number, e)
+        return redirect('payfast-redirect')
+
+    return render(request, "payfast/onsite.html", {
+        'uuid': uuid,
+        'engine_url': interface.get_onsite_engine_url(),
+        'return_url': order_data['return_url'],
+    })
+
+
+@csrf_exempt
 def notify_view(request):
+    """Apply a Payfast ITN.
 
+    Payfast posts server to server without a CSRF token, hence the exemption. To
+    skip the rest of the middleware stack as well, serve this view through
+    :class:`payfast.wsgi.NotifyHandler`.
+    """
     interface = Interface()
 
     try:
@@ -41,3 +108,48 @@ def notify_view(request):
 
 def cancel_view(request):
     return HttpResponse(status=200)
+
+
+def _to_version(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@require_GET
+def status_view(request, m_payment_id):
+    """Answer the payment status of an order from the cache, see :mod:`payfast.status`."""
+    # Imported here so that loading the URLs does not require the cache.
+    from . import status
+
+    if not status.check_status_token(m_payment_id, request.GET.get('token')):
+        return HttpResponseForbidden()
+    config = get_config()
+
+    if 'text/event-stream' in request.META.get('HTTP_ACCEPT', ''):
+        since = _to_version(request.META.get('HTTP_LAST_EVENT_ID'))
+        events = status.stream_payment_status(m_payment_id, since, config.get_status_max_wait(), config)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keeps nginx from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    try:
+        wait = min(max(float(request.GET.get('wait') or 0), 0), config.get_status_max_wait())
+    except ValueError:
+        wait = 0
+    payment_status = None
+    if wait:
+        payment_status = status.wait_for_payment_status(
+            m_payment_id, _to_version(request.GET.get('since')), wait, config)
+    if payment_status is None:
+        payment_status = status.get_payment_status(m_payment_id, config)
+
+    return JsonResponse(payment_status or {
+        'm_payment_id': m_payment_id,
+        'payment_status': None,
+        'order_status': None,
+        'version': None,
+    })
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""Delivery of payment events to downstream services.
+
+Accepted notifications write one :class:`~payfast.models.PayfastWebhookEvent`
+per endpoint of :data:`PAYFAST_WEBHOOK_URLS` in the notification transaction,
+so no event is lost and ``notify_view`` never waits on a downstream service.
+
+The ``payfast_deliver_webhooks`` command then delivers due events:
+
+1. a batch of due events is claimed by pushing its ``next_attempt_at`` forward,
+   so concurrent workers do not pick up the same events,
+2. the events of the batch are grouped per endpoint and each group is POSTed
+   as a single JSON document through a pooled ``requests`` session,
+3. outcomes are saved with one ``UPDATE`` per outcome. Failed events are retried
+   with an exponential backoff until :data:`PAYFAST_WEBHOOK_MAX_ATTEMPTS`.
+
+Deliveries are at least once: receivers should ignore event ids they have seen.
+When :data:`PAYFAST_WEBHOOK_SECRET` is set, the hex HMAC-SHA256 of the body is
+sent in the ``X-Payfast-Webhook-Signature`` header.
+"""
+import hashlib
+import hmac
+import json
+import logging
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .concurrency import imap_bounded
+from .constants import Constants
+from .models import PayfastWebhookEvent
+
+logger = logging.getLogger('payfast')
+
+PAYLOAD_FIELDS = (
+    Constants.M_PAYMENT_ID,
+    Constants.PF_PAYMENT_ID,
+    Constants.PAYMENT_STATUS,
+    Constants.AMOUNT_GROSS,
+    Constants.AMOUNT_FEE,
+    Constants.AMOUNT_NET,
+    Constants.MERCHANT_ID,
+)
+
+
+def queue_payment_event(urls, status, params, order_status=None):
+    """Write a payment event for every endpoint of ``urls``.
+
+    :param urls: Endpoints to deliver the event to.
+    :param str status: Payfast payment status of the notification.
+    :param dict params: Notification fields.
+    :param order_status: Status the order was moved to, if it was moved.
+    :return: The created events.
+    """
+    if not urls:
+        return []
+
+    data = dict((key, params.get(key)) for key in PAYLOAD_FIELDS)
+    data['order_status'] = order_status
+    payload = json.dumps(data, sort_keys=True)
+    event_type = 'payment.%s' % (status or 'unknown').lower()
+
+    events = [PayfastWebhookEvent(url=url, event_type=event_type, payload=payload) for url in urls]
+    PayfastWebhookEvent.objects.bulk_create(events)
+    return events
+
+
+def backoff(attempts, base=30, cap=6 * 60 * 60):
+    """Return the delay in seconds before retrying an event after ``attempts`` failures."""
+    return min(base * 2 ** max(attempts - 1, 0), cap)
+
+
+class WebhookDeliverer(object):
+    """Delivers due webhook events in batches.
+
+    :param secret: Secret signing the deliveries, or None.
+    :param int max_attempts: Attempts before an event is marked as failed.
+    :param timeout: Timeout of every delivery in seconds.
+    :param int pool_size: Maximum number of pooled connections, which should
+        match the number of workers.
+    :param lease: Seconds a claimed batch is hidden from other workers.
+    """
+
+    def __init__(self, secret=None, max_attempts=10, timeout=10, pool_size=4, lease=300):
+        import requests
+
+        self.secret = secret
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.lease = lease
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def claim(self, batch_size, now):
+        """Claim up to ``batch_size`` due events and return them."""
+        with transaction.atomic():
+            due = PayfastWebhookEvent.objects.filter(status=Constants.WEBHOOK_PENDING, next_attempt_at__lte=now)
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            pks = list(due.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            PayfastWebhookEvent.objects.filter(pk__in=pks).update(next_attempt_at=now + timedelta(seconds=self.lease))
+        return list(PayfastWebhookEvent.objects.filter(pk__in=pks))
+
+    def build_body(self, events):
+        """Return the JSON document delivering ``events``."""
+        # Payloads are stored as JSON already, they are spliced in as they are.
+        return '{"events": [%s]}' % ', '.join(
+            '{"id": %d, "type": %s, "created": %s, "data": %s}' % (
+                event.pk, json.dumps(event.event_type), json.dumps(event.date_created.isoformat()), event.payload)
+            for event in events
+        )
+
+    def post(self, url, events):
+        """POST ``events`` to ``url`` and return an error message, or None on success."""
+        import requests
+
+        body = self.build_body(events).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.secret:
+            headers[Constants.WEBHOOK_SIGNATURE_HEADER] = hmac.new(
+                self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning("Delivery of %d webhook events to %s failed: %s", len(events), url, e)
+            return str(e)[:255] or e.__class__.__name__
+
+    def save_results(self, results, now):
+        """Save the outcome of delivered ``(events, error)`` groups."""
+        delivered = []
+        failed = defaultdict(list)
+        for events, error in results:
+            if error is None:
+                delivered.extend(event.pk for event in events)
+            else:
+                for event in events:
+                    failed[(event.attempts + 1, error)].append(event.pk)
+
+        with transaction.atomic():
+            if delivered:
+                PayfastWebhookEvent.objects.filter(pk__in=delivered).update(
+                    status=Constants.WEBHOOK_DELIVERED, attempts=F('attempts') + 1, date_delivered=now)
+            for (attempts, error), pks in failed.items():
+                update = {'attempts': attempts, 'last_error': error}
+                if attempts >= self.max_attempts:
+                    update['status'] = Constants.WEBHOOK_FAILED
+                else:
+                    update['next_attempt_at'] = now + timedelta(seconds=backoff(attempts))
+                PayfastWebhookEvent.objects.filter(pk__in=pks).update(**update)
+
+        return len(delivered), sum(len(pks) for pks in failed.values())
+
+    def deliver(self, batch_size=100, workers=4, now=None):
+        """Deliver one batch of due events.
+
+        :param int batch_size: Maximum number of events claimed.
+        :param int workers: Maximum number of endpoints posted to at once.
+        :return: ``(delivered, failed)`` counts, ``(0, 0)`` once nothing is due.
+        """
+        now = now or timezone.now()
+        events = self.claim(batch_size, now)
+
+        groups = OrderedDict()
+        for event in events:
+            groups.setdefault(event.url, []).append(event)
+
+        results = imap_bounded(lambda group: (group[1], self.post(*group)), groups.items(), workers=workers)
+        return self.save_results(results, now)
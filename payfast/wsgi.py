@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Lean WSGI handler for Payfast notifications (ITNs).
+
+An ITN is a server to server POST, yet behind the project WSGI application it
+goes through every middleware: sessions, CSRF, authentication, messages, the
+basket middleware and so on, none of which matter to it. :class:`NotifyHandler`
+is a WSGI application that turns the request straight into a
+:class:`~django.core.handlers.wsgi.WSGIRequest` and hands it to
+:func:`payfast.views.notify_view`, without URL resolving nor middleware.
+
+Mount it in front of the project application in the project ``wsgi.py``::
+
+    from django.core.wsgi import get_wsgi_application
+    from payfast.wsgi import mount
+
+    application = mount(get_wsgi_application(), '/payfast/notify/')
+
+or serve it on its own, for instance as a separate gunicorn worker pool behind
+a proxy rule for the notify URL::
+
+    from payfast.wsgi import NotifyHandler
+
+    application = NotifyHandler()
+
+The ``notify_url`` sent to Payfast is unchanged, it is still built from the
+``payfast-notify`` URL name.
+"""
+from django.core import signals
+from django.core.handlers.wsgi import WSGIRequest, get_script_name
+from django.urls import set_script_prefix
+
+
+class NotifyHandler(object):
+    """WSGI application serving only the notify view.
+
+    Like Django's own handler it sends the ``request_started`` and
+    ``request_finished`` signals, so database connections are still recycled
+    as configured by ``CONN_MAX_AGE``.
+    """
+
+    def __init__(self):
+        # Imported here so that building the handler does not require the app registry.
+        from .views import notify_view
+
+        self.view = notify_view
+
+    def get_response(self, request):
+        from django.http import HttpResponseNotAllowed
+
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        return self.view(request)
+
+    def __call__(self, environ, start_response):
+        set_script_prefix(get_script_name(environ))
+        signals.request_started.send(sender=self.__class__, environ=environ)
+        try:
+            response = self.get_response(WSGIRequest(environ))
+        finally:
+            signals.request_finished.send(sender=self.__class__)
+
+        status = '%d %s' % (response.status_code, response.reason_phrase)
+        start_response(status, list(response.items()))
+        return [response.content]
+
+
+class NotifyDispatcher(object):
+    """Route the notify path to a :class:`NotifyHandler`, everything else to ``application``."""
+
+    def __init__(self, application, path, notify_handler=None):
+        self.application = application
+        self.path = path
+        self.notify_handler = notify_handler or NotifyHandler()
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '') == self.path:
+            return self.notify_handler(environ, start_response)
+        return self.application(environ, start_response)
+
+
+def mount(application, path):
+    """Return ``application`` with the notify ``path`` served by a :class:`NotifyHandler`.
+
+    :param application: The project WSGI application.
+    :param str path: Path of the notify view, such as ``/payfast/notify/``.
+    """
+    return NotifyDispatcher(application, path)
@@ -2,6 +2,8 @@ from django.core.urlresolvers import reverse
 from django.shortcuts import render, redirect
 from oscar.apps.checkout import views
 from oscar.apps.payment import forms, models
+from payfast.descriptions import get_basket_item_description
+from payfast.views import presign_payment_form
 
 
 class PaymentDetailsView(views.PaymentDetailsView):
@@ -52,3 +54,6 @@ class PaymentDetailsView(views.PaymentDetailsView):
         """
         Make submission to PayFast
         """
+        # Sign the Payfast form now, payfast-redirect then only looks it up.
+        item_description = get_basket_item_description(self.request.basket)
+        presign_payment_form(self.request, order_number, total.incl_tax, item_description)
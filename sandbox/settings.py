@@ -245,6 +245,17 @@ OSCAR_ALLOW_ANON_CHECKOUT = True
 
 OSCAR_SHOP_TAGLINE = 'PayFast'
 
+OSCAR_DASHBOARD_NAVIGATION.append({
+    'label': _('Payfast'),
+    'icon': 'icon-money',
+    'children': [
+        {
+            'label': _('Transactions'),
+            'url_name': 'payfast-transaction-list',
+        },
+    ]
+})
+
 # Haystack settings
 HAYSTACK_CONNECTIONS = {
     'default': {
@@ -6,6 +6,7 @@ from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.conf.urls.static import static
 
 from apps.app import application
+from payfast.dashboard.app import application as payfast_dashboard
 
 
 admin.autodiscover()
@@ -13,7 +14,8 @@ admin.autodiscover()
 urlpatterns = [
     url(r'^admin/', include(admin.site.urls)),
     url(r'^i18n/', include('django.conf.urls.i18n')),
-    url(r'^payfast/', include('payfast.urls'))
+    url(r'^payfast/', include('payfast.urls')),
+    url(r'^dashboard/payfast/', payfast_dashboard.urls),
 ]
 urlpatterns += i18n_patterns(
 
@@ -24,6 +26,8 @@ if settings.DEBUG:
     import debug_toolbar
     urlpatterns += [
         url(r'^__debug__/', include(debug_toolbar.urls)),
+        # Point PAYFAST_ACTION_URL at it to pay offline, see payfast.emulator.
+        url(r'^payfast-emulator/', include('payfast.emulator.urls')),
     ]
     urlpatterns += staticfiles_urlpatterns()
     urlpatterns += static(
@@ -1,8 +1,92 @@
+import json
 import os
+import subprocess
+import sys
 
 import django
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmarks', action='store_true', default=False,
+                     help="Also run the tests marked as benchmarks, whose timing budgets depend on the machine.")
 
 
 def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: timing or memory budget, only run with --benchmarks')
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
     django.setup()
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmarks'):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmarks")
+    for item in items:
+        # get_closest_marker replaced get_marker in pytest 3.6.
+        get_marker = getattr(item, 'get_closest_marker', None) or item.get_marker
+        if get_marker('benchmark'):
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def import_time():
+    """Return a function measuring the imports triggered by a statement.
+
+    The statement runs in a fresh interpreter under ``python -X importtime``
+    once Django is set up (unless ``setup_django`` is false), and the function
+    returns a dict mapping every module imported by the statement to its
+    cumulative import time in microseconds.
+    """
+    if sys.version_info < (3, 7):
+        pytest.skip("python -X importtime requires Python 3.7")
+
+    def measure(statement, setup_django=True):
+        marker = 'payfast: import time marker'
+        setup = 'import django, sys; django.setup()' if setup_django else 'import sys'
+        code = '%s; sys.stderr.write(%r); sys.stderr.flush(); %s' % (setup, marker + '\n', statement)
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ['DJANGO_SETTINGS_MODULE'])
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            stderr=subprocess.PIPE, env=env, universal_newlines=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+
+        modules, measuring = {}, False
+        for line in result.stderr.splitlines():
+            if line == marker:
+                measuring = True
+            elif measuring and line.startswith('import time:') and '|' in line:
+                __, cumulative, module = line[len('import time:'):].split('|')
+                if cumulative.strip().isdigit():
+                    modules[module.strip()] = int(cumulative)
+        assert measuring, result.stderr
+        return modules
+
+    return measure
+
+
+@pytest.fixture
+def import_memory():
+    """Return a function measuring the memory allocated by a statement.
+
+    The statement runs in a fresh interpreter without Django, and the function
+    returns the peak memory allocated while it ran in bytes, as traced by
+    :mod:`tracemalloc`, and the names of all the modules loaded after it.
+    """
+    if sys.version_info < (3, 4):
+        pytest.skip("tracemalloc requires Python 3.4")
+
+    def measure(statement):
+        code = (
+            'import json, sys, tracemalloc; tracemalloc.start(); %s; '
+            'print(json.dumps([tracemalloc.get_traced_memory()[1], sorted(sys.modules)]))' % statement
+        )
+        output = subprocess.check_output(
+            [sys.executable, '-c', code], universal_newlines=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        peak, modules = json.loads(output)
+        return peak, set(modules)
+
+    return measure
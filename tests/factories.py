@@ -0,0 +1,18 @@
+from payfast.signer import MD5Signer
+
+
+def build_notification(order, **overrides):
+    """Return the signed ITN fields Payfast would post for a payment of ``order``."""
+    params = {
+        'm_payment_id': order.number,
+        'pf_payment_id': '123456',
+        'payment_status': 'COMPLETE',
+        'item_name': 'Payfast order: {}'.format(order.number),
+        'amount_gross': str(order.total_incl_tax),
+        'amount_fee': '-2.30',
+        'amount_net': str(order.total_incl_tax - 2),
+        'merchant_id': '10000100',
+    }
+    params.update(overrides)
+    params['signature'] = MD5Signer().sign_notification(params)
+    return params
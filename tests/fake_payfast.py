@@ -0,0 +1,95 @@
+"""A fake Payfast server for tests.
+
+It listens on a random local port in a background thread, records every request
+it receives and answers with the responses registered per path.
+"""
+import json
+import threading
+
+try:
+    # Python > 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    import urllib.parse as parse
+except ImportError:
+    # Python < 3
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    import urlparse as parse
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakePayfastServer(object):
+
+    def __init__(self):
+        self.requests = []
+        self.responses = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, path, body=None, status=200, delay=0):
+        """Answer requests to ``path`` with ``body`` (JSON encoded unless a string)."""
+        self.responses[path] = (status, body, delay)
+
+    def requests_to(self, path):
+        return [request for request in self.requests if request['path'] == path]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                self._answer()
+
+            def do_POST(self):
+                self._answer()
+
+            def do_PUT(self):
+                self._answer()
+
+            def _answer(self):
+                url = parse.urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8') if length else ''
+                with fake.lock:
+                    fake.requests.append({
+                        'method': self.command,
+                        'path': url.path,
+                        'query': dict(parse.parse_qsl(url.query)),
+                        'headers': dict(self.headers.items()),
+                        'data': dict(parse.parse_qsl(body)),
+                        'body': body,
+                    })
+
+                status, response, delay = fake.responses.get(url.path, (404, {'status': 'failed'}, 0))
+                if delay:
+                    threading.Event().wait(delay)
+                if not isinstance(response, str):
+                    response = json.dumps(response)
+                response = response.encode('utf-8')
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -2,6 +2,7 @@
 # Django settings for tests project.
 # """
 from oscar import get_core_apps, OSCAR_MAIN_TEMPLATE_DIR
+from oscar.defaults import *  # noqa
 import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -21,6 +22,8 @@ OSCAR_REQUIRED_ADDRESS_FIELDS = []
 MIDDLEWARE_CLASSES = (
 
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
 
 )
 
@@ -28,6 +31,12 @@ INSTALLED_APPS = [
     'payfast',
     'django.contrib.contenttypes',
     'django.contrib.auth',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django.contrib.sites',
+    'django.contrib.flatpages',
+    'widget_tweaks',
 ] + get_core_apps()
 HAYSTACK_CONNECTIONS = {
     'default': {
@@ -0,0 +1,136 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, RequestFactory
+from django.test.utils import override_settings
+from oscar.test.factories import create_order
+from payfast.breaker import CircuitBreaker
+from payfast.exceptions import CircuitOpenException
+from payfast.facade import Facade
+from payfast.models import PayfastDeferredNotification
+from tests.factories import build_notification
+from tests.fake_payfast import FakePayfastServer
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def fail():
+    raise IOError("Payfast is down")
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CircuitBreakerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        for __ in range(2):
+            with self.assertRaises(IOError):
+                self.breaker.call('validate', fail)
+
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.call('validate', lambda: 'VALID')
+        self.assertEqual(self.breaker.call('api:subscriptions', lambda: 'ok'), 'ok',
+                         "Every endpoint must have its own circuit")
+
+    def test_success_resets_the_failure_count(self):
+        with self.assertRaises(IOError):
+            self.breaker.call('validate', fail)
+        self.breaker.call('validate', lambda: 'VALID')
+        with self.assertRaises(IOError):
+            self.breaker.call('validate', fail)
+
+        self.assertFalse(self.breaker.is_open('validate'))
+
+    def test_success_of_a_healthy_circuit_writes_nothing(self):
+        with mock.patch.object(cache, 'delete_many') as delete_many:
+            self.breaker.call('validate', lambda: 'VALID')
+        self.assertFalse(delete_many.called)
+
+    def test_half_open_circuit_lets_a_single_probe_through(self):
+        self.breaker.record_failure('validate', now=100)
+        self.breaker.record_failure('validate', now=100)
+
+        self.assertFalse(self.breaker.allow('validate', now=120))
+        self.assertTrue(self.breaker.allow('validate', now=130))
+        self.assertFalse(self.breaker.allow('validate', now=130), "Only one probe at a time")
+
+        # The probe failed: the circuit stays open for another reset timeout.
+        self.breaker.record_failure('validate', now=130)
+        self.assertFalse(self.breaker.allow('validate', now=150))
+        self.assertTrue(self.breaker.allow('validate', now=160))
+
+        self.breaker.record_success('validate')
+        self.assertTrue(self.breaker.allow('validate', now=160))
+        self.assertTrue(self.breaker.allow('validate', now=160))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PAYFAST_VALID_HOSTS=('127.0.0.1',), PAYFAST_VALIDATE_NOTIFICATIONS=True,
+                   PAYFAST_BREAKER_THRESHOLD=2)
+class NotificationValidationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.payfast = FakePayfastServer().__enter__()
+        self.addCleanup(self.payfast.__exit__)
+        self.override = self.settings(PAYFAST_VALIDATE_URL=self.payfast.url + '/eng/query/validate')
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def notify(self, order):
+        return Facade().handle_notification_request(RequestFactory().post('/notify/', build_notification(order)))
+
+    def test_confirmed_notification_settles_order(self):
+        self.payfast.respond('/eng/query/validate', 'VALID')
+        order = create_order()
+
+        self.notify(order)
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Paid')
+        request, = self.payfast.requests
+        self.assertEqual(request['data']['pf_payment_id'], '123456')
+        self.assertNotIn('signature', request['data'])
+
+    def test_unavailable_payfast_defers_notifications_then_trips_the_circuit(self):
+        self.payfast.respond('/eng/query/validate', 'Service unavailable', status=503)
+        orders = [create_order() for __ in range(3)]
+
+        for order in orders:
+            self.assertIsNone(self.notify(order))
+
+        self.assertEqual(len(self.payfast.requests), 2, "The open circuit must stop calls to Payfast")
+        self.assertEqual(PayfastDeferredNotification.objects.count(), 3)
+        orders[0].refresh_from_db()
+        self.assertNotEqual(orders[0].status, 'Paid')
+
+        self.payfast.respond('/eng/query/validate', 'VALID')
+        with self.settings(PAYFAST_BREAKER_RESET_TIMEOUT=0):
+            self.assertEqual(Facade().process_deferred_notifications(), 3)
+
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, 'Paid')
+        self.assertFalse(PayfastDeferredNotification.objects.filter(date_processed__isnull=True).exists())
+
+    @override_settings(PAYFAST_VALIDATION_FALLBACK='signature')
+    def test_signature_fallback_accepts_notification(self):
+        self.payfast.respond('/eng/query/validate', 'Service unavailable', status=503)
+        order = create_order()
+
+        self.notify(order)
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Paid')
+        self.assertFalse(PayfastDeferredNotification.objects.exists())
+
+    def test_invalid_answer_rejects_notification(self):
+        self.payfast.respond('/eng/query/validate', 'INVALID')
+
+        with self.assertRaisesRegexp(ValueError, 'did not confirm'):
+            self.notify(create_order())
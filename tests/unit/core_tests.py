@@ -0,0 +1,141 @@
+import unittest
+
+import pytest
+from django.test.utils import override_settings
+from payfast import core
+from payfast.core import notifications
+from payfast.exceptions import InvalidTransactionException, MissingFieldException
+from payfast.signer import MD5Signer
+
+try:
+    # Python > 3
+    import urllib.parse as parse
+except ImportError:
+    # Python < 3
+    import urllib as parse
+
+# Budget for importing payfast.core without Django, in microseconds. It only
+# needs a few standard library modules. Checked by the opt-in benchmarks.
+CORE_IMPORT_BUDGET = 50000
+
+# Budget for the memory allocated while importing payfast.core, in bytes.
+CORE_MEMORY_BUDGET = 2 * 1024 * 1024
+
+# Packages payfast.core must work without.
+FORBIDDEN_PACKAGES = ('django', 'oscar', 'requests', 'iptools')
+
+NOTIFICATION = {
+    'm_payment_id': '100042',
+    'pf_payment_id': '1089250',
+    'payment_status': 'COMPLETE',
+    'item_name': 'Order 100042',
+    'amount_gross': '100.00',
+    'amount_fee': '-2.30',
+    'amount_net': '97.70',
+    'name_first': 'John',
+    'email_address': 'john@example.com',
+    'merchant_id': '10000100',
+}
+
+
+def _is_forbidden(module):
+    return module.split('.')[0] in FORBIDDEN_PACKAGES
+
+
+def test_core_import_does_not_need_django(import_time):
+    modules = import_time('import payfast.core', setup_django=False)
+
+    assert 'payfast.core' in modules
+    assert not [module for module in modules if _is_forbidden(module)]
+
+
+@pytest.mark.benchmark
+def test_core_import_time_budget(import_time):
+    modules = import_time('import payfast.core', setup_django=False)
+
+    assert modules['payfast.core'] < CORE_IMPORT_BUDGET, "payfast.core took %dus to import" % modules['payfast.core']
+
+
+@pytest.mark.benchmark
+def test_core_memory_budget(import_memory):
+    peak, modules = import_memory('import payfast.core')
+
+    assert peak < CORE_MEMORY_BUDGET, "importing payfast.core allocated %d bytes" % peak
+    assert not [module for module in modules if _is_forbidden(module)]
+
+
+class CoreNotificationTestCase(unittest.TestCase):
+
+    def signed(self, passphrase=None, **fields):
+        params = dict(NOTIFICATION, **fields)
+        params['signature'] = core.sign_notification(params, passphrase)
+        return params
+
+    def test_parse_notification(self):
+        body = parse.urlencode(sorted(NOTIFICATION.items())).encode()
+
+        self.assertEqual(core.parse_notification(body), NOTIFICATION)
+
+    def test_verify_notification(self):
+        params = self.signed('secret')
+
+        accepted, status = core.verify_notification(params, 10000100, passphrase='secret')
+
+        self.assertTrue(accepted)
+        self.assertEqual(status, 'COMPLETE')
+        self.assertIn('signature', params)
+
+    def test_verify_cancelled_notification(self):
+        params = self.signed(payment_status='CANCELLED')
+
+        self.assertEqual(core.verify_notification(params, '10000100'), (False, 'CANCELLED'))
+
+    def test_verify_rejects_wrong_passphrase(self):
+        params = self.signed('secret')
+
+        with self.assertRaises(InvalidTransactionException):
+            core.verify_notification(params, '10000100', passphrase='other')
+
+    def test_verify_rejects_other_merchant(self):
+        params = self.signed()
+
+        with self.assertRaises(InvalidTransactionException):
+            core.verify_notification(params, '10000101')
+
+    def test_verify_rejects_missing_field(self):
+        params = self.signed()
+        del params['amount_gross']
+
+        with self.assertRaises(MissingFieldException):
+            core.verify_notification(params, '10000100')
+
+    def test_verify_rejects_unknown_source(self):
+        params = self.signed()
+
+        with self.assertRaises(InvalidTransactionException):
+            core.verify_notification(params, '10000100', host_ip='10.0.0.1', valid_ips=['197.97.145.144'])
+
+    def test_check_source_passes_valid_ip(self):
+        notifications.check_source('197.97.145.144', ['197.97.145.144'])
+
+
+class CoreSigningTestCase(unittest.TestCase):
+
+    @override_settings(PAYFAST_PASSPHRASE='secret')
+    def test_matches_django_signer(self):
+        fields = {
+            'merchant_id': '10000100',
+            'merchant_key': '46f0cd694581a',
+            'amount': '100.00',
+            'item_name': 'Order 100042',
+            'm_payment_id': '100042',
+        }
+        signer = MD5Signer()
+
+        self.assertEqual(core.sign_request(fields, 'secret'), signer.sign(fields))
+        self.assertEqual(core.sign_notification(NOTIFICATION, 'secret'), signer.sign_notification(NOTIFICATION))
+
+    def test_normalize_form_fields(self):
+        params = core.normalize_form_fields({'amount': 100, 'item_name': ' %s ' % ('x' * 120)})
+
+        self.assertEqual(params, {'amount': '100.00', 'item_name': 'x' * 100})
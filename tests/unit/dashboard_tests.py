@@ -0,0 +1,77 @@
+import csv
+from datetime import timedelta
+from decimal import Decimal as D
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils import timezone
+from payfast.dashboard.views import keyset_page
+from payfast.models import PayfastTransaction
+
+
+class TransactionDashboardTestCase(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        # Pairs of transactions share a timestamp, the id breaks the tie.
+        self.transactions = [
+            PayfastTransaction.objects.create(
+                order_number=str(100 + index), payfast_reference=str(index), amount=D('10.00'),
+                status='COMPLETE' if index % 2 else 'CANCELLED', date_created=now - timedelta(minutes=index // 2))
+            for index in range(7)
+        ]
+        self.newest_first = sorted(self.transactions, key=lambda txn: (txn.date_created, txn.pk), reverse=True)
+
+        user = User.objects.create_user('staff', 'staff@example.com', 'secret')
+        user.is_staff = True
+        user.save()
+        self.client.login(username='staff', password='secret')
+
+    def test_keyset_pages_walk_every_transaction_once(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(PayfastTransaction.objects.all(), cursor, size=3)
+            seen.extend(page)
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, self.newest_first)
+
+    def test_malformed_cursor_shows_the_first_page(self):
+        page, __ = keyset_page(PayfastTransaction.objects.all(), 'garbage', size=3)
+
+        self.assertEqual(page, self.newest_first[:3])
+
+    def test_list_is_paginated_and_filtered(self):
+        url = reverse('payfast-transaction-list')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['transactions']), 7)
+        for field in ('order_number', 'payfast_reference', 'status', 'date_from', 'date_to'):
+            self.assertContains(response, 'name="%s"' % field)
+
+        response = self.client.get(url, {'status': 'COMPLETE'})
+        self.assertEqual([txn.status for txn in response.context['transactions']], ['COMPLETE'] * 3)
+
+        response = self.client.get(url, {'order_number': '103'})
+        self.assertEqual(response.context['transactions'], [self.transactions[3]])
+
+    def test_list_requires_staff(self):
+        self.client.logout()
+
+        response = self.client.get(reverse('payfast-transaction-list'))
+
+        self.assertEqual(response.status_code, 302)
+
+    def test_csv_export_is_streamed(self):
+        response = self.client.get(reverse('payfast-transaction-list'), {'format': 'csv', 'status': 'CANCELLED'})
+
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+        self.assertEqual(rows[0][:3], ['date_created', 'order_number', 'payfast_reference'])
+        self.assertEqual([row[1] for row in rows[1:]], ['100', '102', '104', '106'])
+
+    def test_str_handles_missing_method(self):
+        self.assertEqual(str(self.transactions[0]), 'Payfast UNKNOWN txn 0 | amount: 10.00 | status: CANCELLED')
@@ -0,0 +1,64 @@
+import unittest
+
+from django.core.cache import cache
+from django.test import TestCase
+from oscar.test.factories import create_basket, create_order, create_product
+from payfast.descriptions import describe_lines, get_basket_item_description, get_item_description
+
+
+class DescribeLinesTestCase(unittest.TestCase):
+
+    def test_short_orders_list_every_line(self):
+        self.assertEqual(describe_lines([('Hat', 2), ('Blue\n  scarf', 1)]), '2 x Hat, 1 x Blue scarf')
+
+    def test_long_orders_keep_whole_lines(self):
+        lines = [('Product %d' % index, 1) for index in range(10)]
+
+        description = describe_lines(lines, max_length=50)
+
+        self.assertEqual(description, '1 x Product 0, 1 x Product 1 and 8 more')
+        self.assertLessEqual(len(description), 50)
+
+    def test_long_first_line_is_cut_short(self):
+        description = describe_lines([('x' * 300, 1), ('Hat', 1)])
+
+        self.assertEqual(len(description), 255)
+        self.assertTrue(description.endswith('x... and 1 more'))
+
+
+class ItemDescriptionTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.basket = create_basket(empty=True)
+        for index in range(3):
+            self.basket.add_product(create_product(title='Product %d' % index, price=10), quantity=index + 1)
+
+    def test_order_description_is_cached(self):
+        order = create_order(basket=self.basket)
+
+        with self.assertNumQueries(1):
+            description = get_item_description(order)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_item_description(order), description)
+        self.assertEqual(description, '1 x Product 0, 2 x Product 1, 3 x Product 2')
+
+    def test_basket_description_takes_one_query_and_follows_the_basket(self):
+        with self.assertNumQueries(1):
+            description = get_basket_item_description(self.basket)
+        self.assertEqual(description, '1 x Product 0, 2 x Product 1, 3 x Product 2')
+
+        self.basket.add_product(create_product(title='Product 3', price=10))
+        self.assertEqual(get_basket_item_description(self.basket),
+                         '1 x Product 0, 2 x Product 1, 3 x Product 2, 1 x Product 3')
+
+    def test_redirect_sends_item_description(self):
+        order = create_order(basket=self.basket)
+        session = self.client.session
+        session['checkout_order_id'] = order.id
+        session.save()
+
+        response = self.client.get('/payfast/redirect/')
+
+        fields = dict((field['name'], field['value']) for field in response.context['form_fields'])
+        self.assertEqual(fields['item_description'], '1 x Product 0, 2 x Product 1, 3 x Product 2')
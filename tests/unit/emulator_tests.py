@@ -0,0 +1,104 @@
+import time
+from decimal import Decimal as D
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from payfast.config import get_config
+from payfast.emulator.gateway import get_emulator, reset_emulator
+from payfast.facade import get_gateway
+from payfast.interface import Interface
+from payfast.signer import MD5Signer
+from tests.fake_payfast import FakePayfastServer
+
+EMULATOR = {'latency': 0, 'retries': 2, 'retry_delay': 0, 'seed': 1}
+
+
+@override_settings(PAYFAST_EMULATOR=EMULATOR)
+class EmulatorTestCase(SimpleTestCase):
+
+    def setUp(self):
+        reset_emulator()
+        self.addCleanup(reset_emulator)
+        self.shop = FakePayfastServer().__enter__()
+        self.addCleanup(self.shop.__exit__)
+
+    def form_fields(self, **params):
+        fields = get_gateway(get_config()).build_payment_form_fields(dict({
+            'm_payment_id': '100001',
+            'amount': D('250'),
+            'item_name': 'Payfast order: 100001',
+            'return_url': 'http://shop.example.com/thank-you/',
+            'notify_url': self.shop.url + '/notify/',
+        }, **params))
+        return dict((field['name'], field['value']) for field in fields)
+
+    def pay(self, fields):
+        response = self.client.post('/payfast-emulator/eng/process', fields)
+        get_emulator().wait()
+        return response
+
+    def test_payment_fires_a_signed_itn(self):
+        self.shop.respond('/notify/', 'OK')
+
+        response = self.pay(self.form_fields())
+
+        self.assertRedirects(response, 'http://shop.example.com/thank-you/', fetch_redirect_response=False)
+        itn, = self.shop.requests_to('/notify/')
+        params = itn['data']
+        self.assertEqual(params['m_payment_id'], '100001')
+        self.assertEqual(params['payment_status'], 'COMPLETE')
+        self.assertEqual(params['amount_gross'], '250.00')
+        self.assertEqual(D(params['amount_gross']) + D(params['amount_fee']), D(params['amount_net']))
+        self.assertTrue(MD5Signer().verify(dict(params)))
+
+        params.pop('signature')
+        self.assertEqual(self.client.post('/payfast-emulator/eng/query/validate', params).content, b'VALID')
+        params['amount_gross'] = '1.00'
+        self.assertEqual(self.client.post('/payfast-emulator/eng/query/validate', params).content, b'INVALID')
+
+        query = self.client.get('/payfast-emulator/process/query/100001').json()
+        self.assertEqual(query['data']['response']['pf_payment_id'], itn['data']['pf_payment_id'])
+
+    def test_tampered_form_is_refused(self):
+        fields = self.form_fields()
+        fields['amount'] = '1.00'
+
+        self.assertEqual(self.pay(fields).status_code, 400)
+        self.assertEqual(self.shop.requests, [])
+
+    def test_failed_deliveries_are_retried(self):
+        self.shop.respond('/notify/', 'Oops', status=500)
+
+        self.pay(self.form_fields())
+
+        self.assertEqual(len(self.shop.requests_to('/notify/')), 3)
+
+    @override_settings(PAYFAST_EMULATOR=dict(EMULATOR, workers=1, retries=1, retry_delay=30))
+    def test_retries_do_not_hold_up_other_deliveries(self):
+        self.shop.respond('/broken/', 'Oops', status=500)
+        self.shop.respond('/notify/', 'OK')
+
+        self.client.post('/payfast-emulator/eng/process', self.form_fields(notify_url=self.shop.url + '/broken/'))
+        self.wait_for('/broken/')
+        self.client.post('/payfast-emulator/eng/process', self.form_fields(m_payment_id='100002'))
+
+        self.assertTrue(self.wait_for('/notify/'), "The ITN waited for the retry of another one")
+
+    def wait_for(self, path, timeout=5):
+        deadline = time.time() + timeout
+        while not self.shop.requests_to(path) and time.time() < deadline:
+            time.sleep(0.01)
+        return self.shop.requests_to(path)
+
+    @override_settings(PAYFAST_EMULATOR=dict(EMULATOR, failure_rate=1, duplicate_rate=1))
+    def test_failure_and_duplicate_patterns(self):
+        self.shop.respond('/notify/', 'OK')
+
+        self.pay(self.form_fields())
+
+        itns = self.shop.requests_to('/notify/')
+        self.assertEqual([itn['data']['payment_status'] for itn in itns], ['FAILED', 'FAILED'])
+
+    @override_settings(PAYFAST_ACTION_URL='http://localhost:8000/payfast-emulator/eng/process')
+    def test_config_points_at_the_emulator(self):
+        self.assertEqual(Interface().get_form_action(), 'http://localhost:8000/payfast-emulator/eng/process')
@@ -1,4 +1,21 @@
+from django.db import connection
+from django.db.models.query import QuerySet
 from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
+from oscar.core.loading import get_model
+from oscar.test.factories import create_order
+from payfast.exceptions import InvalidTransactionException
+from payfast.facade import Facade
+from payfast.models import PayfastTransaction
+from tests.factories import build_notification
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+PaymentEvent = get_model('order', 'PaymentEvent')
+Source = get_model('payment', 'Source')
 
 # fixtures
 PAYMENT_REQUEST_FORM = {
@@ -6,11 +23,67 @@ PAYMENT_REQUEST_FORM = {
 }
 
 
+@override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
 class FacadeTestCase(TestCase):
 
     def setUp(self):
         # Every test needs access to the request factory.
         self.factory = RequestFactory()
+        self.order = create_order()
 
     def can_build_payment_request_form(self):
         pass
+
+    def notify(self, params):
+        return Facade().handle_notification_request(self.factory.post('/notify/', params))
+
+    def test_complete_notification_settles_order(self):
+        txn = self.notify(build_notification(self.order))
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Paid')
+        self.assertEqual(txn.payfast_reference, '123456')
+        self.assertEqual(txn.ip_address, '127.0.0.1')
+        self.assertEqual(Source.objects.get(order=self.order).amount_debited, self.order.total_incl_tax)
+        self.assertEqual(PaymentEvent.objects.filter(order=self.order).count(), 1)
+
+    def test_retried_notification_only_records_transaction(self):
+        self.notify(build_notification(self.order))
+        self.notify(build_notification(self.order))
+
+        self.assertEqual(PayfastTransaction.objects.filter(order_number=self.order.number).count(), 2)
+        self.assertEqual(Source.objects.filter(order=self.order).count(), 1)
+        self.assertEqual(PaymentEvent.objects.filter(order=self.order).count(), 1)
+
+    def test_locked_order_is_waited_on(self):
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True), \
+                mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=select_for_update) as locked:
+            self.notify(build_notification(self.order))
+
+        self.assertFalse([call for call in locked.call_args_list if call[1].get('skip_locked')],
+                         "A locked order must not be skipped")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Paid')
+
+    def test_cancelled_notification_cancels_order(self):
+        self.notify(build_notification(self.order, payment_status='CANCELLED'))
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'Cancelled')
+        self.assertFalse(Source.objects.filter(order=self.order).exists())
+
+    def test_amount_mismatch_leaves_order_pending(self):
+        self.notify(build_notification(self.order, amount_gross='0.01'))
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, '')
+        self.assertTrue(PayfastTransaction.objects.filter(order_number=self.order.number).exists())
+
+    def test_tampered_notification_is_rejected(self):
+        params = build_notification(self.order)
+        params['amount_gross'] = '0.01'
+
+        with self.assertRaises(InvalidTransactionException):
+            self.notify(params)
+        self.assertFalse(PayfastTransaction.objects.exists())
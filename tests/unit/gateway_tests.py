@@ -0,0 +1,146 @@
+import socket
+from decimal import Decimal as D
+from unittest import TestCase
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from payfast import stats
+from payfast.config import get_config
+from payfast.exceptions import InvalidTransactionException
+from payfast.facade import get_gateway
+from payfast import gateway
+from payfast.gateway import normalize_amount
+from payfast.signer import MD5Signer
+from tests.factories import build_notification
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class NormalizeAmountTestCase(TestCase):
+
+    def test_amounts_are_quantized_to_cents(self):
+        self.assertEqual(normalize_amount(D('100')), '100.00')
+        self.assertEqual(normalize_amount(D('99.955')), '99.96')
+        self.assertEqual(normalize_amount(100), '100.00')
+        self.assertEqual(normalize_amount(0.1 + 0.2), '0.30')
+        self.assertEqual(normalize_amount(' 12.5 '), '12.50')
+
+    def test_invalid_amount_is_rejected(self):
+        with self.assertRaises(InvalidTransactionException):
+            normalize_amount('ten')
+
+
+class ResolveHostsTestCase(TestCase):
+
+    def setUp(self):
+        gateway._resolved_hosts.clear()
+        self.addCleanup(gateway._resolved_hosts.clear)
+
+    @mock.patch('socket.gethostbyname_ex')
+    def test_lookups_expire(self, lookup):
+        lookup.return_value = ('www.payfast.co.za', [], ['197.97.145.144'])
+        self.assertEqual(gateway.resolve_hosts(['www.payfast.co.za'], now=100), {'197.97.145.144'})
+        self.assertEqual(gateway.resolve_hosts(['www.payfast.co.za'], now=101), {'197.97.145.144'})
+        self.assertEqual(lookup.call_count, 1)
+
+        lookup.return_value = ('www.payfast.co.za', [], ['197.97.145.145'])
+        self.assertEqual(gateway.resolve_hosts(['www.payfast.co.za'], now=100 + gateway.RESOLVE_TTL),
+                         {'197.97.145.145'})
+
+    @mock.patch('socket.gethostbyname_ex')
+    def test_failed_lookups_are_cached_briefly_and_keep_known_addresses(self, lookup):
+        lookup.return_value = ('www.payfast.co.za', [], ['197.97.145.144'])
+        gateway.resolve_hosts(['www.payfast.co.za'], now=100)
+
+        lookup.side_effect = socket.gaierror
+        expired = 100 + gateway.RESOLVE_TTL
+        self.assertEqual(gateway.resolve_hosts(['www.payfast.co.za'], now=expired), {'197.97.145.144'})
+        self.assertEqual(gateway.resolve_hosts(['www.payfast.co.za'], now=expired + 1), {'197.97.145.144'})
+        self.assertEqual(lookup.call_count, 2)
+
+        gateway.resolve_hosts(['www.payfast.co.za'], now=expired + gateway.RESOLVE_FAILURE_TTL)
+        self.assertEqual(lookup.call_count, 3)
+
+
+class BackwardsCompatibilityTestCase(TestCase):
+
+    def test_field_exceptions_are_importable_from_the_gateway(self):
+        from payfast import exceptions
+
+        self.assertIs(gateway.MissingFieldException, exceptions.MissingFieldException)
+        self.assertIs(gateway.UnexpectedFieldException, exceptions.UnexpectedFieldException)
+
+    def test_interface_exception_can_be_caught(self):
+        from payfast import exceptions, interface
+
+        with self.assertRaises(interface.MissingFieldException):
+            raise exceptions.MissingFieldException('amount')
+
+
+@override_settings(PAYFAST_PASSPHRASE='MYSECRETPASSPHRASE')
+class PaymentFormRequestTestCase(SimpleTestCase):
+
+    def build(self, **params):
+        fields = get_gateway(get_config()).build_payment_form_fields(dict({
+            'amount': D('100'),
+            'item_name': 'Payfast order: 1',
+            'm_payment_id': 1,
+        }, **params))
+        return dict((field['name'], field['value']) for field in fields)
+
+    def test_fields_are_normalized_before_signing(self):
+        fields = self.build(item_name='  A very long name %s  ' % ('x' * 200), name_first=' John ')
+
+        self.assertEqual(fields['amount'], '100.00')
+        self.assertEqual(fields['m_payment_id'], '1')
+        self.assertEqual(fields['name_first'], 'John')
+        self.assertEqual(len(fields['item_name']), 100)
+        self.assertTrue(fields['item_name'].startswith('A very long name'))
+
+        signature = fields.pop('signature')
+        self.assertEqual(signature, MD5Signer().sign(fields), "The form must carry the signature of its own values")
+
+    def test_equal_amounts_sign_the_same(self):
+        self.assertEqual(self.build(amount=D('100'))['signature'], self.build(amount='100.00')['signature'])
+
+
+@override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
+class NotificationStagesTestCase(SimpleTestCase):
+
+    def setUp(self):
+        stats.reset_rejection_counts()
+        self.gateway = get_gateway(get_config())
+        self.params = build_notification(mock.Mock(number='1', total_incl_tax=D('10.00')))
+
+    def assertRejectedBy(self, stage, ip_address='127.0.0.1'):
+        with mock.patch.object(MD5Signer, 'verify', autospec=True, side_effect=MD5Signer.verify) as verify:
+            with self.assertRaises(ValueError):
+                self.gateway.handle_notification(ip_address=ip_address, params=self.params)
+        counts = stats.get_rejection_counts()
+        self.assertEqual(counts.pop(stage), 1)
+        self.assertEqual(set(counts.values()), {0})
+        return verify.called
+
+    def test_foreign_ip_is_rejected_before_hashing(self):
+        self.assertFalse(self.assertRejectedBy('ip', ip_address='10.0.0.1'))
+
+    def test_missing_field_is_rejected_before_hashing(self):
+        del self.params['amount_gross']
+        self.assertFalse(self.assertRejectedBy('fields'))
+
+    def test_other_merchant_is_rejected_before_hashing(self):
+        self.params['merchant_id'] = '999'
+        self.assertFalse(self.assertRejectedBy('merchant'))
+
+    def test_tampered_notification_is_rejected_by_signature(self):
+        self.params['amount_gross'] = '0.01'
+        self.assertTrue(self.assertRejectedBy('signature'))
+
+    def test_valid_notification_passes_every_stage(self):
+        accepted, status, __ = self.gateway.handle_notification(ip_address='127.0.0.1', params=self.params)
+
+        self.assertTrue(accepted)
+        self.assertEqual(set(stats.get_rejection_counts().values()), {0})
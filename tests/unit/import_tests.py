@@ -0,0 +1,30 @@
+import pytest
+
+# Budget for importing payfast.urls once Django is set up, in microseconds. The
+# lazy imports keep it far below this, it only catches eager imports creeping back.
+# Checked by the opt-in benchmarks, the module checks below run every time.
+URLS_IMPORT_BUDGET = 50000
+
+# Modules that must not be imported until the first request is handled.
+DEFERRED_MODULES = (
+    'payfast.facade',
+    'payfast.gateway',
+    'payfast.interface',
+    'iptools',
+    'requests',
+)
+
+
+def test_urls_import_defers_payfast_machinery(import_time):
+    modules = import_time('import payfast.urls')
+
+    assert 'payfast.urls' in modules
+    for module in DEFERRED_MODULES:
+        assert module not in modules, "%s is imported by payfast.urls" % module
+
+
+@pytest.mark.benchmark
+def test_urls_import_time_budget(import_time):
+    modules = import_time('import payfast.urls')
+
+    assert modules['payfast.urls'] < URLS_IMPORT_BUDGET, "payfast.urls took %dus to import" % modules['payfast.urls']
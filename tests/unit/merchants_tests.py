@@ -0,0 +1,63 @@
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
+from oscar.test.factories import create_order
+from payfast.config import get_config
+from payfast.facade import Facade, build_merchant_gateway, get_gateway
+from payfast.merchants import GatewayPool
+from payfast.models import PayfastMerchant, PayfastTransaction
+from payfast.signer import MD5Signer
+
+
+@override_settings(PAYFAST_MERCHANT_DIRECTORY=True, PAYFAST_VALID_HOSTS=('127.0.0.1',))
+class GatewayPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.merchant = PayfastMerchant.objects.create(
+            merchant_id='20000200', merchant_key='subkey', passphrase='sub passphrase')
+        self.pool = GatewayPool(lambda merchant: build_merchant_gateway(get_config(), merchant), ttl=60)
+
+    def test_pool_hands_out_prebuilt_gateways(self):
+        gateway = self.pool.get('20000200')
+
+        self.assertEqual(gateway.merchant_key, 'subkey')
+        self.assertEqual(gateway.signer.get_passphrase(), 'sub passphrase')
+        with self.assertNumQueries(0):
+            self.assertIs(self.pool.get(20000200), gateway)
+            self.assertIsNone(self.pool.get('unknown'))
+
+    def test_pool_reloads_changed_merchants(self):
+        self.pool.get('20000200')
+
+        self.merchant.merchant_key = 'newkey'
+        self.merchant.save()
+
+        self.assertEqual(self.pool.get('20000200').merchant_key, 'newkey')
+
+    def test_pool_only_checks_for_changes_once_stale(self):
+        self.pool.refresh(now=1000)
+
+        with self.assertNumQueries(0):
+            self.pool.refresh(now=1059)
+        with self.assertNumQueries(1):
+            self.pool.refresh(now=1060)
+
+    def test_unknown_merchant_falls_back_to_configured_gateway(self):
+        self.assertEqual(get_gateway(get_config(), 'unknown').merchant_key, get_config().get_merchant_key())
+
+    def test_notification_is_routed_to_its_merchant(self):
+        order = create_order()
+        params = {
+            'm_payment_id': order.number,
+            'pf_payment_id': '42',
+            'payment_status': 'COMPLETE',
+            'item_name': 'Payfast order',
+            'amount_gross': str(order.total_incl_tax),
+            'amount_fee': '-1.00',
+            'amount_net': str(order.total_incl_tax - 1),
+            'merchant_id': '20000200',
+        }
+        params['signature'] = MD5Signer(passphrase='sub passphrase').sign_notification(params)
+
+        Facade().handle_notification_request(RequestFactory().post('/notify/', params))
+
+        self.assertTrue(PayfastTransaction.objects.filter(payfast_reference='42').exists())
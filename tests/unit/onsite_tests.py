@@ -0,0 +1,102 @@
+import threading
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+from oscar.test.factories import create_order
+from payfast.exceptions import PayfastAPIException, PayfastUnavailableException
+from payfast.facade import Facade
+from payfast.signer import MD5Signer
+from tests.fake_payfast import FakePayfastServer
+
+ONSITE_PATH = '/onsite/process'
+
+
+def order_data(order_number='100042', amount='100.00'):
+    return {'m_payment_id': order_number, 'amount': amount, 'item_name': 'Payfast order: %s' % order_number}
+
+
+class OnsiteTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.payfast = FakePayfastServer().__enter__()
+        self.addCleanup(self.payfast.__exit__)
+        self.payfast.respond(ONSITE_PATH, {'uuid': 'b2bf8ad7-0fa1-4ac4-8d6d-d2e7a6c1e3f4'})
+
+        settings = override_settings(PAYFAST_ONSITE_URL=self.payfast.url + ONSITE_PATH, PAYFAST_API_TIMEOUT=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def calls(self):
+        return self.payfast.requests_to(ONSITE_PATH)
+
+    def test_signed_form_is_posted(self):
+        uuid = Facade().get_onsite_uuid(order_data())
+
+        self.assertEqual(uuid, 'b2bf8ad7-0fa1-4ac4-8d6d-d2e7a6c1e3f4')
+        data = self.calls()[0]['data']
+        self.assertEqual((data['m_payment_id'], data['amount'], data['merchant_id']), ('100042', '100.00', '10000100'))
+        self.assertEqual(data['signature'], MD5Signer().sign(data))
+
+    def test_uuid_is_reused_until_the_order_changes(self):
+        first = Facade().get_onsite_uuid(order_data())
+        self.assertEqual(Facade().get_onsite_uuid(order_data(amount=100)), first)
+        self.assertEqual(len(self.calls()), 1)
+
+        Facade().get_onsite_uuid(order_data(amount='90.00'))
+        self.assertEqual(len(self.calls()), 2)
+
+    def test_concurrent_requests_make_one_call(self):
+        self.payfast.respond(ONSITE_PATH, {'uuid': 'b2bf8ad7'}, delay=0.3)
+        uuids = []
+
+        def pay():
+            uuids.append(Facade().get_onsite_uuid(order_data()))
+
+        threads = [threading.Thread(target=pay) for __ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(uuids, ['b2bf8ad7'] * 8)
+        self.assertEqual(len(self.calls()), 1)
+
+    def test_refused_payment_is_not_cached(self):
+        self.payfast.respond(ONSITE_PATH, {'error': 'Invalid signature'}, status=400)
+        with self.assertRaises(PayfastAPIException):
+            Facade().get_onsite_uuid(order_data())
+
+        self.payfast.respond(ONSITE_PATH, {'uuid': 'b2bf8ad7'})
+        self.assertEqual(Facade().get_onsite_uuid(order_data()), 'b2bf8ad7')
+
+    def test_unavailable_payfast(self):
+        self.payfast.respond(ONSITE_PATH, 'Bad gateway', status=502)
+
+        with self.assertRaises(PayfastUnavailableException):
+            Facade().get_onsite_uuid(order_data())
+
+    def test_onsite_view_opens_the_modal(self):
+        order = create_order()
+        session = self.client.session
+        session['checkout_order_id'] = order.id
+        session.save()
+
+        response = self.client.get('/payfast/onsite/')
+        self.client.get('/payfast/onsite/')
+
+        self.assertEqual(response.context['uuid'], 'b2bf8ad7-0fa1-4ac4-8d6d-d2e7a6c1e3f4')
+        self.assertContains(response, '<script src="https://www.payfast.co.za/onsite/engine.js"></script>', html=True)
+        self.assertEqual(len(self.calls()), 1)
+
+    def test_onsite_view_falls_back_to_the_redirect(self):
+        self.payfast.respond(ONSITE_PATH, {'error': 'Invalid merchant'}, status=400)
+        order = create_order()
+        session = self.client.session
+        session['checkout_order_id'] = order.id
+        session.save()
+
+        response = self.client.get('/payfast/onsite/')
+
+        self.assertRedirects(response, '/payfast/redirect/', fetch_redirect_response=False)
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from decimal import Decimal as D
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from payfast.models import PayfastTransaction
+from payfast.partitioning import (
+    convert_sql, ensure_partitions, partition_transactions, partitions_sql, split_default_sql)
+
+try:
+    from django.utils.six import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class PartitionSQLTestCase(TestCase):
+
+    def test_monthly_partitions_cover_consecutive_months(self):
+        start = datetime(2018, 11, 15, tzinfo=timezone.utc)
+
+        statements = partitions_sql('payfast_payfasttransaction', start, 3)
+
+        self.assertEqual([name for name, __ in statements], [
+            'payfast_payfasttransaction_y2018m11',
+            'payfast_payfasttransaction_y2018m12',
+            'payfast_payfasttransaction_y2019m01',
+        ])
+        self.assertIn("FROM ('2018-12-01T00:00:00+00:00') TO ('2019-01-01T00:00:00+00:00')", statements[1][1])
+
+    def test_missed_month_is_split_out_of_the_default_partition(self):
+        start, end = datetime(2018, 11, 1, tzinfo=timezone.utc), datetime(2018, 12, 1, tzinfo=timezone.utc)
+
+        statements = split_default_sql('payfast_payfasttransaction', 'payfast_payfasttransaction_y2018m11', start, end)
+
+        self.assertEqual(statements[0], 'ALTER TABLE "payfast_payfasttransaction" DETACH PARTITION '
+                                        '"payfast_payfasttransaction_default"')
+        self.assertTrue(statements[1].startswith('CREATE TABLE IF NOT EXISTS "payfast_payfasttransaction_y2018m11"'))
+        self.assertIn('INSERT INTO "payfast_payfasttransaction_y2018m11" SELECT * FROM '
+                      '"payfast_payfasttransaction_default" WHERE "date_created" >= \'2018-11-01T00:00:00+00:00\'',
+                      statements[2])
+        self.assertTrue(statements[3].startswith('DELETE FROM "payfast_payfasttransaction_default" WHERE'))
+        self.assertEqual(statements[-1], 'ALTER TABLE "payfast_payfasttransaction" ATTACH PARTITION '
+                                         '"payfast_payfasttransaction_default" DEFAULT')
+
+    def test_conversion_keeps_indexes_and_sequence(self):
+        statements = convert_sql(PayfastTransaction, now=datetime(2018, 11, 15, tzinfo=timezone.utc))
+
+        self.assertIn('ALTER TABLE "payfast_payfasttransaction" ADD PRIMARY KEY ("id", "date_created")', statements)
+        self.assertTrue(any('("order_number")' in statement for statement in statements))
+        self.assertTrue(any('("date_created", "id")' in statement for statement in statements))
+        self.assertLess(statements.index('CREATE TABLE "payfast_payfasttransaction_default" PARTITION OF '
+                                         '"payfast_payfasttransaction" DEFAULT'),
+                        statements.index('INSERT INTO "payfast_payfasttransaction" '
+                                         'SELECT * FROM "payfast_payfasttransaction_unpartitioned"'))
+        self.assertEqual(statements[-1], 'DROP TABLE "payfast_payfasttransaction_unpartitioned"')
+
+
+class PartitionFallbackTestCase(TestCase):
+
+    def test_helpers_are_noops_without_postgresql(self):
+        self.assertNotEqual(connection.vendor, 'postgresql')
+
+        self.assertFalse(partition_transactions())
+        self.assertEqual(ensure_partitions(), [])
+        stdout = StringIO()
+        call_command('payfast_partitions', convert=True, stdout=stdout)
+        self.assertIn('not supported', stdout.getvalue())
+
+    def test_queryset_bounds_on_date_created(self):
+        now = timezone.now()
+        old = PayfastTransaction.objects.create(order_number='1', amount=D('1.00'), date_created=now - timedelta(days=60))
+        new = PayfastTransaction.objects.create(order_number='2', amount=D('1.00'), date_created=now)
+
+        self.assertEqual(list(PayfastTransaction.objects.recent(days=30)), [new])
+        self.assertEqual(list(PayfastTransaction.objects.created_between(end=now - timedelta(days=1))), [old])
+        self.assertEqual(PayfastTransaction.objects.created_between().count(), 2)
@@ -0,0 +1,77 @@
+import os
+import tempfile
+from decimal import Decimal as D
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+from oscar.test.factories import create_order
+from payfast.models import PayfastTransaction
+from payfast.reconciliation import (
+    AMOUNT_DRIFT, FEE_DRIFT, MISSING_ITN, MISSING_ORDER, read_settlement, reconcile)
+
+# Fixtures
+SETTLEMENT_HEADER = 'Date,Type,Description,Gross,Fee,Net,M Payment ID,PF Payment ID\n'
+SETTLEMENT_ROW = '2018-01-01,Funds Received,Payfast order,{gross},{fee},0.00,{order},{reference}\n'
+
+
+class ReconciliationTestCase(TestCase):
+
+    def setUp(self):
+        self.order = create_order()
+        self.total = self.order.total_incl_tax
+        for reference, amount, fee in (('1', self.total, D('-2.30')),
+                                       ('2', self.total, D('-2.30')),
+                                       ('3', D('1.00'), D('-0.10'))):
+            PayfastTransaction.objects.create(
+                order_number=self.order.number if reference != '3' else 'missing',
+                payfast_reference=reference, amount=amount, amount_fee=fee, status='COMPLETE')
+
+    def settlement(self, *rows):
+        lines = [SETTLEMENT_HEADER, '2018-01-01,Balance,Opening balance,,,,,\n']
+        lines.extend(SETTLEMENT_ROW.format(order=self.order.number, **row) for row in rows)
+        return StringIO(''.join(lines))
+
+    def test_reconcile_reports_mismatches(self):
+        settlement = self.settlement(
+            {'reference': '1', 'gross': self.total, 'fee': '-2.30'},
+            {'reference': '2', 'gross': self.total + 1, 'fee': '-3.00'},
+            {'reference': '3', 'gross': '1.00', 'fee': '-0.10'},
+            {'reference': '4', 'gross': self.total, 'fee': '-2.30'},
+        )
+
+        mismatches = list(reconcile(read_settlement(settlement), chunk_size=2))
+
+        self.assertEqual([(m.kind, m.reference) for m in mismatches], [
+            (AMOUNT_DRIFT, '2'),
+            (FEE_DRIFT, '2'),
+            (MISSING_ORDER, '3'),
+            (MISSING_ITN, '4'),
+        ])
+        self.assertEqual(mismatches[0].line, 4)
+
+    def test_read_settlement_is_lazy(self):
+        rows = read_settlement(self.settlement({'reference': '1', 'gross': '10.00', 'fee': '"-1,000.00"'}))
+
+        row = next(rows)
+        self.assertEqual(row.amount_fee, D('-1000.00'))
+        self.assertEqual(list(rows), [])
+
+    def test_command_writes_mismatch_csv(self):
+        settlement = self.settlement({'reference': '4', 'gross': self.total, 'fee': '-2.30'})
+        path = self.write_settlement(settlement.getvalue())
+        out, err = StringIO(), StringIO()
+
+        call_command('payfast_reconcile', path, chunk_size=10, stdout=out, stderr=err)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'kind,line,reference,order_number,expected,actual')
+        self.assertTrue(lines[1].startswith('missing_itn,3,4,'))
+        self.assertIn('Mismatches: 1', err.getvalue())
+
+    def write_settlement(self, content):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as settlement:
+            settlement.write(content)
+        self.addCleanup(os.remove, path)
+        return path
@@ -0,0 +1,166 @@
+import os
+import tempfile
+from decimal import Decimal as D
+
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+from oscar.core.loading import get_model
+from oscar.test.factories import create_order
+from payfast.client import PayfastAPIClient
+from payfast.exceptions import InvalidRefundException
+from payfast.facade import Facade
+from payfast.interface import Interface
+from payfast.models import PayfastRefund, PayfastRefundRun
+from payfast import refunds
+from payfast.refunds import run_refunds
+from tests.factories import build_notification
+from tests.fake_payfast import FakePayfastServer
+
+try:
+    from django.utils.six import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+Source = get_model('payment', 'Source')
+
+# Fixtures
+REFUND_SUCCESS = {'code': 200, 'status': 'success', 'data': {'response': True, 'message': 'Success'}}
+REFUND_FAILURE = {'code': 400, 'status': 'failed', 'data': {'response': 'Refund period expired'}}
+
+
+@override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
+class RefundTestCase(TestCase):
+
+    def setUp(self):
+        self.orders = [create_order() for __ in range(3)]
+        for order in self.orders:
+            params = build_notification(order, pf_payment_id='7%s' % order.number)
+            Facade().handle_notification_request(RequestFactory().post('/notify/', params))
+
+        self.payfast = FakePayfastServer().__enter__()
+        self.addCleanup(self.payfast.__exit__)
+        for order in self.orders:
+            self.payfast.respond(self.refund_path(order), REFUND_SUCCESS)
+        self.client = PayfastAPIClient(10000100, 'passphrase', api_url=self.payfast.url, pool_size=2)
+
+    @staticmethod
+    def refund_path(order):
+        return '/refunds/7%s' % order.number
+
+    def test_refund_order(self):
+        order = self.orders[0]
+
+        with override_settings(PAYFAST_API_URL=self.payfast.url):
+            refund = Facade().refund_order(order.number, D('5.00'), reason='Damaged')
+
+        self.assertEqual((refund.status, refund.amount), ('SUCCESS', D('5.00')))
+        request = self.payfast.requests_to(self.refund_path(order))[0]
+        self.assertEqual(request['data'], {'amount': '500', 'reason': 'Damaged', 'notify_buyer': '1'})
+        source = Source.objects.get(order=order)
+        self.assertEqual(source.amount_refunded, D('5.00'))
+        self.assertEqual(source.transactions.filter(txn_type='Refund').count(), 1)
+
+    def test_interface_refund_can_skip_the_buyer_email(self):
+        order = self.orders[0]
+
+        with override_settings(PAYFAST_API_URL=self.payfast.url):
+            Interface.refund_order(order.number, D('5.00'), notify_buyer=False)
+
+        request = self.payfast.requests_to(self.refund_path(order))[0]
+        self.assertEqual(request['data']['notify_buyer'], '0')
+
+    def test_refunds_never_exceed_the_payment(self):
+        order = self.orders[0]
+
+        with override_settings(PAYFAST_API_URL=self.payfast.url):
+            Facade().refund_order(order.number, order.total_incl_tax - 1)
+            with self.assertRaises(InvalidRefundException):
+                Facade().refund_order(order.number, D('1.01'))
+            refund = Facade().refund_order(order.number)
+
+        self.assertEqual(refund.amount, D('1.00'))
+        self.assertEqual(len(self.payfast.requests), 2)
+
+    def test_unpaid_order_cannot_be_refunded(self):
+        with self.assertRaises(InvalidRefundException):
+            Facade().refund_order(create_order().number)
+        self.assertFalse(PayfastRefund.objects.exists())
+
+    def test_refused_refund_is_recorded(self):
+        self.payfast.respond(self.refund_path(self.orders[0]), REFUND_FAILURE, status=400)
+
+        with override_settings(PAYFAST_API_URL=self.payfast.url):
+            refund = Facade().refund_order(self.orders[0].number)
+
+        self.assertEqual(refund.status, 'FAILED')
+        self.assertIn('400 Client Error', refund.message)
+        self.assertEqual(Source.objects.get(order=self.orders[0]).amount_refunded, 0)
+
+    def test_unanswered_refund_stays_pending(self):
+        self.payfast.respond(self.refund_path(self.orders[0]), REFUND_SUCCESS, delay=1)
+        client = PayfastAPIClient(10000100, 'passphrase', api_url=self.payfast.url, timeout=0.2)
+        orders = [(self.orders[0].number, None)]
+
+        run = run_refunds('recall', client, orders)
+
+        self.assertEqual((run.refunded, run.failed), (0, 0))
+        refund = PayfastRefund.objects.get(order_number=self.orders[0].number)
+        self.assertEqual(refund.status, 'PENDING')
+        # The pending refund still counts against the amount left to refund.
+        self.assertEqual(run_refunds('recall-again', client, orders).skipped, 1)
+        with self.assertRaises(InvalidRefundException):
+            Facade().refund_order(self.orders[0].number)
+        self.assertEqual(len(self.payfast.requests), 1)
+
+    def test_refund_run(self):
+        self.payfast.respond(self.refund_path(self.orders[1]), REFUND_FAILURE, status=400)
+        orders = [(order.number, None) for order in self.orders] + [('unknown', None), (self.orders[0].number, None)]
+
+        run = run_refunds('recall', self.client, orders, reason='Recall', workers=2, batch_size=2)
+
+        self.assertEqual((run.refunded, run.failed, run.skipped, run.position), (2, 1, 1, 5))
+        self.assertIsNotNone(run.date_finished)
+        self.assertEqual(len(self.payfast.requests), 3)
+        self.assertEqual(Source.objects.get(order=self.orders[2]).amount_refunded, self.orders[2].total_incl_tax)
+        self.assertEqual(PayfastRefund.objects.get(order_number=self.orders[1].number).status, 'FAILED')
+
+    def test_refund_run_locks_the_transactions_it_reserves_against(self):
+        lookup = refunds._refundable_transactions
+        with mock.patch('payfast.refunds._refundable_transactions', side_effect=lookup) as locked:
+            run_refunds('recall', self.client, [(self.orders[0].number, None)])
+
+        self.assertEqual(locked.call_args[1], {'lock': True})
+
+    def test_refund_run_resumes_without_refunding_twice(self):
+        # A crash after the first refund was reserved but before its outcome was saved.
+        run = PayfastRefundRun.objects.create(name='recall')
+        PayfastRefund.objects.create(run=run, order_number=self.orders[0].number,
+                                     payfast_reference='7%s' % self.orders[0].number, amount=D('1.00'))
+        orders = [(order.number, D('1.00')) for order in self.orders]
+
+        run = run_refunds('recall', self.client, orders)
+        run_refunds('recall', self.client, orders)
+
+        self.assertEqual(run.refunded, 2)
+        self.assertEqual(len(self.payfast.requests), 2)
+        self.assertFalse(self.payfast.requests_to(self.refund_path(self.orders[0])))
+
+    def test_command(self):
+        handle, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w') as orders:
+            orders.write('%s,2.50\n\n%s\n' % (self.orders[0].number, self.orders[1].number))
+        stdout = StringIO()
+
+        with override_settings(PAYFAST_API_URL=self.payfast.url):
+            call_command('payfast_refund_orders', path, '--run', 'recall', '--no-notify-buyer', stdout=stdout)
+
+        self.assertIn('refunded: 2', stdout.getvalue())
+        request = self.payfast.requests_to(self.refund_path(self.orders[0]))[0]
+        self.assertEqual((request['data']['amount'], request['data']['notify_buyer']), ('250', '0'))
@@ -0,0 +1,59 @@
+import json
+import unittest
+
+from django.core.management import call_command
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from payfast.replay import ReplayReport, generate_notifications, load_notifications, replay
+from payfast.signer import MD5Signer
+
+
+class ReplayTestCase(unittest.TestCase):
+
+    def test_generated_notifications_are_signed(self):
+        notifications = list(generate_notifications(3, order_numbers=['100001']))
+
+        self.assertEqual(len(notifications), 3)
+        for fields in notifications:
+            self.assertEqual(fields['m_payment_id'], '100001')
+            self.assertTrue(MD5Signer().verify(dict(fields)), "Generated notification has an invalid signature")
+
+    def test_recorded_notifications_can_be_resigned(self):
+        fields = next(generate_notifications(1))
+        fields['signature'] = 'recorded-with-another-passphrase'
+
+        loaded = list(load_notifications([json.dumps(fields), ''], resign=True))
+
+        self.assertEqual(len(loaded), 1)
+        self.assertTrue(MD5Signer().verify(loaded[0]))
+
+    def test_report_percentiles(self):
+        report = ReplayReport()
+        for duration in range(1, 101):
+            report.add(duration / 1000.0, 200)
+        report.add(1.0, 'ConnectionError')
+
+        self.assertEqual(report.percentile(50), 0.051)
+        self.assertEqual(report.percentile(99), 0.1)
+        self.assertEqual(report.errors, 1)
+
+    def test_replay_collects_outcomes(self):
+        def target(fields):
+            if fields['m_payment_id'] == '100002':
+                raise ValueError
+            return 200
+
+        report = replay(generate_notifications(5), target, concurrency=3)
+
+        self.assertEqual(report.total, 5)
+        self.assertEqual(report.outcomes[200], 4)
+        self.assertEqual(report.outcomes['ValueError'], 1)
+
+    @override_settings(PAYFAST_VALID_HOSTS=('10.0.0.1',))
+    def test_command_replays_against_notify_view(self):
+        out = StringIO()
+        call_command('payfast_replay_itn', count=4, concurrency=2, host='testserver', json=True, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['total'], 4)
+        self.assertEqual(report['outcomes'], {'200': 4})
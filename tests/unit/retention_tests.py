@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal as D
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from payfast.models import PayfastDeferredNotification, PayfastTransaction, PayfastTransactionArchive, PayfastWebhookEvent
+from payfast.retention import (
+    JSONLinesArchive, TableArchive, archive_transactions, purge_deferred_notifications, purge_webhook_events)
+
+try:
+    from django.utils.six import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class RetentionTestCase(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.old = [
+            PayfastTransaction.objects.create(order_number=str(index), payfast_reference=str(index),
+                                              amount=D('10.00'), date_created=now - timedelta(days=400 + index))
+            for index in range(5)
+        ]
+        self.recent = PayfastTransaction.objects.create(order_number='99', amount=D('1.00'), date_created=now)
+        self.before = now - timedelta(days=365)
+
+    def test_old_transactions_move_to_the_archive_table_in_batches(self):
+        batches = list(archive_transactions(self.before, TableArchive(), batch_size=2))
+
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertEqual(list(PayfastTransaction.objects.all()), [self.recent])
+        archived = PayfastTransactionArchive.objects.get(original_id=self.old[3].pk)
+        self.assertEqual((archived.payfast_reference, archived.amount), ('3', D('10.00')))
+        self.assertEqual(archived.date_created, self.old[3].date_created)
+
+    def test_interrupted_run_resumes(self):
+        self.assertEqual(list(archive_transactions(self.before, TableArchive(), batch_size=2, max_batches=1)), [2])
+
+        self.assertEqual(list(archive_transactions(self.before, TableArchive(), batch_size=2)), [2, 1])
+        self.assertEqual(PayfastTransactionArchive.objects.count(), 5)
+
+    def test_dry_run_changes_nothing(self):
+        self.assertEqual(list(archive_transactions(self.before, TableArchive(), batch_size=2, dry_run=True)), [2, 2, 1])
+
+        self.assertEqual(PayfastTransaction.objects.count(), 6)
+        self.assertFalse(PayfastTransactionArchive.objects.exists())
+
+    def test_json_lines_archive(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        list(archive_transactions(self.before, JSONLinesArchive(directory), batch_size=3))
+
+        paths = sorted(os.listdir(directory))
+        self.assertEqual(len(paths), 2)
+        with gzip.open(os.path.join(directory, paths[0]), 'rb') as archive:
+            rows = [json.loads(line.decode('utf-8')) for line in archive]
+        self.assertEqual([row['id'] for row in rows], [txn.pk for txn in self.old[:3]])
+        self.assertEqual(rows[0]['amount'], '10.00')
+        self.assertEqual(PayfastTransaction.objects.count(), 1)
+
+    def test_processed_deferred_notifications_are_purged(self):
+        old = self.before - timedelta(days=1)
+        processed = PayfastDeferredNotification.objects.create(params='{}', date_created=old, date_processed=old)
+        waiting = PayfastDeferredNotification.objects.create(params='{}', date_created=old)
+        recent = PayfastDeferredNotification.objects.create(params='{}', date_processed=timezone.now())
+
+        self.assertEqual(list(purge_deferred_notifications(self.before)), [1])
+        self.assertEqual(set(PayfastDeferredNotification.objects.all()), {waiting, recent})
+        self.assertFalse(PayfastDeferredNotification.objects.filter(pk=processed.pk).exists())
+
+    def test_finished_webhook_events_are_purged(self):
+        old = self.before - timedelta(days=1)
+        for status in ('DELIVERED', 'FAILED', 'PENDING'):
+            PayfastWebhookEvent.objects.create(url='http://erp.test/', event_type='payment.complete', payload='{}',
+                                               status=status, date_created=old)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        self.assertEqual(list(purge_webhook_events(self.before, JSONLinesArchive(directory, 'payfast-webhook-events'))), [2])
+        self.assertEqual(list(PayfastWebhookEvent.objects.values_list('status', flat=True)), ['PENDING'])
+        self.assertTrue(os.listdir(directory)[0].startswith('payfast-webhook-events-'))
+
+    def test_command(self):
+        PayfastWebhookEvent.objects.create(url='http://erp.test/', event_type='payment.complete', payload='{}',
+                                           status='DELIVERED', date_created=self.before - timedelta(days=1))
+        stdout = StringIO()
+
+        call_command('payfast_archive_transactions', days=365, sleep=0, stdout=stdout)
+
+        self.assertIn('Archived 5 transactions', stdout.getvalue())
+        self.assertIn('Deleted 1 webhook events', stdout.getvalue())
+        self.assertEqual(PayfastTransaction.objects.count(), 1)
+        self.assertFalse(PayfastWebhookEvent.objects.exists())
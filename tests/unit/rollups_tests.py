@@ -0,0 +1,103 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal as D
+
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+from oscar.test.factories import create_order
+from payfast.facade import Facade
+from payfast.models import PayfastRollup, PayfastTransaction, PayfastTransactionArchive
+from payfast.rollups import add_transaction, rebuild_rollups
+from tests.factories import build_notification
+
+try:
+    from django.utils.six import StringIO
+except ImportError:
+    from io import StringIO
+
+
+def totals(**filters):
+    return sorted(PayfastRollup.objects.filter(**filters).values_list(
+        'day', 'status', 'currency', 'count', 'amount', 'amount_fee', 'amount_net'))
+
+
+@override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
+class NotificationRollupTestCase(TestCase):
+
+    def notify(self, order, **overrides):
+        request = RequestFactory().post('/notify/', build_notification(order, **overrides))
+        return Facade().handle_notification_request(request)
+
+    def test_notifications_update_their_day(self):
+        first, second = create_order(), create_order()
+
+        txn = self.notify(first)
+        self.notify(second, pf_payment_id='654321')
+        self.notify(first, payment_status='CANCELLED')
+
+        total = first.total_incl_tax + second.total_incl_tax
+        self.assertEqual(totals(status='COMPLETE'), [
+            (txn.date_created.date(), 'COMPLETE', 'zar', 2, total, D('-4.60'), total - 4)])
+        self.assertEqual(PayfastRollup.objects.get(status='CANCELLED').count, 1)
+
+    def test_rollups_match_a_rebuild(self):
+        for index in range(3):
+            self.notify(create_order(), pf_payment_id=str(index))
+        incremental = totals()
+
+        list(rebuild_rollups(end=date.today()))
+
+        self.assertEqual(totals(), incremental)
+
+
+class RebuildRollupTestCase(TestCase):
+
+    def setUp(self):
+        self.today = date.today()
+        self.start = datetime.combine(self.today - timedelta(days=10), datetime.min.time())
+        for index in range(10):
+            PayfastTransaction.objects.create(
+                order_number=str(index), amount=D('10.00'), amount_fee=D('-0.50'), amount_net=D('9.50'),
+                status='COMPLETE' if index % 3 else 'FAILED', date_created=self.start + timedelta(hours=index * 12))
+        PayfastTransactionArchive.objects.create(
+            original_id=1000, order_number='1000', amount=D('5.00'), status='COMPLETE', date_created=self.start)
+
+    def test_rebuild_in_chunks(self):
+        chunks = list(rebuild_rollups(chunk_days=2))
+
+        self.assertEqual([(first, last) for first, last, __ in chunks[:2]], [
+            (self.today - timedelta(days=10), self.today - timedelta(days=9)),
+            (self.today - timedelta(days=8), self.today - timedelta(days=7)),
+        ])
+        first_day = self.start.date()
+        self.assertEqual(totals(day=first_day), [
+            (first_day, 'COMPLETE', 'zar', 2, D('15.00'), D('-0.50'), D('9.50')),
+            (first_day, 'FAILED', 'zar', 1, D('10.00'), D('-0.50'), D('9.50')),
+        ])
+        self.assertEqual(sum(PayfastRollup.objects.values_list('count', flat=True)), 11)
+
+    def test_rebuild_replaces_drifted_totals(self):
+        list(rebuild_rollups())
+        expected = totals()
+        PayfastRollup.objects.update(count=0, amount=0)
+
+        list(rebuild_rollups())
+
+        self.assertEqual(totals(), expected)
+
+    def test_rebuild_then_add(self):
+        list(rebuild_rollups(end=self.today))
+        add_transaction(PayfastTransaction.objects.create(
+            order_number='11', amount=D('1.00'), status='COMPLETE', date_created=self.start))
+
+        rollup = PayfastRollup.objects.get(day=self.start.date(), status='COMPLETE')
+        self.assertEqual((rollup.count, rollup.amount, rollup.amount_fee), (3, D('16.00'), D('-0.50')))
+
+    def test_command(self):
+        stdout = StringIO()
+
+        call_command('payfast_rollup_transactions', '--chunk-days', '5', stdout=stdout)
+
+        self.assertIn("Rebuilt 10 days of totals", stdout.getvalue())
+        days = PayfastRollup.objects.between(end=self.today - timedelta(days=6)).values_list('day', flat=True)
+        self.assertEqual(len(set(days)), 5)
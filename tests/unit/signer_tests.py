@@ -1,8 +1,20 @@
 from django.test.utils import override_settings
 from django.conf import settings
-from payfast.signer import MD5Signer
+from payfast.signer import MD5Signer, passphrase_salt
 from unittest import TestCase
 
+try:
+    # Python > 3
+    import urllib.parse as parse
+except ImportError:
+    # Python < 3
+    import urllib as parse
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 
 # Fixtures
 REQUEST_DICTIONARY = {
@@ -101,3 +113,26 @@ class MD5SignerTestCase(TestCase):
         RESPONSE_DICTIONARY['item_description'] = 'Some kind of malicious tampering'
         self.assertFalse(self.md5signer.verify(RESPONSE_DICTIONARY),
                          "the verify method returned an unexpected True in response to an invalid signature")
+
+
+class PassphraseSaltTestCase(TestCase):
+
+    def test_salt_is_quoted_and_encoded_once(self):
+        with mock.patch('payfast.core.signing.parse.quote', wraps=parse.quote) as quote:
+            first = passphrase_salt('my pass&phrase')
+            second = passphrase_salt('my pass&phrase')
+
+        self.assertEqual(first, b'&passphrase=my%20pass%26phrase')
+        self.assertIs(first, second)
+        self.assertEqual(quote.call_count, 1)
+
+    def test_no_passphrase_means_no_salt(self):
+        self.assertEqual(passphrase_salt(None), b'')
+        self.assertEqual(passphrase_salt(''), b'')
+
+    def test_explicit_passphrase_matches_configured_one(self):
+        with override_settings(PAYFAST_PASSPHRASE=PASSPHRASE_SALT):
+            configured = MD5Signer().generate_hash('the signature string')
+
+        self.assertEqual(configured, SAMPLE_HASH_SALTED)
+        self.assertEqual(MD5Signer(passphrase=PASSPHRASE_SALT).generate_hash('the signature string'), configured)
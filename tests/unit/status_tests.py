@@ -0,0 +1,94 @@
+import json
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import RequestFactory, TransactionTestCase
+from django.test.utils import override_settings
+from oscar.test.factories import create_order
+from payfast import status
+from payfast.facade import Facade
+from tests.factories import build_notification
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+@override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
+class PaymentStatusTestCase(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.order = create_order()
+        self.url = status.get_status_url(self.order.number)
+
+    def notify(self, **overrides):
+        params = build_notification(self.order, **overrides)
+        Facade().handle_notification_request(RequestFactory().post('/notify/', params))
+
+    def test_notification_publishes_status(self):
+        self.notify()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.json()['payment_status'], 'COMPLETE')
+        self.assertEqual(response.json()['order_status'], 'Paid')
+
+    def test_status_is_published_once_committed(self):
+        with transaction.atomic():
+            self.notify()
+            self.assertIsNone(status.get_payment_status(self.order.number))
+
+        self.assertEqual(status.get_payment_status(self.order.number)['order_status'], 'Paid')
+
+    def test_replayed_notification_keeps_the_final_status(self):
+        self.notify()
+        self.notify()
+        self.notify(payment_status='PENDING')
+
+        published = status.get_payment_status(self.order.number)
+        self.assertEqual((published['payment_status'], published['order_status']), ('COMPLETE', 'Paid'))
+
+    def test_status_requires_the_order_token(self):
+        self.notify()
+
+        self.assertEqual(self.client.get('/payfast/status/%s/' % self.order.number).status_code, 403)
+        other = status.get_status_url(self.order.number + 1)
+        self.assertEqual(self.client.get(other.replace(str(self.order.number + 1), str(self.order.number))).status_code, 403)
+
+    def test_unknown_status(self):
+        response = self.client.get(self.url).json()
+
+        self.assertIsNone(response['payment_status'])
+        self.assertIsNone(response['version'])
+
+    @mock.patch('payfast.status.POLL_INTERVAL', 0.01)
+    def test_long_poll_waits_for_the_notification(self):
+        published = status.publish_payment_status(self.order.number, 'PENDING')
+        timer = threading.Timer(0.1, status.publish_payment_status, (self.order.number, 'COMPLETE', 'Paid'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        response = self.client.get('%s&wait=5&since=%d' % (self.url, published['version'] - 1))
+        self.assertEqual(response.json()['payment_status'], 'PENDING')
+
+        response = self.client.get('%s&wait=5&since=%d' % (self.url, published['version']))
+        self.assertEqual(response.json()['payment_status'], 'COMPLETE')
+
+    @override_settings(PAYFAST_STATUS_MAX_WAIT=0)
+    def test_event_stream_ends_on_final_status(self):
+        self.notify(payment_status='CANCELLED')
+
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+        body = b''.join(response.streaming_content).decode('utf-8')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        event = dict(line.split(': ', 1) for line in body.strip().split('\n'))
+        self.assertEqual(event['event'], 'status')
+        self.assertEqual(json.loads(event['data'])['order_status'], 'Cancelled')
+
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID=event['id'])
+        self.assertEqual(b''.join(response.streaming_content), b'')
@@ -0,0 +1,107 @@
+from decimal import Decimal as D
+
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
+from oscar.test.factories import create_order
+from payfast.client import PayfastAPIClient
+from payfast.facade import Facade
+from payfast.models import PayfastCharge, PayfastChargeRun, PayfastToken
+from payfast.subscriptions import run_charges
+from tests.factories import build_notification
+from tests.fake_payfast import FakePayfastServer
+
+# Fixtures
+CHARGE_SUCCESS = {'code': 200, 'status': 'success', 'data': {'response': True, 'message': 'Success'}}
+CHARGE_FAILURE = {'code': 400, 'status': 'failed', 'data': {'response': 'Insufficient funds'}}
+
+
+class SubscriptionTestCase(TestCase):
+
+    def setUp(self):
+        self.tokens = [
+            PayfastToken.objects.create(token='token-%d' % index, order_number=str(index), amount=D('99.95'))
+            for index in range(3)
+        ]
+
+    @override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
+    def test_notification_captures_token(self):
+        order = create_order()
+        params = build_notification(order, token='dc0521d3-55fe-269b-fa00-b647310d760f')
+
+        Facade().handle_notification_request(RequestFactory().post('/notify/', params))
+
+        token = PayfastToken.objects.get(token='dc0521d3-55fe-269b-fa00-b647310d760f')
+        self.assertEqual(token.order_number, str(order.number))
+        self.assertEqual(token.amount, order.total_incl_tax)
+
+    def test_charge_run_charges_every_active_token(self):
+        PayfastToken.objects.create(token='inactive', order_number='9', amount=D('1.00'), is_active=False)
+
+        with FakePayfastServer() as payfast:
+            for token in self.tokens:
+                payfast.respond('/subscriptions/%s/adhoc' % token.token, CHARGE_SUCCESS)
+            payfast.respond('/subscriptions/token-1/adhoc', CHARGE_FAILURE, status=400)
+            client = PayfastAPIClient(10000100, 'passphrase', api_url=payfast.url, pool_size=2)
+
+            run = run_charges('nightly', client, D('99.95'), workers=2, batch_size=2)
+
+        self.assertEqual((run.charged, run.failed), (2, 1))
+        self.assertIsNotNone(run.date_finished)
+        self.assertEqual(len(payfast.requests), 3)
+        request = payfast.requests_to('/subscriptions/token-0/adhoc')[0]
+        self.assertEqual(request['data']['amount'], '9995')
+        self.assertEqual(request['headers']['merchant-id'], '10000100')
+        charge = PayfastCharge.objects.get(token=self.tokens[0])
+        self.assertEqual(request['data']['m_payment_id'], 'charge-%d' % charge.pk)
+        self.assertEqual(PayfastCharge.objects.get(token=self.tokens[1]).status, 'FAILED')
+
+    def test_charge_run_resumes_without_charging_twice(self):
+        # A crash after the first charge was reserved but before its outcome was saved.
+        run = PayfastChargeRun.objects.create(name='nightly')
+        PayfastCharge.objects.create(run=run, token=self.tokens[0], amount=D('99.95'))
+
+        with FakePayfastServer() as payfast:
+            for token in self.tokens:
+                payfast.respond('/subscriptions/%s/adhoc' % token.token, CHARGE_SUCCESS)
+            client = PayfastAPIClient(10000100, api_url=payfast.url)
+
+            run = run_charges('nightly', client, D('99.95'))
+            run_charges('nightly', client, D('99.95'))
+
+        self.assertEqual(run.charged, 2)
+        self.assertEqual(len(payfast.requests), 2)
+        self.assertFalse(payfast.requests_to('/subscriptions/token-0/adhoc'))
+        self.assertEqual(PayfastCharge.objects.get(token=self.tokens[0]).status, 'PENDING')
+
+    def test_unanswered_charge_stays_pending(self):
+        with FakePayfastServer() as payfast:
+            for token in self.tokens:
+                payfast.respond('/subscriptions/%s/adhoc' % token.token, CHARGE_SUCCESS)
+            payfast.respond('/subscriptions/token-1/adhoc', CHARGE_SUCCESS, delay=1)
+            client = PayfastAPIClient(10000100, api_url=payfast.url, timeout=0.2)
+
+            run = run_charges('nightly', client, D('99.95'))
+            run_charges('nightly', client, D('99.95'))
+
+        self.assertEqual((run.charged, run.failed), (2, 0))
+        charge = PayfastCharge.objects.get(token=self.tokens[1])
+        self.assertEqual(charge.status, 'PENDING')
+        self.assertIn('timed out', charge.message)
+        self.assertEqual(len(payfast.requests_to('/subscriptions/token-1/adhoc')), 1)
+
+    @override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
+    def test_charge_notification_settles_the_charge_not_the_order(self):
+        order = create_order()
+        token = PayfastToken.objects.create(token='token-order', order_number=str(order.number))
+        run = PayfastChargeRun.objects.create(name='nightly')
+        charge = PayfastCharge.objects.create(run=run, token=token, amount=D('10.00'))
+
+        params = build_notification(order, m_payment_id='charge-%d' % charge.pk, amount_gross='10.00',
+                                    pf_payment_id='654321', token=token.token)
+        txn = Facade().handle_notification_request(RequestFactory().post('/notify/', params))
+
+        charge.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual(charge.status, 'SUCCESS')
+        self.assertEqual(txn.order_number, 'charge-%d' % charge.pk)
+        self.assertEqual(order.status, '', "The order that tokenized the card must not be touched")
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+from oscar.core.loading import get_model
+from oscar.test.factories import create_order
+from payfast.client import PayfastAPIClient
+from payfast.models import PayfastSweepRun, PayfastTransaction
+from payfast.sweeper import sweep_orders
+from tests.fake_payfast import FakePayfastServer
+
+Order = get_model('order', 'Order')
+Source = get_model('payment', 'Source')
+
+
+def query_response(order, status):
+    return {'code': 200, 'status': 'success', 'data': {'response': {
+        'pf_payment_id': '7%s' % order.number,
+        'm_payment_id': str(order.number),
+        'payment_status': status,
+        'amount_gross': str(order.total_incl_tax),
+        'amount_fee': '-2.30',
+        'amount_net': str(order.total_incl_tax - 2),
+    }}}
+
+
+class SweepTestCase(TestCase):
+
+    def setUp(self):
+        self.paid, self.abandoned, self.cancelled, self.pending, self.recent = [create_order() for __ in range(5)]
+        stale = timezone.now() - timedelta(hours=48)
+        Order.objects.exclude(pk=self.recent.pk).update(date_placed=stale)
+
+        self.payfast = FakePayfastServer().__enter__()
+        self.addCleanup(self.payfast.__exit__)
+        self.payfast.respond(self.query_path(self.paid), query_response(self.paid, 'COMPLETE'))
+        self.payfast.respond(self.query_path(self.cancelled), query_response(self.cancelled, 'CANCELLED'))
+        self.payfast.respond(self.query_path(self.pending), query_response(self.pending, 'PENDING'))
+        self.client = PayfastAPIClient(10000100, 'passphrase', api_url=self.payfast.url, pool_size=4)
+
+    @staticmethod
+    def query_path(order):
+        return '/process/query/%s' % order.number
+
+    def statuses(self):
+        return dict(Order.objects.values_list('pk', 'status'))
+
+    def test_sweep_settles_paid_and_cancels_abandoned_orders(self):
+        run = sweep_orders('sweep', self.client, hours=24, workers=2, batch_size=2, rate=0)
+
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.paid.pk], 'Paid')
+        self.assertEqual(statuses[self.abandoned.pk], 'Cancelled')
+        self.assertEqual(statuses[self.cancelled.pk], 'Cancelled')
+        self.assertEqual(statuses[self.pending.pk], self.recent.status)
+        self.assertEqual(statuses[self.recent.pk], self.recent.status)
+        self.assertEqual((run.settled, run.cancelled, run.skipped), (1, 2, 1))
+        self.assertIsNotNone(run.date_finished)
+
+        self.assertEqual(Source.objects.get(order=self.paid).amount_debited, self.paid.total_incl_tax)
+        self.assertTrue(PayfastTransaction.objects.filter(order_number=self.paid.number).exists())
+        self.assertEqual(self.payfast.requests_to(self.query_path(self.recent)), [])
+        self.assertEqual(self.payfast.requests_to(self.query_path(self.paid))[0]['headers']['merchant-id'], '10000100')
+
+    def test_sweep_resumes_after_its_checkpoint(self):
+        PayfastSweepRun.objects.create(
+            name='sweep', cutoff=timezone.now() - timedelta(hours=24), last_order_id=self.abandoned.pk)
+
+        run = sweep_orders('sweep', self.client, rate=0)
+
+        self.assertEqual(self.payfast.requests_to(self.query_path(self.paid)), [])
+        self.assertEqual(self.statuses()[self.abandoned.pk], self.recent.status)
+        self.assertEqual((run.settled, run.cancelled, run.skipped), (0, 1, 1))
+
+    def test_failed_queries_leave_orders_pending(self):
+        self.payfast.respond(self.query_path(self.abandoned), {'status': 'failed'}, status=500)
+
+        run = sweep_orders('sweep', self.client, rate=0)
+
+        self.assertEqual(self.statuses()[self.abandoned.pk], self.recent.status)
+        self.assertEqual(run.skipped, 2)
+
+    def test_answers_without_a_payment_leave_orders_pending(self):
+        self.payfast.respond(self.query_path(self.abandoned), {'code': 200, 'status': 'success', 'data': {}})
+
+        run = sweep_orders('sweep', self.client, rate=0)
+
+        self.assertEqual(self.statuses()[self.abandoned.pk], self.recent.status)
+        self.assertEqual((run.cancelled, run.skipped), (1, 2))
+
+    @override_settings(PAYFAST_SWEEP_RATE=1000)
+    def test_command_runs_a_rate_limited_sweep(self):
+        out = StringIO()
+        with override_settings(PAYFAST_API_URL=self.payfast.url):
+            call_command('payfast_sweep_orders', run='nightly', hours=24, stdout=out)
+
+        self.assertIn('Payfast sweep nightly | settled: 1 | cancelled: 2 | skipped: 1', out.getvalue())
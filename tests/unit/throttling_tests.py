@@ -0,0 +1,92 @@
+import unittest
+
+from django.test import RequestFactory, SimpleTestCase
+from django.test.utils import override_settings
+from payfast import stats
+from payfast.exceptions import NotificationRejectedException
+from payfast.facade import Facade
+from payfast.throttling import CacheTokenBucket, TokenBucket
+
+try:
+    # Python > 3
+    import urllib.parse as parse
+except ImportError:
+    # Python < 3
+    import urllib as parse
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def test_bucket_allows_bursts_then_refills(self):
+        bucket = TokenBucket(rate=1, burst=2)
+
+        self.assertTrue(bucket.allow('10.0.0.1', now=100))
+        self.assertTrue(bucket.allow('10.0.0.1', now=100))
+        self.assertFalse(bucket.allow('10.0.0.1', now=100))
+        self.assertTrue(bucket.allow('10.0.0.2', now=100), "Buckets must be kept per key")
+        self.assertTrue(bucket.allow('10.0.0.1', now=101))
+
+    def test_bucket_memory_is_bounded(self):
+        bucket = TokenBucket(rate=1, burst=1, max_keys=10)
+        for index in range(100):
+            bucket.allow('10.0.0.%d' % index, now=100)
+
+        self.assertLessEqual(len(bucket.buckets), 10)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_bucket_is_shared(self):
+        self.assertTrue(CacheTokenBucket(rate=1, burst=1).allow('10.0.0.1', now=100))
+        self.assertFalse(CacheTokenBucket(rate=1, burst=1).allow('10.0.0.1', now=100))
+
+
+@override_settings(PAYFAST_VALID_HOSTS=('10.0.0.1',), PAYFAST_NOTIFY_RATE_LIMIT=(1, 2))
+class NotificationScreeningTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        stats.reset_rejection_counts()
+        limiters = mock.patch.dict('payfast.facade._notification_limiters', clear=True)
+        limiters.start()
+        self.addCleanup(limiters.stop)
+
+    def notify(self, params, remote_addr='127.0.0.1'):
+        request = self.factory.post('/notify/', parse.urlencode(params),
+                                    content_type='application/x-www-form-urlencoded', REMOTE_ADDR=remote_addr)
+        return Facade().handle_notification_request(request)
+
+    @override_settings(PAYFAST_NOTIFY_MAX_SIZE=100)
+    def test_oversized_notification_is_rejected_before_hashing(self):
+        with mock.patch('payfast.signer.MD5Signer.verify') as verify:
+            with self.assertRaises(NotificationRejectedException):
+                self.notify({'item_name': 'x' * 200}, remote_addr='10.0.0.1')
+        self.assertFalse(verify.called)
+
+    @override_settings(PAYFAST_NOTIFY_MAX_FIELDS=5)
+    def test_notification_with_too_many_fields_is_rejected(self):
+        with self.assertRaises(NotificationRejectedException):
+            self.notify(dict(('field%d' % index, 'x') for index in range(10)), remote_addr='10.0.0.1')
+
+    @override_settings(PAYFAST_NOTIFY_RATE_LIMIT=(0.001, 2), PAYFAST_NOTIFY_MAX_SIZE=100)
+    def test_junk_traffic_is_rate_limited_before_any_other_check(self):
+        for __ in range(2):
+            with self.assertRaisesRegexp(NotificationRejectedException, 'not a Payfast server'):
+                self.notify({'pf_payment_id': '1'}, remote_addr='10.0.0.5')
+        with self.assertRaisesRegexp(NotificationRejectedException, 'Too many'):
+            self.notify({'item_name': 'x' * 200}, remote_addr='10.0.0.5')
+
+        counts = stats.get_rejection_counts()
+        self.assertEqual((counts['rate'], counts['ip'], counts['size']), (1, 2, 0))
+
+    @override_settings(PAYFAST_NOTIFY_RATE_LIMIT=(0.001, 2))
+    def test_payfast_is_never_rate_limited(self):
+        # Payfast passes screening and fails validation on the missing fields.
+        for __ in range(3):
+            with self.assertRaises(ValueError) as raised:
+                self.notify({'pf_payment_id': '1'}, remote_addr='10.0.0.1')
+            self.assertNotIsInstance(raised.exception, NotificationRejectedException)
+        self.assertEqual(stats.get_rejection_counts()['rate'], 0)
@@ -0,0 +1,56 @@
+from django.test import RequestFactory, TestCase
+from oscar.test.factories import create_order
+from payfast.models import PayfastPaymentForm
+from payfast.signer import MD5Signer
+from payfast.views import PRESIGNED_ORDER_SESSION_KEY, presign_payment_form
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class PresignedPaymentFormTestCase(TestCase):
+
+    def setUp(self):
+        self.order = create_order()
+        request = RequestFactory().post('/checkout/preview/')
+        request.session = {}
+        presign_payment_form(request, self.order.number, self.order.total_incl_tax)
+
+    def redirect(self, **session):
+        store = self.client.session
+        store.update(dict({'checkout_order_id': self.order.id}, **session))
+        store.save()
+        return self.client.get('/payfast/redirect/')
+
+    def test_redirect_renders_presigned_fields_without_signing(self):
+        with mock.patch.object(MD5Signer, 'sign', side_effect=AssertionError("Signed on redirect")):
+            response = self.redirect(**{PRESIGNED_ORDER_SESSION_KEY: self.order.number})
+
+        fields = dict((field['name'], field['value']) for field in response.context['form_fields'])
+        self.assertEqual(str(fields['m_payment_id']), str(self.order.number))
+        self.assertEqual(fields['amount'], str(self.order.total_incl_tax))
+        self.assertTrue(fields['signature'])
+        self.assertEqual(fields['notify_url'], 'http://testserver/payfast/notify/')
+
+    def test_changing_the_order_total_invalidates_the_form(self):
+        self.order.total_incl_tax += 1
+        self.order.save()
+
+        self.assertFalse(PayfastPaymentForm.objects.exists())
+        response = self.redirect(**{PRESIGNED_ORDER_SESSION_KEY: self.order.number})
+        fields = dict((field['name'], field['value']) for field in response.context['form_fields'])
+        self.assertEqual(fields['amount'], str(self.order.total_incl_tax))
+
+    def test_saving_the_order_keeps_a_matching_form(self):
+        self.order.save()
+
+        self.assertTrue(PayfastPaymentForm.objects.filter(order_number=self.order.number).exists())
+
+    def test_redirect_signs_orders_without_presigned_form(self):
+        with mock.patch.object(MD5Signer, 'sign', wraps=MD5Signer().sign) as sign:
+            response = self.redirect()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(sign.called)
@@ -0,0 +1,111 @@
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+from oscar.test.factories import create_order
+from payfast.facade import Facade
+from payfast.models import PayfastWebhookEvent
+from payfast.signals import payment_notification_accepted
+from payfast.webhooks import WebhookDeliverer, queue_payment_event
+from tests.factories import build_notification
+from tests.fake_payfast import FakePayfastServer
+
+try:
+    from django.utils.six import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class WebhookOutboxTestCase(TestCase):
+
+    @override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
+    def test_accepted_notification_is_queued_and_signalled(self):
+        order = create_order()
+        received = []
+        payment_notification_accepted.connect(lambda **kwargs: received.append(kwargs), weak=False,
+                                              dispatch_uid='webhook-test')
+        self.addCleanup(payment_notification_accepted.disconnect, dispatch_uid='webhook-test')
+
+        with FakePayfastServer() as receiver:
+            with self.settings(PAYFAST_WEBHOOK_URLS=(receiver.url + '/erp/', receiver.url + '/fulfilment/')):
+                Facade().handle_notification_request(RequestFactory().post('/notify/', build_notification(order)))
+
+        self.assertEqual(receiver.requests, [], "Delivery must not happen while handling the notification")
+        events = PayfastWebhookEvent.objects.all()
+        self.assertEqual([event.url.rsplit('/', 2)[1] for event in events], ['erp', 'fulfilment'])
+        payload = json.loads(events[0].payload)
+        self.assertEqual(events[0].event_type, 'payment.complete')
+        self.assertEqual(payload['m_payment_id'], str(order.number))
+        self.assertEqual(payload['order_status'], 'Paid')
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]['order_status'], 'Paid')
+
+    @override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',), PAYFAST_WEBHOOK_URLS=('http://erp.test/',))
+    def test_cancelled_notification_is_queued_and_signalled(self):
+        order = create_order()
+        received = []
+        payment_notification_accepted.connect(lambda **kwargs: received.append(kwargs), weak=False,
+                                              dispatch_uid='webhook-test')
+        self.addCleanup(payment_notification_accepted.disconnect, dispatch_uid='webhook-test')
+
+        params = build_notification(order, payment_status='CANCELLED')
+        Facade().handle_notification_request(RequestFactory().post('/notify/', params))
+
+        event = PayfastWebhookEvent.objects.get()
+        self.assertEqual(event.event_type, 'payment.cancelled')
+        self.assertEqual(json.loads(event.payload)['order_status'], 'Cancelled')
+        self.assertEqual([kwargs['status'] for kwargs in received], ['CANCELLED'])
+
+    def test_events_are_batched_per_endpoint_and_signed(self):
+        with FakePayfastServer() as receiver:
+            receiver.respond('/erp/', {'ok': True})
+            queue_payment_event([receiver.url + '/erp/'], 'COMPLETE', {'m_payment_id': '1'})
+            queue_payment_event([receiver.url + '/erp/'], 'CANCELLED', {'m_payment_id': '2'})
+
+            delivered, failed = WebhookDeliverer(secret='s3cret').deliver(workers=2)
+
+        self.assertEqual((delivered, failed), (2, 0))
+        self.assertEqual(len(receiver.requests), 1)
+        request = receiver.requests[0]
+        body = json.loads(request['body'])
+        self.assertEqual([event['data']['m_payment_id'] for event in body['events']], ['1', '2'])
+        self.assertEqual(request['headers']['X-Payfast-Webhook-Signature'],
+                         hmac.new(b's3cret', request['body'].encode('utf-8'), hashlib.sha256).hexdigest())
+        self.assertFalse(PayfastWebhookEvent.objects.exclude(status='DELIVERED').exists())
+
+    def test_failed_deliveries_back_off_then_give_up(self):
+        with FakePayfastServer() as receiver:
+            receiver.respond('/erp/', {'ok': False}, status=503)
+            queue_payment_event([receiver.url + '/erp/'], 'COMPLETE', {'m_payment_id': '1'})
+            event = PayfastWebhookEvent.objects.get()
+            deliverer = WebhookDeliverer(max_attempts=2)
+            now = timezone.now()
+
+            self.assertEqual(deliverer.deliver(now=now), (0, 1))
+            event.refresh_from_db()
+            self.assertEqual((event.status, event.attempts), ('PENDING', 1))
+            self.assertEqual(event.next_attempt_at, now + timedelta(seconds=30))
+
+            self.assertEqual(deliverer.deliver(now=now), (0, 0), "The event is not due yet")
+            self.assertEqual(deliverer.deliver(now=now + timedelta(seconds=30)), (0, 1))
+
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('FAILED', 2))
+        self.assertIn('503', event.last_error)
+
+    def test_command_delivers_everything_due(self):
+        with FakePayfastServer() as receiver:
+            receiver.respond('/erp/', {'ok': True})
+            for index in range(5):
+                queue_payment_event([receiver.url + '/erp/'], 'COMPLETE', {'m_payment_id': str(index)})
+
+            stdout = StringIO()
+            call_command('payfast_deliver_webhooks', batch_size=2, workers=1, stdout=stdout)
+
+        self.assertEqual(len(receiver.requests), 3)
+        self.assertIn('Delivered 5 webhook events', stdout.getvalue())
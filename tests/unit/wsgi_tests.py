@@ -0,0 +1,72 @@
+import json
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from oscar.test.factories import create_order
+from payfast.models import PayfastTransaction
+from payfast.replay import WSGITarget, generate_notifications
+from payfast.wsgi import NotifyHandler, mount
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+CSRF_MIDDLEWARE = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+)
+
+
+@override_settings(PAYFAST_VALID_HOSTS=('127.0.0.1',))
+class NotifyHandlerTestCase(TestCase):
+
+    def notification(self):
+        order = create_order()
+        return next(generate_notifications(1, order_numbers=[order.number], amount=str(order.total_incl_tax)))
+
+    @override_settings(MIDDLEWARE_CLASSES=CSRF_MIDDLEWARE)
+    def test_notify_view_is_csrf_exempt(self):
+        self.client = self.client_class(enforce_csrf_checks=True)
+
+        with mock.patch('payfast.facade.Facade.handle_notification_request') as handle:
+            response = self.client.post('/payfast/notify/', {'pf_payment_id': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(handle.called)
+
+    def test_handler_applies_notification_without_middleware(self):
+        with mock.patch('django.contrib.sessions.middleware.SessionMiddleware.process_request') as middleware:
+            status = WSGITarget(NotifyHandler())(self.notification())
+
+        self.assertEqual(status, 200)
+        self.assertTrue(PayfastTransaction.objects.filter(payfast_reference='900000').exists())
+        self.assertFalse(middleware.called)
+
+    def test_handler_only_takes_posts(self):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/payfast/notify/', 'SERVER_NAME': 'localhost',
+                   'SERVER_PORT': '80', 'wsgi.input': StringIO()}
+        statuses = []
+
+        NotifyHandler()(environ, lambda status, headers: statuses.append(status))
+
+        self.assertEqual(statuses, ['405 Method Not Allowed'])
+
+    def test_mount_only_diverts_the_notify_path(self):
+        application = mock.Mock(return_value=[b'project'])
+        dispatcher = mount(application, '/payfast/notify/')
+
+        self.assertEqual(WSGITarget(dispatcher)(self.notification()), 200)
+        self.assertFalse(application.called)
+        dispatcher({'PATH_INFO': '/basket/'}, None)
+        self.assertTrue(application.called)
+
+    def test_replay_command_benchmarks_the_lean_handler(self):
+        out = StringIO()
+        call_command('payfast_replay_itn', count=3, handler='lean', json=True, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['outcomes'], {'200': 3})
@@ -1,9 +1,13 @@
 from django.conf.urls import include, url
 from django.conf.urls.i18n import i18n_patterns
 from oscar.app import application
+from payfast.dashboard.app import application as payfast_dashboard
 
 urlpatterns = [
     url(r'^i18n/', include('django.conf.urls.i18n')),
+    url(r'^payfast/', include('payfast.urls')),
+    url(r'^dashboard/payfast/', payfast_dashboard.urls),
+    url(r'^payfast-emulator/', include('payfast.emulator.urls')),
 ]
 urlpatterns += i18n_patterns(
 